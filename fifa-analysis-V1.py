@@ -1,13 +1,30 @@
-from sklearn.externals import joblib
 import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt # matplotlib for plotting
 import seaborn as sns # seaborn for better graphics
-
-df = joblib.load("fifa19_df_clean.pkl")
+from fifa_store import open_clean
+from fifa_composites import add_composites, COMPOSITES
+from fifa_scout import ScoutIndex
+from fifa_similar import SimilarityIndex
+from fifa_charts import render_charts, report_specs, line_spec
+from fifa_cube import StatsCube
+from fifa_squad import build_squad
+from fifa_positions import PositionMatrix
+from fifa_clubs import club_reports
+
+# Open the clean data saved by fifa-data-cleaning-V1.py. Columns are loaded lazily, store.read(['Name','Club']) reads only those.
+# This analysis uses most of the columns, so lets read them all.
+# For one off scouting questions there is no need to rerun this script: python fifa.py serve keeps the store loaded
+# and answers /player, /search, /top and /clubs queries on http://127.0.0.1:8019 (see fifa_service.py).
+store = open_clean('fifa19_df_clean', source='data/fifa19.zip')
+df = store.read()
+
+# Club, Nationality and Position breakdowns are used many times below. Lets aggregate the players once
+# into a cube along Club x Nationality x Position x Age band (see fifa_cube.py) and read the breakdowns from it.
+cube = StatsCube(df)
 
 #Let's create a list of top 10 nationalities
-top_countries=df.Nationality.value_counts().head(10).index.to_list()
+top_countries=cube.counts('Nationality').head(10).index.to_list()
 
 # Lets create functions of plots for bivariate analysis. X-axis - discrete variables, Y-axis - continuous variables
 def violinplot(disc_var,cont_var,fig_size_tup=(12,5),palette='Set3',data=df,hue=None):
@@ -29,27 +46,20 @@ violinplot('International Reputation','Age',hue='Preferred Foot')
 cont_var=['Age','Overall','Potential','Value','Wage','Special','Height (cms)','Weight (lbs)','Release Clause']
 disc_var=['Preferred Foot','International Reputation','Weak Foot','Skill Moves','Work Rate','Body Type','Position','Contract Valid Until']
 
-for x, y in [(x,y) for x in disc_var for y in cont_var]:
-    violinplot(x,y,fig_size_tup=(14,7))
-
-sns.pairplot(vars=['Age','Overall','Value','Special','Height (cms)','Weight (lbs)','Release Clause'],data=df)
-
-g = sns.PairGrid(df,y_vars=cont_var,x_vars=disc_var,height=4)
-g.map(sns.lineplot)
-g.add_legend();
+# The grid of violin plots, the pair plot and the pair grid are many charts, lets render them to image files in the charts folder.
+# They are drawn in parallel on all cores, and charts whose data and options didn't change since the last run are not drawn again (see fifa_charts.py).
+chart_specs=report_specs(cont_var,disc_var,['Age','Overall','Value','Special','Height (cms)','Weight (lbs)','Release Clause'])
+chart_files=render_charts(df,chart_specs,out_dir='charts')
 
 
 # Now all the data is clean and ready for bivariate analysis.
 sns.violinplot(y = df.Age, x = df['Preferred Foot'], palette = 'Reds') # No correlation between them
 sns.lmplot(x='Age',y='Overall',data=df)
-sns.lineplot(df['Age'], df['Overall'], palette = 'Wistia')
-sns.lineplot(df['Age'], df['Value'], palette = 'Wistia')
-sns.lineplot(df['Age'], df['Release Clause'], palette = 'Wistia')
-sns.lineplot(df['Age'], df['Potential'], palette = 'Wistia')
-sns.lineplot(df['Age'], df['Wage'], palette = 'Wistia')
-sns.lineplot(df['Age'], df['Stamina'], palette = 'Wistia')
-sns.lineplot(df['Age'], df['Penalties'], palette = 'Wistia')
-sns.lineplot(df['Age'], df['Contract Valid Until'], palette = 'Wistia')
+# Line plots of the mean of a few columns by Age, with their confidence band, rendered to the charts folder.
+# For the larger exports mode='auto' draws them from binned means instead of bootstrapping every row:
+# summaries of the columns computed once (see fifa_binned.py), about the same time at 18k or 180k players.
+age_specs=[line_spec('Age',y) for y in ['Overall','Value','Release Clause','Potential','Wage','Stamina','Penalties','Contract Valid Until']]
+age_files=render_charts(df,age_specs,out_dir='charts',mode='auto')
 
 # plotting a pie chart to represent share of international repuatation
 labels = ['1', '2', '3', '4', '5']
@@ -74,41 +84,29 @@ plt.legend()
 plt.show()
 
 # Adding new parameters/features based on combination of existing skill sets.
-def defending(df):
-    return int(round((df[['Marking', 'StandingTackle', 'SlidingTackle']].mean()).mean()))
-
-def general(df):
-    return int(round((df[['HeadingAccuracy', 'Dribbling', 'Curve', 'BallControl', 'Stamina']].mean()).mean()))
-
-def mental(df):
-    return int(round((df[['Aggression', 'Interceptions', 'Positioning', 'Vision','Composure']].mean()).mean()))
-
-def passing(df):
-    return int(round((df[['Crossing', 'ShortPassing', 'LongPassing']].mean()).mean()))
-
-def mobility(df):
-    return int(round((df[['Acceleration', 'SprintSpeed', 'Agility','Reactions']].mean()).mean()))
-
-def power(df):
-    return int(round((df[['Balance', 'Jumping', 'Stamina', 'Strength']].mean()).mean()))
-
-def rating(df):
-    return int(round((df[['Potential', 'Overall']].mean()).mean()))
-
-def shooting(df):
-    return int(round((df[['Finishing', 'Volleys', 'FKAccuracy', 'ShotPower','LongShots', 'Penalties']].mean()).mean()))
-
-df['Defending'] = df.apply(defending, axis = 1)
-df['General'] = df.apply(general, axis = 1)
-df['Mental'] = df.apply(mental, axis = 1)
-df['Passing'] = df.apply(passing, axis = 1)
-df['Mobility'] = df.apply(mobility, axis = 1)
-df['Power'] = df.apply(power, axis = 1)
-df['Rating'] = df.apply(rating, axis = 1)
-df['Shooting'] = df.apply(shooting, axis = 1)
+# Each composite is the rounded mean of a few skill columns, declared in fifa_composites.COMPOSITES:
+# Defending, General, Mental, Passing, Mobility, Power, Rating and Shooting.
+# They are all computed together with one matrix multiply over the skill columns.
+# More composites can be declared with weights, e.g. {'CB Score': {'Marking': 3, 'StandingTackle': 2, 'Strength': 1}}
+df = add_composites(df, COMPOSITES)
 
 # best players per each position with their age, club, and nationality based on their overall scores
-df.iloc[df.groupby(df['Position'])['Overall'].idxmax()][['Position', 'Name', 'Age', 'Club', 'Nationality']]
+df.loc[cube.query('Position','Overall',['argmax'])[('Overall','argmax')]][['Position', 'Name', 'Age', 'Club', 'Nationality']]
+
+# The positional ratings (LS ... RB) tell where players would play best, not only where they are listed.
+# They are one int16 matrix in the store with GKs masked out (see fifa_positions.py).
+positions=PositionMatrix.from_store(store)
+# Best position of every player, the gap to his listed Position and the number of positions within 2 points of his best
+df_best_position=positions.summary(within=2).join(df[['Name','Position','Club']])
+# Players who would be much better in another position
+df_best_position.sort_values('Gap',ascending=False).head(10)
+# Most versatile players
+df_best_position.sort_values(['Versatility','Best Rating'],ascending=False).head(10)
+# Top 5 players at every position, by positional rating
+df_position_leaders=positions.leaderboard(k=5).join(df[['Name','Club']],on='Player')
+
+# Weight, Overall score, Wage and International Reputation of the players of the top 10 countries, in numbers
+df_countries_stats = cube.query('Nationality',['Weight (lbs)','Overall','Wage','International Reputation'],['count','mean','min','median','max'],where={'Nationality':top_countries})
 
 # Every Nations' Player and their Weights
 df_countries = df.loc[df['Nationality'].isin(top_countries) & df['Weight (lbs)']]
@@ -186,9 +184,17 @@ df_manu.loc[df_manu.Position=='LB']
 df_manu.loc[df_manu.Position=='LWB'] # No such player. Lets try in market
 df_Darmian_replace=df[['Name','Club','Rating','Contract Valid Until','Value','Defending','Age']].loc[df.Value<6000000.0].loc[df.Rating>76].loc[df.Position=='LWB']
 # No such player. Lets try increasing the value
-df_Darmian_replace=df[['Name','Club','Wage','Rating','Contract Valid Until','Value','Defending','Age','Release Clause','Position']].loc[(df.Age<27) & (df.Rating>78) & (df.Position).isin(['LB','LWB']) & (df['Contract Valid Until']<2021) & (df.Defending>75)]
-df_Darmian_replace=df_Darmian_replace.sort_values(by=['Rating','Value','Wage'],ascending=False)
+# For repeated scouting searches, lets build an index over the table once (see fifa_scout.py).
+# It answers such multi criteria searches without scanning the whole data frame.
+scout=ScoutIndex(df)
+scout_cols=['Name','Club','Wage','Rating','Contract Valid Until','Value','Defending','Age','Release Clause','Position']
+df_Darmian_replace=scout.query([('Age','<',27),('Rating','>',78),('Position','in',['LB','LWB']),('Contract Valid Until','<',2021),('Defending','>',75)],
+                               sort_by=['Rating','Value','Wage'],columns=scout_cols)
 (df['Work Rate'][df.Name=='N. Schulz'])
+# Instead of hand tuned thresholds, we can also look for the players most similar to Darmian in skills (see fifa_similar.py)
+# Players are looked up by ID (184392 is M. Darmian), names are not unique.
+similar=SimilarityIndex(df)
+df_Darmian_similar=similar.similar(184392,k=10,where=[('Position','in',['LB','LWB']),('Age','<',27),('Value','<',20000000.0)])
 # Lets try scouting N. Schulz and later turn him into a star. He has gpt the age as well.
 
 # Now lets try identifying other players who need contract renewal.
@@ -199,6 +205,21 @@ df_manu_def=df_manu.loc[(df_manu.Position.str.contains('B'))]
 (df.Rating[df.Name=='P. Jones'])
 (df.Defending[df.Name=='P. Jones'])
 (df['Release Clause'][df.Name=='P. Jones'])
-df_Jones_replace=df[['Name','Club','Wage','Rating','Contract Valid Until','Value','Defending','Age','Release Clause','Position']].loc[(df.Age<30) & (df.Mobility>70) & (df.Rating>79) & (df.Position).isin(['CB','RCB','LCB']) & (df['Contract Valid Until']<2022) & (df.Defending>79)]
+df_Jones_replace=scout.query([('Age','<',30),('Mobility','>',70),('Rating','>',79),('Position','in',['CB','RCB','LCB']),('Contract Valid Until','<',2022),('Defending','>',79)],
+                             columns=scout_cols)
+# There are two P. Jones, 194957 is the Manchester United CB (137166 is a GK of Fleetwood Town)
+df_Jones_similar=similar.similar(194957,k=10,where=[('Position','in',['CB','RCB','LCB']),('Age','<',30)])
 # Lets try scouting O. Toprak this year if we get good sponsorship money or next calendar year
 df[['Work Rate','Mobility']][df.Name=='O. Toprak']
+
+# The same renewal analysis for every club at once (see fifa_clubs.py): contracts due, low work rates among
+# them, the weakest defender by Mobility and the best replacements of other clubs, in one pass over the table.
+df_clubs,df_club_details=club_reports(df,due_before=2021)
+df_club_details[df_club_details.Report=='Manchester United']
+
+# Instead of replacing Darmian and Jones one search at a time, lets fill both positions together under one
+# budget (see fifa_squad.py). The squad builder picks the pair with the best total Defending whose Release
+# Clauses fit in 40M and wages in 150K a week, among the young players of other clubs.
+df_replacements,replacements_report=build_squad(df,slots=['LB','CB'],score='Defending',cost='Release Clause',
+                                               budget=40000000.0,wage_budget=150000.0,
+                                               where=[('Club','!=','Manchester United'),('Age','<',30)])
@@ -1,38 +1,38 @@
-from zipfile import ZipFile
-import os
 import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt # matplotlib for plotting
 import seaborn as sns # seaborn for better graphics
-
-# Check if csv file is already extracted from zip file in data folder, if not extracted, extract zip file        
-if any(os.path.splitext(f)[1] == '.csv' for f in os.listdir('./data')) == False:
-    with ZipFile("data/fifa19.zip","r") as zip_ref:
-        zip_ref.extractall("data")
-        print("data extracted")
-else:
-    print("csv file already present")
-# now csv file is extracted
-
-df=pd.read_csv('./data/data.csv')
+from fifa_ingest import load_players
+from fifa_parsers import parse_currency, parse_height, parse_weight, parse_positional, malformed
+from fifa_impute import impute_grouped
+from fifa_store import save_clean
+from fifa_compact import compact_players
+from fifa_validate import validate, RAW_RULES, CLEAN_RULES
+from fifa_charts import render_charts, count_spec, dist_spec
+
+# This script explores the data step by step. The same cleaning rules are available as cached pipeline stages
+# in fifa_clean.py (python fifa.py clean), where changing one rule only reruns the stages from that rule on.
+
+# Read data.csv straight from the zip file in chunks, no extraction to disk needed.
+# Every column is parsed with the dtype declared in fifa_ingest.SCHEMA.
+# The first "Unnamed" column of the csv is only the row number, the default index is the same.
+# Columns that are not useful for our analysis (DROP_COLS: Photo, Flag, Club Logo, Real Face, Jersey Number) are skipped while parsing.
+df=load_players('data/fifa19.zip')
 
 print(df.shape)
 # We can see the total number of data entries to be 18207
 
 # Check the info of data to analyse columns and null values
 df.info()
-
-# We can see data has first column as "Unnamed" and it look to be index. Lets set it as index.
-df=df.set_index(df.columns[0])
-# Lets remove the index name as it doesn't make sense
-del df.index.name
 df.head()
-# Total of 88 columns availbale. Not all relevant to everyone.
+# Total of 88 columns availbale in the export, 83 are loaded. Not all relevant to everyone.
 df.columns
 
-# Lets remove the columns that are not useful for our analysis.
-cols_remove=['Photo','Flag','Club Logo','Real Face','Jersey Number']
-df=df.drop(cols_remove,axis=1)
+# Before looking at the columns one by one, lets check the export against the data quality rules (see fifa_validate.py):
+# ranges, null patterns, known values and formats of the encoded columns. Every rule lists the IDs of the players breaking it.
+df_validation,df_violations=validate(df,RAW_RULES)
+df_validation[df_validation.violations>0]
+# 241 players without club, 48 without Preferred Foot, 7 Body Types that are player names, ... The steps below deal with them.
 
 # Find occurances of null values in each columns
 df_null_count=df.isna().sum()
@@ -87,23 +87,14 @@ df.Joined.fillna('Jul 1, 2019',inplace=True)
 # Now, for the 'Release Clause' column, lets set their value as the mean of the values of that player's rating.
 # For this, first we need to convert the data in this column to a numeric value.
 # We will remove '€' symbol and tackle 'M' and "K' string with correct multiplication factors.
-# So lets create a function for currency conversion.
-def currency_converter(val):
-    amount = val.replace('€','')
-    if 'K' in amount:
-        factor=pow(10,3)
-        amount = float(amount.replace('K', ''))*factor
-    elif 'M' in amount:
-        factor=pow(10,6)
-        amount = float(amount.replace('M', ''))*factor
-    return float(amount)
-
-# We will apply this function to Value, Wage and columns
-df.Value =  df.Value.apply(lambda x: currency_converter(x))
-df.Wage =  df.Wage.apply(lambda x: currency_converter(x))
-
-df['Release Clause'].loc[(pd.notna(df['Release Clause']))] =  df['Release Clause'].loc[(pd.notna(df['Release Clause']))].apply(lambda x: currency_converter(x))
-df['Release Clause']=df['Release Clause'].astype(float)
+# The conversion is done column wise by parse_currency (see fifa_parsers.py), which parses each distinct string only once.
+# Values that cannot be parsed become nan and are collected in parse_report instead of raising.
+parse_report={}
+for col in ['Value','Wage','Release Clause']:
+    parsed=parse_currency(df[col])
+    parse_report[col]=malformed(df[col],parsed)
+    df[col]=parsed
+# Release Clause nulls of loaned players stay nan and are imputed next.
 
 #df['Release Clause']=df['Release Clause'].replace('[\€]', '', regex=True)
 #for i in range(len(df['Release Clause'])):
@@ -117,20 +108,10 @@ df['Release Clause']=df['Release Clause'].astype(float)
 #        df['Release Clause'][i]=pd.to_numeric(release_val)*factor
 #    else: continue
 
-df_RC_Overall=df[['Release Clause','Overall']]
-df_RC_Overall_null=df_RC_Overall[df['Release Clause'].isnull()]
-df_RC_Overall_notnull=df_RC_Overall.dropna(subset=['Release Clause'])
-df_RC_Overall_notnull=df_RC_Overall_notnull.reset_index(drop=True)
-df_means=df_RC_Overall_notnull.groupby(['Overall']).mean()
-df_means=df_means.reset_index()
-
-for i in range(len(df)):
-    if pd.isnull(df['Release Clause'].iloc[i])==True:
-        rating=df.Overall[i]
-        df['Release Clause'][i]=df_means['Release Clause'][df_means.Overall==rating]
-    else: continue
-
-#df_RC_Overall_null.join(df_means.set_index('Overall'),on='Overall')
+# Missing Release Clause values are filled with the mean Release Clause of players with the same Overall rating.
+# impute_grouped does this in one grouped pass and reports how many values were filled for each rating.
+# Other statistics ('median', 'regression') and more keys (e.g. by=['Overall',age_band(df.Age)]) can be used the same way.
+df['Release Clause'],df_RC_fill_report=impute_grouped(df,'Release Clause',by='Overall',how='mean')
 
 # Checking null values again, we see almost all the data is cleaned now
 df_null_count=df.isna().sum()
@@ -139,6 +120,7 @@ df_null_count=df_null_count[df_null_count>0]
 len(df_GK)
 # The reason they are null is because Goalkeepers wont have these positional attributes of other players. Hence, they should logically be nan.
 # While comparing the positional attributes, we should make sure, we dont compare other players with Goalkeeprs.
+# The store keeps the positional ratings as one int16 matrix where GK rows are masked (see fifa_positions.py).
 # Same goes by comparing attributes of Goalkeeper with other players.
 
 # Now lets set the datatypes of columns correctly.
@@ -148,39 +130,11 @@ df.info()
 df.nunique()
 # The data shows players are from 163 different countries, 651 Clubs.
 df.Age.describe() # Min age is 16 and eldest player is of age 45.
-sns.countplot(df.Age)
-
-# Define functions for different types of plots to use in future as and when needed.
-'''Function to distribution plot'''
-def distplot(feature, col):
-    global ax
-    font_size = 16
-    title_size = 20
-    plt.rcParams['figure.figsize'] = (12, 5)
-    ax = sns.distplot(feature, color = col)
-    plt.xlabel('%s' %feature.name, fontsize = font_size)
-    plt.ylabel('Count of the Players', fontsize = font_size)
-    plt.xticks(fontsize = font_size)
-    plt.yticks(fontsize = font_size)
-    plt.title('%s' %feature.name + ' Distribution of Players', fontsize = title_size)
-    plt.show()
-
-'''Function to count plot'''
-def countplot(feature, title, color):
-    global ax
-    font_size = 14
-    title_size = 20
-    plt.rcParams['figure.figsize'] = (12, 5)
-    ax = sns.countplot(feature, palette = color)
-    plt.xlabel('%s' %feature.name, fontsize = font_size)
-    plt.ylabel('Count of the Players', fontsize = font_size)
-    plt.xticks(fontsize = font_size)
-    plt.yticks(fontsize = font_size)
-    plt.title(title, fontsize = title_size)
-    plt.show()
-
-countplot(df.Age,'Distribution of Players across Age groups','coolwarm')
-distplot(df.Age,'g')
+
+# The count and distribution plots are described by specs (see fifa_charts.py) and rendered to image files in the charts folder.
+# Charts whose data didn't change since the last run are not drawn again, and large exports are drawn from column summaries.
+# A chart or two at a time are drawn in this process, a process pool would take longer to start than they take to draw.
+render_charts(df,[count_spec('Age','Distribution of Players across Age groups','coolwarm'),dist_spec('Age','g')],out_dir='charts',processes=1)
 sns.set_style('whitegrid')
 sns.boxplot(data=df.Age)
 # We see age is as expected clustered around mid 20s and is right skewed.
@@ -208,7 +162,7 @@ df_val_0=df[df.Value==0]
 # Exact reason couldn't be found out just with the current data and some background check needs to be done.
 # Let's not worry about these 11 player's Value now.
 # Let's visualise Value distribution of players
-distplot(df.Value,'g')
+render_charts(df,[dist_spec('Value','g')],out_dir='charts',processes=1)
 # We see the distribution being highly right skewed which is expected as only few players are valued very high.
 # This can be seen from the means and other statistic paramters in df_describe for Value. Same goes for wage.
 # The mean value is 2.44863 M dollars.
@@ -219,12 +173,12 @@ df[['Name','Value','Wage','Potential','Age','Nationality']].sort_values(by=['Val
 # Interesting, no Christiano Ronaldo in the list of top 5. But, all class players in the list.
 
 # Lets do similar analysis for Wage of Players.
-distplot(df.Wage,'g')
+render_charts(df,[dist_spec('Wage','g')],out_dir='charts',processes=1)
 df[['Name','Value','Wage','Potential','Age','Nationality']].sort_values(by=['Wage'],ascending=False).head(5)
 # We can see some shuffling in the lsit now with Messi having the highest wage.
 
 # Let's analyse Special attribute of players
-distplot(df.Special,'g')
+render_charts(df,[dist_spec('Special','g')],out_dir='charts',processes=1)
 sns.boxplot(data=df.Special)
 # From the plots, we see this paramter is not having much otliers and values are distributed close to normal distribution (A bit left skewed).
 # Lets find which top 10 players are most special
@@ -232,8 +186,7 @@ df[['Name','Special','Overall','Nationality']].sort_values(by=['Special'],ascend
 # Suarez, De Bruyne, Modric have high special attribute.
 
 # Time to analyse the preferred foot of players.
-sns.countplot(df['Preferred Foot'])
-plt.title('Most Preferred Foot of the Players', fontsize = 14)
+render_charts(df,[count_spec('Preferred Foot','Most Preferred Foot of the Players')],out_dir='charts',processes=1)
 # Clearly, there are more number of Right footed players
 
 # Analyzing International Reputation
@@ -243,12 +196,12 @@ df[['Name','Value','International Reputation','Overall','Age','Nationality']][df
 # Greats of the game who are well known are the world are listed. Also, Ibrahimović makes the cut.
 
 # Analyzing Weak Foot
-sns.countplot(df['Weak Foot'])
+render_charts(df,[count_spec('Weak Foot')],out_dir='charts',processes=1)
 # This is normally distributed. Majority players dont have higher ratings of their weak foot.
 df['Weak Foot'].value_counts() # Also, players having very less skill with their weak foot is also rare.
 
 # Analyzing Skill Moves
-sns.countplot(df['Skill Moves'])
+render_charts(df,[count_spec('Skill Moves')],out_dir='charts',processes=1)
 # Majority of players have rating of 2 and 3 for their skills.
 df['Skill Moves'].value_counts() # There are 50 players with skill moves of 5. Lets see top 10 sorted by their overall rating.
 df[['Name','Skill Moves','Overall','Potential','Nationality','Age']][df['Skill Moves']==5].sort_values(by=['Overall'],ascending=False).head(10)
@@ -256,7 +209,7 @@ df[['Name','Skill Moves','Overall','Potential','Nationality','Age']][df['Skill M
 # K. Mbappé is highly rated for skill moves and is only 19. Quite a potential. His potential rating is highest in the list.
 
 # Analyzing Work Rate
-sns.countplot(df['Work Rate'])
+render_charts(df,[count_spec('Work Rate')],out_dir='charts',processes=1)
 # We can see maximum number of players have medium attack/defense work rate.
 df['Work Rate'].value_counts()
 # Only 34 players are have low work rate in both.
@@ -275,14 +228,13 @@ for i in range(len(df)):
         df['Body Type'][i]='Lean'
     else: continue
 
-countplot(df['Body Type'],"Distribution of Player's body type",'coolwarm')
+render_charts(df,[count_spec('Body Type',"Distribution of Player's body type",'coolwarm')],out_dir='charts',processes=1)
 # We see majority of players have Normal body type and few have stocky body type
 
 # Analyzing Position
 df.Position.value_counts()
 len(df.Position.unique())
-plt.rcParams['figure.figsize'] = (18, 10)
-sns.countplot(df.Position, palette='bone')
+render_charts(df,[count_spec('Position',color='bone',fig_size_tup=(18,10))],out_dir='charts',processes=1)
 # Data seems to be clean for this column.
 
 # Analysing contract expiry years
@@ -295,24 +247,15 @@ df[['Name','Contract Valid Until','Overall','Club','Age']][df['Contract Valid Un
 # Analyzing height and weight of players
 # Lets convert the data in the columns to cms and remove 'lbs'
 
-'''For Height'''
-def feet_to_cms(value): 
-    tmp = value.split("'")
-    return float(round((int(tmp[0]) * 12 + int(tmp[1]))*2.54)) #converting feet to cms
-
-'''For weight'''
-def extract_value_from(value):
-    x = value.replace('lbs', '')
-    return float(x)
-
-df['Height'] = df['Height'].apply(lambda x: feet_to_cms(x))
-df['Weight'] = df['Weight'].apply(lambda x: extract_value_from(x))
+# parse_height converts feet'inches to cms and parse_weight strips 'lbs'.
+height=parse_height(df['Height'])
+weight=parse_weight(df['Weight'])
+parse_report['Height']=malformed(df['Height'],height)
+parse_report['Weight']=malformed(df['Weight'],weight)
+df['Height']=height
+df['Weight']=weight
 df=df.rename(columns={'Height': 'Height (cms)', 'Weight': 'Weight (lbs)'})
-plt.figure(figsize = (20, 12))
-ax = sns.countplot(x = 'Height (cms)', data = df, palette = 'dark')
-
-plt.figure(figsize = (20, 12))
-ax = sns.countplot(x = 'Weight (lbs)', data = df, palette = 'dark')
+render_charts(df,[count_spec(c,color='dark',fig_size_tup=(20,12)) for c in ['Height (cms)','Weight (lbs)']],out_dir='charts',processes=1)
 
 # Analyzing columns from LS to RB, Positional attributes
 # The data has '+' between ratings and additional potential and current growth
@@ -321,15 +264,25 @@ ax = sns.countplot(x = 'Weight (lbs)', data = df, palette = 'dark')
 
 pos_cols=list(df.loc[:,'LS':'RB'].columns)
 
-def pos_convert(val): # converting positional attributes
-    tmp = val.split("+")
-    return (int(tmp[0]) + int(tmp[1]))
+# All 26 columns are converted together as one block, GK rows stay nan.
+pos_ratings=parse_positional(df[pos_cols])
+parse_report['positional']=malformed(df[pos_cols],pos_ratings)
+df[pos_cols]=pos_ratings
+
+# Any malformed values found while parsing are listed here, nothing is raised per row.
+parse_report={col:bad for col,bad in parse_report.items() if len(bad)>0}
 
-for i in pos_cols:
-    df[i].loc[(pd.notna(df.LS))] = df[i].loc[(pd.notna(df.LS))].apply(lambda x: pos_convert(x))
+# Text columns like Club or Position are repeated strings, ratings are 0-99 in 64 bit columns and Joined is still text.
+# Lets compact the data types (see fifa_compact.py): categories for text, small ints for ratings, float32 for money and dates for Joined.
+df,df_memory=compact_players(df)
+df_memory.loc['total'] # the data now takes about 4 times less memory
 
-df.loc[:,'LS':'RB']=(df.loc[:,'LS':'RB'].loc[(pd.notna(df.LS))]).astype(int)
+# The clean data should now pass the rules of a clean table. What is left is informative only
+# (players with a Value of 0, Release Clauses below the Value).
+df_validation,df_violations=validate(df,CLEAN_RULES)
+df_validation[df_validation.violations>0]
 
-# For further analysis, lets dump the clean dataframe and use it in other analysis file for cleaner computation
-from sklearn.externals import joblib
-joblib.dump(df, 'fifa19_df_clean.pkl')
+# For further analysis, lets save the clean dataframe and use it in other analysis file for cleaner computation
+# The store is columnar (see fifa_store.py), so analyses can load only the columns they need.
+# It is keyed by the hash of the zip file, a store built from an older export is detected as stale.
+save_clean(df, 'fifa19_df_clean', source='data/fifa19.zip')
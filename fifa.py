@@ -0,0 +1,419 @@
+'''
+Command line entry point for the cleaning and analysis steps.
+
+    python fifa.py ingest                      read the export from the zip and show what was loaded
+    python fifa.py clean                       clean the export (cached stage by stage) and save the columnar store
+    python fifa.py composites                  add Defending, General, ... Rating, Shooting to the store
+    python fifa.py scout --where "Age<27" --where "Position in LB,LWB" --sort Rating,Value
+    python fifa.py report [--charts]           breakdowns of the clean data, charts rendered to ./charts
+    python fifa.py editions DIR                clean every export of DIR in parallel into one edition keyed store
+    python fifa.py bench-startup               cold start of a scouting query against a bare interpreter
+    python fifa.py validate                    data quality report of the raw export and of the clean store
+    python fifa.py positions --top 5           leaderboards of the positional ratings, best position of players
+    python fifa.py squad --budget 100M --wage-budget 300K --where "Age<27"   best XI under a budget
+    python fifa.py clubs --due-before 2021     contract renewal and weakness report of every club, one csv per club
+    python fifa.py serve                       scouting service on localhost:8019, the store loaded once
+    python fifa.py load-test --start           latency and requests per second of the service under a query mix
+    python fifa.py synth --scale 100           write a synthetic export 100 times the size of the real one
+    python fifa.py bench --scale 10            time the main steps on the 10x export against the stored baseline
+    python fifa.py --profile steps.json clean  time and memory of every step, as json and as a table
+
+Only the standard library is imported at start up. Every subcommand imports the modules it needs,
+scout reads the memory-mapped columns of the store with NumPy alone and plotting libraries are
+only imported when --charts is given.
+'''
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+ZIP_PATH = 'data/fifa19.zip'
+STORE_DIR = 'fifa19_df_clean'
+SCOUT_COLUMNS = 'Name,Club,Position,Age,Overall,Value,Wage,Contract Valid Until'
+
+
+def ingest(args):
+    from fifa_ingest import load_players
+    t = time.perf_counter()
+    df = load_players(args.zip, chunksize=args.chunksize)
+    print('%d players, %d columns read from %s in %.2fs' % (len(df), len(df.columns), args.zip, time.perf_counter() - t))
+    print(df.dtypes.value_counts().to_string())
+
+
+def clean(args):
+    from fifa_clean import clean_export
+    from fifa_store import save_clean
+    df, reports, log = clean_export(args.zip, cache_dir=None if args.no_cache else args.cache)
+    for stage, action, seconds in log:
+        print('%-25s %-7s %7.1fms' % (stage, action, seconds * 1e3))
+    save_clean(df, args.store, source=args.zip)
+    print('%d clean players saved to %s' % (len(df), args.store))
+    print('%d players without club, %d Release Clauses imputed' % (len(reports['no_club']), reports['release_clause_fill'].filled.sum()))
+    for col, bad in reports['malformed'].items():
+        print('%d malformed values in %s' % (len(bad), col))
+    total = reports['memory'].loc['total']
+    print('memory %.1fMB -> %.1fMB after dtype compaction' % (total['bytes before'] / 1e6, total['bytes after'] / 1e6))
+
+
+def _open_store(args):
+    '''The store, exiting with a message when it was not built from the export of --zip ("" skips the check)'''
+    from fifa_store import StaleStoreError, open_clean
+    try:
+        return open_clean(args.store, source=args.zip or None)
+    except StaleStoreError as e:
+        sys.exit(str(e))
+
+
+def composites(args):
+    from fifa_composites import COMPOSITES, compute_composites
+    from fifa_store import add_columns
+    store = _open_store(args)
+    cols = sorted({c for spec in COMPOSITES.values() for c in spec})
+    scores = compute_composites(store.read(cols), COMPOSITES)
+    add_columns(scores, args.store)
+    print('%s added to %s' % (', '.join(scores.columns), args.store))
+
+
+def _condition(text):
+    from fifa_query import parse_condition
+    try:
+        return parse_condition(text)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+
+def _require(store, columns):
+    '''Exit with a message when a column is not in the store, the composites are only there after `composites`'''
+    missing = [c for c in dict.fromkeys(columns) if c not in store.columns]
+    if missing:
+        sys.exit('%s not in %s, run `fifa.py composites` first if %s a composite'
+                 % (', '.join(missing), store.store_dir, 'it is' if len(missing) == 1 else 'they are'))
+
+
+def scout(args):
+    import numpy as np
+    from fifa_query import OPS, sort_order
+    store = _open_store(args)
+    _require(store, [c for c, _, _ in args.where] + (args.sort.split(',') if args.sort else []) + args.columns.split(','))
+    mask = np.ones(len(store), dtype=bool)
+    for col, op, value in args.where:
+        vals = store.array(col)
+        mask &= OPS[op](vals, value)
+    pos = np.flatnonzero(mask)
+    if args.sort:
+        pos = pos[sort_order([np.asarray(store.array(c))[pos] for c in args.sort.split(',')], args.ascending)]
+    pos = pos[:args.k]
+    columns = args.columns.split(',')
+    show = lambda v: str(int(v)) if isinstance(v, np.floating) and v == np.round(v) else str(v)
+    table = [columns] + [[show(v) for v in row] for row in zip(*[np.asarray(store.array(c))[pos] for c in columns])]
+    widths = [max(len(row[i]) for row in table) for i in range(len(columns))]
+    for row in table:
+        print('  '.join(v.ljust(w) for v, w in zip(row, widths)))
+    print('%d players' % np.count_nonzero(mask))
+
+
+def report(args):
+    from fifa_cube import StatsCube
+    df = _open_store(args).read()
+    cube = StatsCube(df)
+    print('Top 10 nationalities\n%s\n' % cube.counts('Nationality').head(10).to_string())
+    print('Largest clubs\n%s\n' % cube.counts('Club').head(10).to_string())
+    best = cube.query('Position', 'Overall', ['argmax'])[('Overall', 'argmax')]
+    print('Best player per position\n%s\n' % df.loc[best, ['Position', 'Name', 'Overall', 'Age', 'Club', 'Nationality']].to_string(index=False))
+    if args.charts:
+        from fifa_charts import render_charts, report_specs
+        paths = render_charts(df, report_specs(), out_dir=args.out, processes=args.processes, mode=args.mode)
+        print('%d charts in %s' % (len(paths), args.out))
+
+
+def validate(args):
+    import pandas as pd
+    import fifa_validate
+    tables = []
+    if not args.store_only:
+        from fifa_ingest import load_players
+        tables.append(('export %s' % args.zip, load_players(args.zip), fifa_validate.RAW_RULES))
+    if os.path.exists(args.store):
+        tables.append(('store %s' % args.store, _open_store(args).read(), fifa_validate.CLEAN_RULES))
+    errors, details = 0, []
+    for name, df, rules in tables:
+        t = time.perf_counter()
+        summary, violations = fifa_validate.validate(df, rules)
+        print('%s: %d rows, %d rules in %.2fs' % (name, len(df), len(rules), time.perf_counter() - t))
+        shown = summary if args.all else summary[summary.violations > 0]
+        print(shown[['severity', 'violations', 'description', 'ids']].to_string(max_colwidth=60) + '\n')
+        errors += summary.violations[summary.severity == 'error'].sum()
+        details.append(violations.assign(table=name))
+    if args.details:
+        pd.concat(details, ignore_index=True).to_csv(args.details, index=False)
+    if errors:
+        sys.exit('%d rows break error rules' % errors)
+
+
+def positions(args):
+    from fifa_positions import PositionMatrix
+    store = _open_store(args)
+    matrix = PositionMatrix.from_store(store)
+    names = store.array('Name')
+    board = matrix.leaderboard(args.top, args.position.split(',') if args.position else None)
+    board['Name'] = names[board.Player.to_numpy()]
+    print(board[['Position', 'Rank', 'Name', 'Rating']].to_string(index=False))
+    summary = matrix.summary(args.within)
+    print('%d players rated within %d points of their best at 5 positions or more, %d better elsewhere than at their listed Position'
+          % ((summary.Versatility >= 5).sum(), args.within, (summary.Gap > 0).sum()))
+
+
+def _money(text):
+    '''"100M" -> 100000000.0, "300K" -> 300000.0'''
+    factor = {'K': 1e3, 'M': 1e6}.get(text.strip()[-1:].upper(), 1)
+    return float(text.strip().lstrip('€').rstrip('KMkm')) * factor
+
+
+def squad(args):
+    from fifa_squad import build_squad
+    store = _open_store(args)
+    _require(store, [args.score, args.cost, 'Wage'] + [c for c, _, _ in args.where])
+    df = store.read()
+    slots = args.slots.split(',') if args.slots else args.formation
+    team, info = build_squad(df, slots, score=args.score, cost=args.cost, budget=args.budget,
+                             wage_budget=args.wage_budget, where=args.where, time_limit=args.time_limit)
+    if not len(team) and not info['optimal']:
+        sys.exit('no squad found in the %gs time limit (%d nodes searched), try a larger --time-limit' % (args.time_limit, info['nodes']))
+    if not len(team):
+        sys.exit('no squad fits the budget')
+    print(team[['Slot', 'Name', 'Club', 'Position', 'Age', args.score, args.cost, 'Wage']].to_string(index=False))
+    print('%s %d, %s %.1fM, wages %.0fK, %s (bound %d, %d nodes, %.2fs)'
+          % (args.score, info['score'], args.cost, info['cost'] / 1e6, info['wage'] / 1e3,
+             'optimal' if info['optimal'] else 'best found in the time limit', info['bound'], info['nodes'], info['seconds']))
+
+
+def clubs(args):
+    from fifa_composites import add_composites
+    from fifa_clubs import club_reports, write_club_reports
+    t = time.perf_counter()
+    df = _open_store(args).read()
+    if 'Mobility' not in df.columns:
+        add_composites(df)
+    summary, details = club_reports(df, due_before=args.due_before, k=args.k, max_age=args.max_age, max_value=args.max_value)
+    paths = write_club_reports(summary, details, args.out, processes=args.processes)
+    print(summary.sort_values('Value Due', ascending=False).head(args.top).to_string(float_format=lambda v: '%.4g' % v))
+    print('%d club reports written to %s in %.1fs' % (len(paths), args.out, time.perf_counter() - t))
+
+
+def serve(args):
+    import asyncio
+    from fifa_service import QueryService, serve
+    from fifa_store import StaleStoreError
+    try:
+        service = QueryService(args.store, cache_size=args.cache_size, source=args.zip or None)
+    except StaleStoreError as e:
+        sys.exit(str(e))
+    ready = lambda: print('%d players from %s served on http://%s:%d' % (len(service.data.df), args.store, args.host, args.port), flush=True)
+    try:
+        asyncio.run(serve(service, args.host, args.port, ready))
+    except KeyboardInterrupt:
+        pass
+
+
+def load_test(args):
+    from fifa_service import load_test, workload
+    server = None
+    if args.start:
+        server = subprocess.Popen([sys.executable, os.path.abspath(__file__), '--store', args.store, 'serve', '--zip', args.zip,
+                                   '--host', args.host, '--port', str(args.port)], stdout=subprocess.PIPE)
+        server.stdout.readline()  # the service is up once it prints its address
+    try:
+        table, stats = load_test(workload(args.store, args.requests, args.seed), args.host, args.port, args.concurrency)
+    except ConnectionRefusedError:
+        sys.exit('no service on %s:%d, start one with `fifa.py serve` or pass --start' % (args.host, args.port))
+    finally:
+        if server:
+            server.terminate()
+            server.wait()
+    print(table.to_string(float_format=lambda v: '%.4g' % v))
+    print('cache %d hits, %d misses' % (stats['cache_hits'], stats['cache_misses']))
+
+
+def editions(args):
+    from fifa_editions import build_editions
+    t = time.perf_counter()
+    df = build_editions(args.directory, args.out, processes=args.processes)
+    print(df.groupby('Edition', observed=True).size().to_string())
+    print('%d players of %d editions saved to %s in %.1fs' % (len(df), df.Edition.nunique(), args.out, time.perf_counter() - t))
+
+
+def bench_startup(args):
+    '''Cold start time of a scouting query, compared with a bare interpreter'''
+    def timed(cmd):
+        runs = []
+        for _ in range(args.repeat):
+            t = time.perf_counter()
+            subprocess.run(cmd, check=True, stdout=subprocess.DEVNULL)
+            runs.append(time.perf_counter() - t)
+        return sorted(runs)[len(runs) // 2]
+    bare = timed([sys.executable, '-c', 'pass'])
+    query = timed([sys.executable, os.path.abspath(__file__), '--store', args.store, 'scout', '--zip', args.zip,
+                   '--where', 'Age<27', '--where', 'Position in LB,LWB', '--sort', 'Overall', '--columns', 'Name,Club,Overall'])
+    print('bare interpreter %.0fms, scout query %.0fms, overhead %.0fms' % (bare * 1e3, query * 1e3, (query - bare) * 1e3))
+    if args.max_overhead is not None and (query - bare) * 1e3 > args.max_overhead:
+        sys.exit('scout start up overhead above %dms' % args.max_overhead)
+
+
+def synth(args):
+    from fifa_synth import synthetic_path, write_synthetic
+    t = time.perf_counter()
+    path = write_synthetic(args.scale, args.out or synthetic_path(args.scale), seed=args.seed)
+    print('synthetic export x%g written to %s in %.1fs' % (args.scale, path, time.perf_counter() - t))
+
+
+def bench(args):
+    import fifa_bench
+    baseline = fifa_bench.load_baseline(args.scale, args.baselines)
+    results = fifa_bench.run_scale(args.scale, repeat=args.repeat, seed=args.seed)
+    table = fifa_bench.compare(results, baseline, tolerance=args.tolerance)
+    print(table.to_string(float_format=lambda v: '%.4g' % v))
+    if baseline is None and not args.save_baseline:
+        print('no baseline of x%g on this machine, save one with --save-baseline' % args.scale)
+    if args.save_baseline:
+        fifa_bench.save_baseline(results, args.scale, args.baselines)
+        print('baseline of x%g on %s saved to %s' % (args.scale, fifa_bench.machine_key(), args.baselines))
+    elif table.regression.any():
+        sys.exit('%d benchmarks slower than %.2f times their baseline' % (table.regression.sum(), args.tolerance))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='fifa', description='FIFA 19 player data cleaning and analysis')
+    parser.add_argument('--store', default=STORE_DIR, help='directory of the clean columnar store')
+    parser.add_argument('--profile', metavar='JSON', help='record time and memory of every step to this file')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    p = sub.add_parser('ingest', help='read the export from the zip file')
+    p.add_argument('--zip', default=ZIP_PATH)
+    p.add_argument('--chunksize', type=int, default=50000)
+    p.set_defaults(func=ingest)
+
+    p = sub.add_parser('clean', help='clean the export and save the store')
+    p.add_argument('--zip', default=ZIP_PATH)
+    p.add_argument('--cache', default='.fifa_cache', help='directory of the cached stage outputs')
+    p.add_argument('--no-cache', action='store_true', help='run every stage without reading or writing the cache')
+    p.set_defaults(func=clean)
+
+    p = sub.add_parser('composites', help='add the composite attributes to the store')
+    p.add_argument('--zip', default=ZIP_PATH, help='export the store must have been built from, "" to skip the check')
+    p.set_defaults(func=composites)
+
+    p = sub.add_parser('scout', help='search players')
+    p.add_argument('--zip', default=ZIP_PATH, help='export the store must have been built from, "" to skip the check')
+    p.add_argument('--where', type=_condition, action='append', default=[],
+                   help='condition like "Age<27", "Rating>=78" or "Position in LB,LWB", repeatable')
+    p.add_argument('--sort', help='comma separated columns to order by')
+    p.add_argument('--ascending', action='store_true')
+    p.add_argument('--k', type=int, default=20, help='number of players shown')
+    p.add_argument('--columns', default=SCOUT_COLUMNS)
+    p.set_defaults(func=scout)
+
+    p = sub.add_parser('report', help='breakdowns of the clean data')
+    p.add_argument('--zip', default=ZIP_PATH, help='export the store must have been built from, "" to skip the check')
+    p.add_argument('--charts', action='store_true', help='also render the charts to image files')
+    p.add_argument('--out', default='charts')
+    p.add_argument('--processes', type=int, default=None)
+    p.add_argument('--mode', choices=['auto', 'full', 'binned'], default='auto',
+                   help='draw every row, or summaries of the columns (auto: binned for large tables)')
+    p.set_defaults(func=report)
+
+    p = sub.add_parser('validate', help='check the raw export and the clean store against the data quality rules')
+    p.add_argument('--zip', default=ZIP_PATH)
+    p.add_argument('--store-only', action='store_true', help='only check the clean store')
+    p.add_argument('--all', action='store_true', help='also list the rules without violations')
+    p.add_argument('--details', metavar='CSV', help='write every violation (rule, row, ID) to this file')
+    p.set_defaults(func=validate)
+
+    p = sub.add_parser('positions', help='leaderboards of the positional ratings')
+    p.add_argument('--zip', default=ZIP_PATH, help='export the store must have been built from, "" to skip the check')
+    p.add_argument('--top', type=int, default=5)
+    p.add_argument('--position', help='comma separated positions (all 26 by default)')
+    p.add_argument('--within', type=int, default=2, help='points from the best rating counted as versatile')
+    p.set_defaults(func=positions)
+
+    p = sub.add_parser('squad', help='best squad under a transfer budget and a wage bill')
+    p.add_argument('--zip', default=ZIP_PATH, help='export the store must have been built from, "" to skip the check')
+    p.add_argument('--formation', default='4-3-3')
+    p.add_argument('--slots', help='comma separated open positions instead of a formation, e.g. LB,CB')
+    p.add_argument('--score', default='Rating', help='column to maximize, Rating or a composite')
+    p.add_argument('--cost', default='Value', help='Value or Release Clause')
+    p.add_argument('--budget', type=_money, help='total cost cap, e.g. 100M')
+    p.add_argument('--wage-budget', type=_money, help='total wage cap, e.g. 300K')
+    p.add_argument('--where', type=_condition, action='append', default=[],
+                   help='condition like "Age<27" or "Contract Valid Until>=2021", repeatable')
+    p.add_argument('--time-limit', type=float, default=1.0, help='seconds before the best squad found is returned')
+    p.set_defaults(func=squad)
+
+    p = sub.add_parser('clubs', help='contract renewal and weakness report of every club')
+    p.add_argument('--zip', default=ZIP_PATH, help='export the store must have been built from, "" to skip the check')
+    p.add_argument('--due-before', type=int, default=2021, help='contracts ending before this year are due')
+    p.add_argument('--k', type=int, default=5, help='replacements per flagged player')
+    p.add_argument('--max-age', type=int, default=30, help='replacements younger than this')
+    p.add_argument('--max-value', type=_money, help='replacements valued at most this, e.g. 20M')
+    p.add_argument('--top', type=int, default=10, help='clubs shown, by value of the contracts due')
+    p.add_argument('--out', default='club_reports')
+    p.add_argument('--processes', type=int, default=None)
+    p.set_defaults(func=clubs)
+
+    p = sub.add_parser('serve', help='serve scouting queries over HTTP on localhost')
+    p.add_argument('--zip', default=ZIP_PATH, help='export the store must have been built from, "" to skip the check')
+    p.add_argument('--host', default='127.0.0.1')
+    p.add_argument('--port', type=int, default=8019)
+    p.add_argument('--cache-size', type=int, default=1024, help='number of answers kept in the LRU cache')
+    p.set_defaults(func=serve)
+
+    p = sub.add_parser('load-test', help='latency and throughput of the scouting service')
+    p.add_argument('--zip', default=ZIP_PATH, help='export the store must have been built from, "" to skip the check')
+    p.add_argument('--host', default='127.0.0.1')
+    p.add_argument('--port', type=int, default=8019)
+    p.add_argument('--start', action='store_true', help='start a service on the store for the test')
+    p.add_argument('--requests', type=int, default=2000)
+    p.add_argument('--concurrency', type=int, default=8, help='number of connections sending requests')
+    p.add_argument('--seed', type=int, default=0)
+    p.set_defaults(func=load_test)
+
+    p = sub.add_parser('editions', help='clean a directory of exports into one store keyed by edition')
+    p.add_argument('directory')
+    p.add_argument('--out', default='fifa_editions')
+    p.add_argument('--processes', type=int, default=None)
+    p.set_defaults(func=editions)
+
+    p = sub.add_parser('bench-startup', help='time the cold start of a scouting query')
+    p.add_argument('--zip', default=ZIP_PATH, help='export the store must have been built from, "" to skip the check')
+    p.add_argument('--repeat', type=int, default=10)
+    p.add_argument('--max-overhead', type=float, default=None, help='fail when the overhead is above this many ms')
+    p.set_defaults(func=bench_startup)
+
+    p = sub.add_parser('synth', help='write a synthetic export at some multiple of the real size')
+    p.add_argument('--scale', type=float, default=10)
+    p.add_argument('--seed', type=int, default=0)
+    p.add_argument('--out', help='zip file to write (synthetic/fifa19_x<scale>.zip by default)')
+    p.set_defaults(func=synth)
+
+    p = sub.add_parser('bench', help='benchmark the main steps on a synthetic export')
+    p.add_argument('--scale', type=float, default=10)
+    p.add_argument('--seed', type=int, default=0)
+    p.add_argument('--repeat', type=int, default=3)
+    p.add_argument('--baselines', default='.fifa_bench/baselines.json', help='baselines of every machine, kept out of git')
+    p.add_argument('--tolerance', type=float, default=1.25, help='slowdown over the baseline reported as a regression')
+    p.add_argument('--save-baseline', action='store_true', help='store these times as the baseline of the scale')
+    p.set_defaults(func=bench)
+
+    args = parser.parse_args(argv)
+    if not args.profile:
+        return args.func(args)
+    import fifa_instrument
+    fifa_instrument.enable()
+    with fifa_instrument.step(args.command):
+        args.func(args)
+    fifa_instrument.write_json(args.profile)
+    print(fifa_instrument.summary(), file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
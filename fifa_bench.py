@@ -0,0 +1,113 @@
+import json
+import os
+import platform
+import time
+import numpy as np
+import pandas as pd
+
+import fifa_ingest
+from fifa_clean import clean_players
+from fifa_composites import add_composites, compute_composites
+from fifa_impute import impute_grouped
+from fifa_parsers import POS_COLS, parse_columns
+from fifa_scout import SCOUT_QUERIES, ScoutIndex
+from fifa_synth import ensure_synthetic
+
+# Benchmark suite of the main steps on synthetic exports of 10x, 100x or 1000x the real size (see fifa_synth.py).
+# Every benchmark is timed on the same input a few times and the best time is kept.
+# The times of a scale can be saved as its baseline, later runs are compared to it and the steps
+# slower than baseline * tolerance are reported as regressions.
+# Times only compare on the same hardware: baselines are saved per machine (host, architecture, cores)
+# in a local file that is not part of the repository, a machine without its own baseline has none.
+
+BASELINE_PATH = '.fifa_bench/baselines.json'
+MONEY_COLS = ['Value', 'Wage', 'Release Clause']
+
+
+def best_time(func, repeat=3):
+    '''Best wall time of repeat calls of func, in seconds'''
+    times = []
+    for _ in range(repeat):
+        t = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - t)
+    return min(times)
+
+
+def run_benchmarks(zip_path, repeat=3, query_repeat=20):
+    '''Seconds of every benchmark on the export of zip_path, with the number of rows it ran on'''
+    results = {}
+    def bench(name, func, rows, repeat=repeat):
+        results[name] = {'rows': rows, 'seconds': best_time(func, repeat)}
+
+    raw = fifa_ingest.load_players(zip_path)
+    n = len(raw)
+    bench('ingest', lambda: fifa_ingest.load_players(zip_path), n, repeat=1)
+    bench('parse currency', lambda: parse_columns(raw[MONEY_COLS].copy(), currency=MONEY_COLS,
+                                                  height=None, weight=None, positional=()), n)
+    bench('parse height weight', lambda: parse_columns(raw[['Height', 'Weight']].copy(), currency=(), positional=()), n)
+    bench('parse positional', lambda: parse_columns(raw[POS_COLS].copy(), currency=(), height=None, weight=None), n)
+
+    money = raw[['Overall'] + MONEY_COLS].copy()
+    parse_columns(money, currency=MONEY_COLS, height=None, weight=None, positional=())
+    bench('impute release clause', lambda: impute_grouped(money, 'Release Clause', by='Overall'), n)
+
+    clean, _ = clean_players(raw)
+    del raw, money
+    bench('composites', lambda: compute_composites(clean), len(clean))
+    add_composites(clean)
+    bench('scout index', lambda: ScoutIndex(clean), len(clean))
+    index = ScoutIndex(clean)
+    for i, (where, sort_by, _) in enumerate(SCOUT_QUERIES):
+        bench('scout query %d' % (i + 1), lambda: index.query_positions(where, sort_by), len(clean), repeat=query_repeat)
+    return results
+
+
+def machine():
+    return {'python': platform.python_version(), 'pandas': pd.__version__, 'numpy': np.__version__,
+            'host': platform.node(), 'machine': platform.machine(), 'cpus': os.cpu_count()}
+
+
+def machine_key(info=None):
+    '''Key of the baselines of a machine, its host, architecture and number of cores'''
+    info = info or machine()
+    return '%s %s %dcpu' % (info['host'], info['machine'], info['cpus'] or 0)
+
+
+def load_baselines(path=BASELINE_PATH):
+    '''All the baselines of the file, machine key -> scale -> baseline'''
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def load_baseline(scale, path=BASELINE_PATH):
+    '''Baseline of this scale saved on this machine, None if there is none'''
+    return load_baselines(path).get(machine_key(), {}).get('x%g' % scale)
+
+
+def save_baseline(results, scale, path=BASELINE_PATH):
+    '''Store results as the baseline of this scale on this machine (other scales and machines are kept)'''
+    baselines = load_baselines(path)
+    info = machine()
+    baselines.setdefault(machine_key(info), {})['x%g' % scale] = {'machine': info, 'results': results}
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(baselines, f, indent=1, sort_keys=True)
+
+
+def compare(results, baseline, tolerance=1.25):
+    '''Table of every benchmark against its baseline, regression when seconds > baseline * tolerance'''
+    table = pd.DataFrame.from_dict(results, orient='index')[['rows', 'seconds']]
+    table['rows/s'] = table['rows'] / table['seconds']
+    base = baseline.get('results', {}) if baseline else {}
+    table['baseline'] = [base[name]['seconds'] if name in base else np.nan for name in table.index]
+    table['ratio'] = table['seconds'] / table['baseline']
+    table['regression'] = table['ratio'] > tolerance
+    return table
+
+
+def run_scale(scale, repeat=3, seed=0):
+    '''Write (once) the synthetic export of this scale and benchmark it'''
+    return run_benchmarks(ensure_synthetic(scale, seed), repeat=repeat)
@@ -0,0 +1,228 @@
+import numpy as np
+import pandas as pd
+
+from fifa_instrument import instrumented
+
+# Summaries of the player table for charts of any size.
+# Instead of every row, a chart is fed what it draws: counts per value, histograms, KDE curves on a grid,
+# binned means with their confidence band and quantiles, or a stratified sample of a few thousand rows for
+# scatter plots. They are computed with NumPy in one pass over a column (bincount), so drawing takes
+# the same time at 18k or 18M rows.
+#   - numeric columns with at most MAX_DISCRETE distinct values and text columns are discrete: one group
+#     per value, sorted for numbers, in order of appearance for text (as seaborn orders them)
+#   - other numeric columns are cut in XBINS bins of equal player counts when used as groups
+#   - KDEs are Gaussian with Scott's bandwidth (seaborn's default), counts are linearly binned on a GRID point
+#     grid and convolved with the sampled kernel, which is exact up to the grid spacing
+#   - the confidence band of a binned mean is mean +- 1.96 standard errors instead of seaborn's bootstrap
+# BinnedFrame computes the preparation of a column (groups, finite values) once and shares it between charts.
+
+GRID = 256
+XBINS = 64
+MAX_DISCRETE = 128
+SAMPLE_ROWS = 2000
+KDE_CUT = 2  # KDE drawn up to 2 bandwidths beyond the data, like seaborn's violins
+
+
+def _group_starts(sorted_codes, n_groups):
+    return np.searchsorted(sorted_codes, np.arange(n_groups + 1))
+
+
+def grouped_quantiles(values, codes, n_groups, qs=(0.25, 0.5, 0.75)):
+    '''Quantiles (linear interpolation, like np.quantile) of values per group, groups x len(qs), nan for empty groups'''
+    keep = (codes >= 0) & ~np.isnan(values)
+    values, codes = values[keep], codes[keep]
+    order = np.lexsort((values, codes))
+    values, codes = values[order], codes[order]
+    starts = _group_starts(codes, n_groups)
+    size = np.diff(starts)
+    out = np.full((n_groups, len(qs)), np.nan)
+    full = size > 0
+    for j, q in enumerate(qs):
+        rank = q * (size[full] - 1)
+        lo = starts[:-1][full] + np.floor(rank).astype(np.int64)
+        hi = starts[:-1][full] + np.ceil(rank).astype(np.int64)
+        out[full, j] = values[lo] + (values[hi] - values[lo]) * (rank - np.floor(rank))
+    return out
+
+
+def grouped_moments(values, codes, n_groups):
+    '''Count, mean and standard deviation (ddof 1) of values per group'''
+    keep = (codes >= 0) & ~np.isnan(values)
+    values, codes = values[keep], codes[keep]
+    n = np.bincount(codes, minlength=n_groups)
+    total = np.bincount(codes, weights=values, minlength=n_groups)
+    mean = np.where(n > 0, total / np.maximum(n, 1), np.nan)
+    dev = np.bincount(codes, weights=(values - mean[codes]) ** 2, minlength=n_groups)
+    std = np.where(n > 1, np.sqrt(dev / np.maximum(n - 1, 1)), np.nan)
+    return n, mean, std
+
+
+def kde_grid(values, codes, n_groups, grid=GRID, cut=KDE_CUT):
+    '''
+    Gaussian KDE of values per group on one grid: (grid points, groups x points densities).
+    Every group has its own bandwidth and integrates to 1, densities are 0 beyond cut bandwidths of its data.
+    Groups of a single value have no spread to estimate a bandwidth from, their densities are all 0.
+    '''
+    keep = (codes >= 0) & ~np.isnan(values)
+    values, codes = values[keep], codes[keep]
+    n, _, std = grouped_moments(values, codes, n_groups)
+    lo_g = np.full(n_groups, np.inf)
+    hi_g = np.full(n_groups, -np.inf)
+    np.minimum.at(lo_g, codes, values)
+    np.maximum.at(hi_g, codes, values)
+    spread = np.nan_to_num(std) > 0
+    bw = np.where(spread, np.nan_to_num(std), 1.0) * np.maximum(n, 1) ** -0.2  # Scott's rule
+    start = np.min((lo_g - cut * bw)[n > 0], initial=np.inf) if len(values) else 0.0
+    stop = np.max((hi_g + cut * bw)[n > 0], initial=-np.inf) if len(values) else 1.0
+    if stop <= start:
+        start, stop = start - 1, stop + 1
+    points = np.linspace(start, stop, grid)
+    dx = points[1] - points[0]
+    # linear binning: every value split between its two neighbouring grid points
+    pos = (values - start) / dx
+    i = np.minimum(np.floor(pos).astype(np.int64), grid - 2)
+    frac = pos - i
+    counts = (np.bincount(codes * grid + i, weights=1 - frac, minlength=n_groups * grid)
+              + np.bincount(codes * grid + i + 1, weights=frac, minlength=n_groups * grid)).reshape(n_groups, grid)
+    density = np.zeros((n_groups, grid))
+    for g in np.flatnonzero(spread):
+        half = min(int(np.ceil(4 * bw[g] / dx)), grid - 1)
+        offsets = np.arange(-half, half + 1) * dx
+        kernel = np.exp(-0.5 * (offsets / bw[g]) ** 2) / (bw[g] * np.sqrt(2 * np.pi))
+        density[g] = np.convolve(counts[g], kernel)[half:half + grid] / n[g]
+        density[g, (points < lo_g[g] - cut * bw[g]) | (points > hi_g[g] + cut * bw[g])] = 0
+    return points, density
+
+
+class BinnedFrame:
+    '''Column summaries of a table, each column prepared once'''
+
+    @instrumented('prepare binned frame')
+    def __init__(self, df, grid=GRID, xbins=XBINS, sample_rows=SAMPLE_ROWS, seed=0):
+        self.df = df
+        self.grid, self.xbins, self.sample_rows, self.seed = grid, xbins, sample_rows, seed
+        self._values, self._groups = {}, {}
+
+    def __len__(self):
+        return len(self.df)
+
+    def values(self, name):
+        '''Column as float64, nan for missing'''
+        if name not in self._values:
+            self._values[name] = self.df[name].to_numpy(dtype=float, na_value=np.nan)
+        return self._values[name]
+
+    def groups(self, name):
+        '''(codes, labels) of a column used as groups, -1 for missing'''
+        if name not in self._groups:
+            col = self.df[name]
+            if col.dtype.kind not in 'biuf':
+                codes, labels = pd.factorize(col)
+                labels = np.asarray(labels, dtype=object)
+            else:
+                vals = self.values(name)
+                uniques = np.unique(vals[~np.isnan(vals)])
+                if len(uniques) <= MAX_DISCRETE:
+                    codes = np.searchsorted(uniques, vals)
+                    codes[np.isnan(vals)] = -1
+                    labels = uniques.astype(np.int64) if (uniques == np.round(uniques)).all() else uniques
+                else:
+                    # bins of equal counts, labelled by the mean value of their players
+                    edges = np.unique(np.quantile(vals[~np.isnan(vals)], np.linspace(0, 1, self.xbins + 1)))
+                    codes = np.clip(np.searchsorted(edges, vals, 'right') - 1, 0, len(edges) - 2)
+                    codes[np.isnan(vals)] = -1
+                    _, labels, _ = grouped_moments(vals, codes, len(edges) - 1)
+            self._groups[name] = (codes.astype(np.int64), labels)
+        return self._groups[name]
+
+    def counts(self, name):
+        '''Number of players per value of a discrete column, like value_counts in the order of the groups'''
+        codes, labels = self.groups(name)
+        return labels, np.bincount(codes[codes >= 0], minlength=len(labels))
+
+    def histogram(self, name, bins=None):
+        '''
+        (edges, counts) of a numeric column. By default a bin per value for whole numbers with few distinct
+        values, else numpy's 'auto' bins, at most XBINS of them (long tails like Value get thousands otherwise).
+        '''
+        vals = self.values(name)
+        vals = vals[~np.isnan(vals)]
+        if bins is not None:
+            edges = np.histogram_bin_edges(vals, bins)
+        elif len(vals) and np.asarray(self.groups(name)[1]).dtype.kind in 'iu':
+            edges = np.arange(vals.min(), vals.max() + 2) - 0.5
+        else:
+            edges = np.histogram_bin_edges(vals, 'auto')
+            if len(edges) > self.xbins + 1:
+                edges = np.linspace(edges[0], edges[-1], self.xbins + 1)
+        i = np.clip(np.searchsorted(edges, vals, 'right') - 1, 0, len(edges) - 2)
+        return edges, np.bincount(i, minlength=len(edges) - 1)
+
+    def kde(self, name, by=None, hue=None):
+        '''
+        (labels, grid, densities) of the KDE of a numeric column, one row of densities per group of by
+        (and hue, groups being (by, hue) pairs then), a single row when by is None
+        '''
+        vals = self.values(name)
+        if by is None:
+            codes, labels = np.zeros(len(vals), dtype=np.int64), np.array([name], dtype=object)
+        else:
+            codes, labels = self.pairs(by, hue)
+        points, density = kde_grid(vals, codes, len(labels), self.grid)
+        return labels, points, density
+
+    def pairs(self, by, hue=None):
+        '''(codes, labels) of the groups of by, or of the (by, hue) pairs'''
+        codes, labels = self.groups(by)
+        if hue is None:
+            return codes, labels
+        hcodes, hlabels = self.groups(hue)
+        pairs = np.where((codes >= 0) & (hcodes >= 0), codes * len(hlabels) + hcodes, -1)
+        both = np.empty(len(labels) * len(hlabels), dtype=object)
+        both[:] = [(a, b) for a in labels for b in hlabels]
+        return pairs, both
+
+    def binned(self, x, y, hue=None, qs=(0.25, 0.5, 0.75)):
+        '''
+        Statistics of y per group of x (and hue): count, mean, the 95% confidence band of the mean and
+        the qs quantiles, one row per group with players
+        '''
+        codes, labels = self.pairs(x, hue)
+        vals = self.values(y)
+        n, mean, std = grouped_moments(vals, codes, len(labels))
+        half = 1.96 * np.nan_to_num(std) / np.sqrt(np.maximum(n, 1))
+        out = pd.DataFrame({'count': n, 'mean': mean, 'lo': mean - half, 'hi': mean + half})
+        quantiles = grouped_quantiles(vals, codes, len(labels), qs)
+        for j, q in enumerate(qs):
+            out['q%g' % (q * 100)] = quantiles[:, j]
+        if hue is None:
+            out.insert(0, x, labels)
+        else:
+            out.insert(0, x, [a for a, _ in labels])
+            out.insert(1, hue, [b for _, b in labels])
+        return out[n > 0].reset_index(drop=True)
+
+    def sample(self, columns, by=None, n=None):
+        '''
+        Stratified sample of about n rows (sample_rows by default) of the columns: every group of by (the
+        first column by default) keeps its share of the players and at least one, and the rows with the
+        min and max of every column are always in, so the axes cover the whole data
+        '''
+        columns = list(columns)
+        n = self.sample_rows if n is None else n
+        if len(self.df) <= n:
+            return self.df[columns]
+        codes, labels = self.groups(by or columns[0])
+        codes = np.where(codes >= 0, codes, len(labels))  # missing values are a stratum of their own
+        size = np.bincount(codes, minlength=len(labels) + 1)
+        quota = np.where(size > 0, np.maximum(np.round(size * n / len(codes)), 1), 0).astype(np.int64)
+        rng = np.random.default_rng(self.seed)
+        order = np.lexsort((rng.random(len(codes)), codes))
+        rank = np.arange(len(order)) - _group_starts(codes[order], len(labels) + 1)[codes[order]]
+        keep = np.zeros(len(codes), dtype=bool)
+        keep[order[rank < quota[codes[order]]]] = True
+        for c in columns:
+            vals = self.values(c) if self.df[c].dtype.kind in 'biuf' else None
+            if vals is not None and (~np.isnan(vals)).any():
+                keep[[np.nanargmin(vals), np.nanargmax(vals)]] = True
+        return self.df.iloc[np.flatnonzero(keep)][columns]
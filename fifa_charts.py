@@ -0,0 +1,323 @@
+import hashlib
+import json
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+
+from fifa_instrument import instrumented
+
+# Batch rendering of charts to image files.
+# A chart is described by a spec (a plain dict: kind, columns and plot options). Charts are drawn with the
+# non interactive Agg backend in a process pool (or in this process with its own backend), and each image
+# is named after a hash of its spec and a hash of the spec and of the data of the columns it uses. Rendering
+# again only draws the charts whose spec or data changed, and removes the images of the same spec drawn from
+# older data. Specs sharing a name (a violin with and without hue, full and binned mode) keep their own images.
+# Charts are drawn from every row with seaborn, or in binned mode from summaries of the columns
+# (histograms, KDE grids, binned means and quantiles, a stratified sample for scatter plots, see
+# fifa_binned.py) computed once in this process, so drawing time doesn't grow with the number of players.
+
+CHART_DIR = 'charts'
+BINNED_ROWS = 50000  # mode 'auto' draws from summaries above this many players
+
+
+'''Spec of a violin plot, same options as violinplot() in fifa-analysis-V1.py'''
+def violin_spec(disc_var, cont_var, fig_size_tup=(12, 5), palette='Set3', hue=None):
+    return {'kind': 'violin', 'name': '%s v %s' % (cont_var, disc_var), 'x': disc_var, 'y': cont_var, 'hue': hue,
+            'figsize': list(fig_size_tup), 'palette': palette}
+
+
+'''Spec of a count plot, title and palette as in the count plots of fifa-data-cleaning-V1.py'''
+def count_spec(feature, title=None, color='coolwarm', fig_size_tup=(12, 5)):
+    return {'kind': 'count', 'name': '%s count' % feature, 'x': feature,
+            'title': title or 'Distribution of Players across %s' % feature, 'figsize': list(fig_size_tup), 'palette': color}
+
+
+'''Spec of a distribution plot (histogram and KDE), colour as in the distribution plots of fifa-data-cleaning-V1.py'''
+def dist_spec(feature, col='g'):
+    return {'kind': 'dist', 'name': '%s distribution' % feature, 'x': feature, 'color': col, 'figsize': [12, 5]}
+
+
+'''Spec of a line plot of the mean of y (with its confidence band) against x, like sns.lineplot(df[x], df[y])'''
+def line_spec(x, y, fig_size_tup=(12, 5)):
+    return {'kind': 'line', 'name': '%s v %s line' % (y, x), 'x': x, 'y': y, 'figsize': list(fig_size_tup)}
+
+
+def pairplot_spec(vars, name='pairplot'):
+    return {'kind': 'pairplot', 'name': name, 'vars': list(vars)}
+
+
+def pairgrid_spec(x_vars, y_vars, height=4, name='pairgrid'):
+    return {'kind': 'pairgrid_line', 'name': name, 'x_vars': list(x_vars), 'y_vars': list(y_vars), 'height': height}
+
+
+# The charts of fifa-analysis-V1.py: continuous variables against discrete variables
+CONT_VAR = ['Age', 'Overall', 'Potential', 'Value', 'Wage', 'Special', 'Height (cms)', 'Weight (lbs)', 'Release Clause']
+DISC_VAR = ['Preferred Foot', 'International Reputation', 'Weak Foot', 'Skill Moves', 'Work Rate', 'Body Type', 'Position', 'Contract Valid Until']
+PAIRPLOT_VARS = ['Age', 'Overall', 'Value', 'Special', 'Height (cms)', 'Weight (lbs)', 'Release Clause']
+
+
+def report_specs(cont_var=CONT_VAR, disc_var=DISC_VAR, pair_vars=PAIRPLOT_VARS):
+    '''Violin plot of every continuous v/s discrete variable, the pair plot and the pair grid'''
+    specs = [violin_spec(x, y, fig_size_tup=(14, 7)) for x in disc_var for y in cont_var]
+    specs.append(pairplot_spec(pair_vars))
+    specs.append(pairgrid_spec(x_vars=disc_var, y_vars=cont_var, height=4))
+    return specs
+
+
+def spec_columns(spec):
+    '''Columns of the data a chart uses'''
+    cols = [spec.get(k) for k in ('x', 'y', 'hue')] + spec.get('vars', []) + spec.get('x_vars', []) + spec.get('y_vars', [])
+    return list(dict.fromkeys(c for c in cols if c))
+
+
+def chart_key(spec, data):
+    '''Hash of the spec and of the values of its columns'''
+    h = hashlib.sha256(json.dumps(spec, sort_keys=True, default=str).encode())
+    h.update(pd.util.hash_pandas_object(data[spec_columns(spec)], index=True).values.tobytes())
+    return h.hexdigest()[:16]
+
+
+def _draw(spec, data):
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+    if spec['kind'] == 'violin':
+        sns.set(style="whitegrid", palette="pastel", color_codes=True)
+        font_size = 16
+        title_size = 20
+        fig = plt.figure(figsize=spec['figsize'])
+        sns.violinplot(x=spec['x'], y=spec['y'], hue=spec['hue'], data=data, palette=spec['palette'])
+        plt.xlabel('%s' % spec['x'], fontsize=font_size)
+        plt.ylabel('%s' % spec['y'], fontsize=font_size)
+        plt.xticks(fontsize=font_size)
+        plt.yticks(fontsize=font_size)
+        plt.title('%s' % spec['y'] + ' v/s %s' % spec['x'], fontsize=title_size)
+        return fig
+    if spec['kind'] == 'pairplot':
+        return sns.pairplot(vars=spec['vars'], data=data).figure
+    if spec['kind'] == 'pairgrid_line':
+        g = sns.PairGrid(data, y_vars=spec['y_vars'], x_vars=spec['x_vars'], height=spec['height'])
+        g.map(sns.lineplot)
+        g.add_legend()
+        return g.figure
+    if spec['kind'] == 'count':
+        fig = plt.figure(figsize=spec['figsize'])
+        sns.countplot(x=spec['x'], hue=spec['x'], data=data, palette=spec['palette'], legend=False)
+        return _titles(spec, 'Count of the Players', spec['title'], 14)
+    if spec['kind'] == 'dist':
+        fig = plt.figure(figsize=spec['figsize'])
+        sns.histplot(x=spec['x'], data=data, kde=True, stat='density', color=spec['color'])
+        return _titles(spec, 'Count of the Players', '%s Distribution of Players' % spec['x'])
+    if spec['kind'] == 'line':
+        fig = plt.figure(figsize=spec['figsize'])
+        sns.lineplot(x=spec['x'], y=spec['y'], data=data)
+        return fig
+    raise ValueError('unknown chart kind %r' % (spec['kind'],))
+
+
+def _titles(spec, ylabel, title, font_size=16, title_size=20):
+    # axis labels and title of the count and distribution plots of fifa-data-cleaning-V1.py
+    import matplotlib.pyplot as plt
+    plt.xlabel('%s' % spec['x'], fontsize=font_size)
+    plt.ylabel(ylabel, fontsize=font_size)
+    plt.xticks(fontsize=font_size)
+    plt.yticks(fontsize=font_size)
+    plt.title(title, fontsize=title_size)
+    return plt.gcf()
+
+
+def _summary(spec, frame):
+    # what a chart of binned mode draws, from the BinnedFrame of the table
+    from fifa_binned import grouped_quantiles
+    kind = spec['kind']
+    if kind == 'violin':
+        codes, labels = frame.pairs(spec['x'], spec['hue'])
+        _, grid, density = frame.kde(spec['y'], by=spec['x'], hue=spec['hue'])
+        return {'x': frame.groups(spec['x'])[1], 'hue': frame.groups(spec['hue'])[1] if spec['hue'] else None,
+                'grid': grid, 'density': density, 'quartiles': grouped_quantiles(frame.values(spec['y']), codes, len(labels))}
+    if kind == 'pairplot':
+        return {'hist': {v: frame.histogram(v) for v in spec['vars']}, 'sample': frame.sample(spec['vars'])}
+    if kind == 'pairgrid_line':
+        return {(x, y): frame.binned(x, y) for x in spec['x_vars'] for y in spec['y_vars']}
+    if kind == 'count':
+        return frame.counts(spec['x'])
+    if kind == 'dist':
+        _, grid, density = frame.kde(spec['x'])
+        return {'hist': frame.histogram(spec['x']), 'grid': grid, 'density': density[0]}
+    if kind == 'line':
+        return frame.binned(spec['x'], spec['y'])
+    raise ValueError('unknown chart kind %r' % (kind,))
+
+
+def _positions(labels):
+    # x positions of groups: their value for numbers, 0, 1, ... with tick labels for text
+    labels = np.asarray(labels)
+    if labels.dtype.kind in 'biuf':
+        return labels, None
+    return np.arange(len(labels)), [str(l) for l in labels]
+
+
+def _mean_line(ax, stats, x, y, label=None):
+    xs, ticks = _positions(stats[x].to_numpy())
+    line, = ax.plot(xs, stats['mean'], label=label)
+    ax.fill_between(xs, stats['lo'], stats['hi'], color=line.get_color(), alpha=0.2, linewidth=0)
+    if ticks is not None:
+        ax.set_xticks(xs)
+        ax.set_xticklabels(ticks, rotation=90)
+    ax.set_xlabel(x)
+    ax.set_ylabel(y)
+
+
+def _draw_binned(spec, summary):
+    # the charts of _draw, drawn with matplotlib from the summaries of _summary
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+    kind = spec['kind']
+    if kind == 'violin':
+        sns.set(style="whitegrid", palette="pastel", color_codes=True)
+        fig, ax = plt.subplots(figsize=spec['figsize'])
+        n_hue = 1 if summary['hue'] is None else len(summary['hue'])
+        colors = sns.color_palette(spec['palette'], len(summary['x']) if n_hue == 1 else n_hue)
+        width = 0.8 / n_hue
+        scale = width / 2 / max(summary['density'].max(), 1e-300)  # one scale for all: equal areas, like seaborn
+        grid = summary['grid']
+        for g, (density, (q25, q50, q75)) in enumerate(zip(summary['density'], summary['quartiles'])):
+            i, h = divmod(g, n_hue)
+            center = i - 0.4 + width * (h + 0.5)
+            if not density.any():
+                # a single value (or none): a line, like seaborn
+                ax.hlines(q50, center - width / 2, center + width / 2, color='0.25', linewidth=1)
+                continue
+            shown = density > 0
+            ax.fill_betweenx(grid[shown], center - density[shown] * scale, center + density[shown] * scale,
+                             facecolor=colors[h if n_hue > 1 else i], edgecolor='0.25', linewidth=1)
+            ax.vlines(center, q25, q75, color='0.25', linewidth=4)
+            ax.scatter([center], [q50], color='white', s=12, zorder=3)
+        ax.set_xticks(range(len(summary['x'])))
+        ax.set_xticklabels([str(l) for l in summary['x']])
+        if n_hue > 1:
+            ax.legend(handles=[plt.Rectangle((0, 0), 1, 1, color=c) for c in colors], labels=list(summary['hue']), title=spec['hue'])
+        font_size = 16
+        plt.xlabel('%s' % spec['x'], fontsize=font_size)
+        plt.ylabel('%s' % spec['y'], fontsize=font_size)
+        plt.xticks(fontsize=font_size)
+        plt.yticks(fontsize=font_size)
+        plt.title('%s' % spec['y'] + ' v/s %s' % spec['x'], fontsize=20)
+        return fig
+    if kind == 'pairplot':
+        names = spec['vars']
+        sample = summary['sample']
+        fig, axes = plt.subplots(len(names), len(names), figsize=(2.5 * len(names),) * 2, squeeze=False)
+        for r, y in enumerate(names):
+            for c, x in enumerate(names):
+                ax = axes[r, c]
+                if r == c:
+                    edges, counts = summary['hist'][x]
+                    ax.hist(edges[:-1], edges, weights=counts)
+                else:
+                    ax.scatter(sample[x], sample[y], s=5, alpha=0.6)
+                ax.set_xlabel(x if r == len(names) - 1 else '')
+                ax.set_ylabel(y if c == 0 else '')
+        fig.tight_layout()
+        return fig
+    if kind == 'pairgrid_line':
+        x_vars, y_vars, h = spec['x_vars'], spec['y_vars'], spec['height']
+        fig, axes = plt.subplots(len(y_vars), len(x_vars), figsize=(h * len(x_vars), h * len(y_vars)),
+                                 sharex='col', sharey='row', squeeze=False)
+        for r, y in enumerate(y_vars):
+            for c, x in enumerate(x_vars):
+                _mean_line(axes[r, c], summary[(x, y)], x, y)
+                axes[r, c].set_xlabel(x if r == len(y_vars) - 1 else '')
+                axes[r, c].set_ylabel(y if c == 0 else '')
+        fig.tight_layout()
+        return fig
+    if kind == 'count':
+        labels, counts = summary
+        fig = plt.figure(figsize=spec['figsize'])
+        xs, ticks = np.arange(len(labels)), [str(l) for l in labels]
+        plt.bar(xs, counts, color=sns.color_palette(spec['palette'], len(labels)))
+        plt.gca().set_xticks(xs)
+        plt.gca().set_xticklabels(ticks)
+        return _titles(spec, 'Count of the Players', spec['title'], 14)
+    if kind == 'dist':
+        edges, counts = summary['hist']
+        fig = plt.figure(figsize=spec['figsize'])
+        plt.hist(edges[:-1], edges, weights=counts / max(counts.sum(), 1) / np.diff(edges), color=spec['color'], alpha=0.4)
+        plt.plot(summary['grid'], summary['density'], color=spec['color'])
+        return _titles(spec, 'Count of the Players', '%s Distribution of Players' % spec['x'])
+    if kind == 'line':
+        fig, ax = plt.subplots(figsize=spec['figsize'])
+        _mean_line(ax, summary, spec['x'], spec['y'])
+        return fig
+    raise ValueError('unknown chart kind %r' % (kind,))
+
+
+def _use_agg():
+    # initializer of the worker processes, the backend of the caller is left alone
+    import matplotlib
+    matplotlib.use('Agg')
+
+
+def _render(spec, data, path):
+    import matplotlib.pyplot as plt
+    # styles set by a chart (sns.set) are undone once it is saved
+    with plt.rc_context():
+        fig = _draw_binned(spec, data) if spec.get('mode') == 'binned' else _draw(spec, data)
+        fig.savefig(path)
+        plt.close(fig)
+    return path
+
+
+def _file_name(spec):
+    # name of the spec and hash of the spec alone, the images of one spec differ by the chart key only
+    name = ''.join(c if c.isalnum() or c in '-_' else '_' for c in spec['name'])
+    return '%s-%s' % (name, hashlib.sha256(json.dumps(spec, sort_keys=True, default=str).encode()).hexdigest()[:8])
+
+
+def _remove_stale(spec, out_dir, keep):
+    # images of the same spec drawn from older data, keep being the images just rendered
+    stale = re.compile(re.escape(_file_name(spec)) + r'-[0-9a-f]{16}\.png$')
+    for name in os.listdir(out_dir):
+        path = os.path.join(out_dir, name)
+        if stale.match(name) and path not in keep:
+            os.remove(path)
+
+
+def chart_path(spec, data, out_dir=CHART_DIR):
+    return os.path.join(out_dir, '%s-%s.png' % (_file_name(spec), chart_key(spec, data)))
+
+
+@instrumented('render charts')
+def render_charts(df, specs, out_dir=CHART_DIR, processes=None, mode='auto'):
+    '''
+    Render all specs to png files in out_dir, skipping charts already rendered with the same spec and data,
+    and remove the images of the same specs rendered before from other data.
+    processes is the size of the process pool (all cores by default, 1 to render in this process).
+    mode is 'full' (every row to seaborn), 'binned' (summaries of the columns, see fifa_binned.py) or
+    'auto' (binned above BINNED_ROWS players). Returns the list of image paths, in the order of specs.
+    '''
+    if mode not in ('auto', 'full', 'binned'):
+        raise ValueError('unknown mode %r' % (mode,))
+    binned = mode == 'binned' or (mode == 'auto' and len(df) > BINNED_ROWS)
+    if binned:
+        specs = [dict(spec, mode='binned') for spec in specs]
+    os.makedirs(out_dir, exist_ok=True)
+    paths = [chart_path(spec, df, out_dir) for spec in specs]
+    todo = [(spec, path) for spec, path in zip(specs, paths) if not os.path.exists(path)]
+    if binned and todo:
+        from fifa_binned import BinnedFrame
+        frame = BinnedFrame(df)
+        todo = [(spec, _summary(spec, frame), path) for spec, path in todo]
+    else:
+        todo = [(spec, df[spec_columns(spec)], path) for spec, path in todo]
+    if processes == 1:
+        for job in todo:
+            _render(*job)
+    elif todo:
+        with ProcessPoolExecutor(processes, initializer=_use_agg) as pool:
+            for future in [pool.submit(_render, *job) for job in todo]:
+                future.result()
+    for spec in specs:
+        _remove_stale(spec, out_dir, set(paths))
+    return paths
@@ -0,0 +1,125 @@
+import fifa_compact
+import fifa_impute
+import fifa_ingest
+import fifa_parsers
+from fifa_impute import impute_grouped
+from fifa_parsers import parse_columns
+from fifa_pipeline import Pipeline, Stage
+from fifa_store import source_hash
+
+# The cleaning rules of fifa-data-cleaning-V1.py as pipeline stages (see fifa_pipeline.py), without the
+# exploration and plots, so the clean data can be rebuilt from the command line (python fifa.py clean).
+# Each stage reads and writes named artifacts, 'players' being the player table as it goes through the
+# stages. With a cache directory, changing one rule (e.g. BODY_TYPES) only reruns that stage and the
+# stages after it, from the cached output of the stage before.
+
+BODY_TYPES = ['Normal', 'Lean', 'Stocky']
+
+
+def load(zip_path):
+    return fifa_ingest.load_players(zip_path)
+
+
+'''Players without club are kept aside as potential transfers'''
+def split_no_club(players):
+    return players.dropna(subset=['Club']).reset_index(drop=True), players[players.Club.isnull()]
+
+
+'''Players without Preferred Foot have no data for their positional skills and physical attributes'''
+def drop_no_foot(players):
+    return players.dropna(subset=['Preferred Foot']).reset_index(drop=True)
+
+
+'''Loaned players are assumed bought by their current club, contract until 2022, joined Jul 1, 2019'''
+def fix_loans(players, contract_until='2022', joined='Jul 1, 2019'):
+    players = players.drop(['Loaned From'], axis=1)
+    players.loc[players.Joined.isnull(), 'Contract Valid Until'] = contract_until
+    players['Joined'] = players.Joined.fillna(joined)
+    return players
+
+
+def convert_currency(players, columns=('Value', 'Wage', 'Release Clause')):
+    players = players.copy()
+    return players, parse_columns(players, currency=columns, height=None, weight=None, positional=())
+
+
+def impute_release_clause(players, by='Overall', how='mean'):
+    players = players.copy()
+    players['Release Clause'], report = impute_grouped(players, 'Release Clause', by=by, how=how)
+    return players, report
+
+
+'''Body Types other than the real ones are player names'''
+def normalize_body_type(players, body_types=BODY_TYPES, other='Lean'):
+    players = players.copy()
+    players.loc[~players['Body Type'].isin(body_types), 'Body Type'] = other
+    return players
+
+
+def contract_to_int(players):
+    players = players.copy()
+    players['Contract Valid Until'] = players['Contract Valid Until'].astype(int)
+    return players
+
+
+def convert_height_weight(players):
+    players = players.copy()
+    report = parse_columns(players, currency=(), positional=())
+    return players.rename(columns={'Height': 'Height (cms)', 'Weight': 'Weight (lbs)'}), report
+
+
+def convert_positional(players):
+    players = players.copy()
+    return players, parse_columns(players, currency=(), height=None, weight=None)
+
+
+def compact(players):
+    return fifa_compact.compact_players(players)
+
+
+def cleaning_stages(body_types=BODY_TYPES, impute_by='Overall', impute_how='mean'):
+    '''The cleaning stages, from the raw players to the clean (and compacted) ones'''
+    return [
+        Stage(split_no_club, ['players'], ['players', 'no_club']),
+        Stage(drop_no_foot, ['players'], ['players']),
+        Stage(fix_loans, ['players'], ['players']),
+        Stage(convert_currency, ['players'], ['players', 'malformed_currency'], uses=[fifa_parsers]),
+        Stage(impute_release_clause, ['players'], ['players', 'release_clause_fill'],
+              params={'by': impute_by, 'how': impute_how}, uses=[fifa_impute]),
+        Stage(normalize_body_type, ['players'], ['players'], params={'body_types': list(body_types)}),
+        Stage(contract_to_int, ['players'], ['players']),
+        Stage(convert_height_weight, ['players'], ['players', 'malformed_size'], uses=[fifa_parsers]),
+        Stage(convert_positional, ['players'], ['players', 'malformed_positional'], uses=[fifa_parsers]),
+        Stage(compact, ['players'], ['players', 'memory_report'], uses=[fifa_compact]),
+    ]
+
+
+def cleaning_pipeline(zip_path=fifa_ingest.ZIP_PATH, cache_dir='.fifa_cache', **options):
+    '''Pipeline reading the export from zip_path (fingerprinted by its sha256) and cleaning it'''
+    load_stage = Stage(load, [], ['players'], params={'zip_path': zip_path}, uses=[fifa_ingest],
+                       depends=lambda params: source_hash(params['zip_path']))
+    return Pipeline([load_stage] + cleaning_stages(**options), cache_dir=cache_dir)
+
+
+def _reports(result):
+    malformed = {}
+    for name in ('malformed_currency', 'malformed_size', 'malformed_positional'):
+        malformed.update(result[name])
+    return {'no_club': result['no_club'], 'malformed': malformed, 'release_clause_fill': result['release_clause_fill'],
+            'memory': result['memory_report']}
+
+
+def clean_players(df):
+    '''
+    Clean the raw export as loaded by fifa_ingest.load_players.
+    Returns the clean data and a dict of reports (players without club, malformed values, imputed values, memory).
+    '''
+    result = Pipeline(cleaning_stages(), cache_dir=None).run(inputs={'players': df})
+    return result['players'], _reports(result)
+
+
+def clean_export(zip_path=fifa_ingest.ZIP_PATH, cache_dir='.fifa_cache', **options):
+    '''Same as clean_players, loading the export and caching every stage. Also returns the stage log.'''
+    pipeline = cleaning_pipeline(zip_path, cache_dir, **options)
+    result = pipeline.run()
+    return result['players'], _reports(result), pipeline.log
@@ -0,0 +1,167 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+
+from fifa_instrument import instrumented
+from fifa_squad import SLOT_POSITIONS
+
+# Contract renewal and weakness report of every club at once, the Manchester United analysis of
+# fifa-analysis-V1.py generalized:
+#   - contracts due: players whose contract ends before due_before
+#   - low work rate: the players with a contract due and a low work rate (Darmian)
+#   - weakest defender: the defender with the lowest Mobility of the club (Jones)
+#   - replacements: for every low work rate and weakest defender player, the k best players of other
+#     clubs at the same slot (SLOT_POSITIONS) rated higher, younger than max_age and, for the weakest
+#     defender, more mobile
+# Every section is a grouped pass over the whole table (one sort by club, one factorize of the clubs),
+# and the replacements of all the flagged players of a slot are found together: a flagged players x
+# market players matrix of the conditions, the first k matches of every row in the order of the market.
+# Players are referred to by row position and ID, never looked up by Name.
+# write_club_reports writes one csv per club in a process pool.
+
+REPORT_DIR = 'club_reports'
+LOW_WORK_RATES = ['Medium/ Low', 'High/ Low', 'Low/ Medium', 'Low/ High', 'Low/ Low']
+DEFENDERS = ['LB', 'RB', 'CB', 'LCB', 'RCB', 'LWB', 'RWB']
+REPORT_COLUMNS = ['ID', 'Name', 'Club', 'Position', 'Age', 'Rating', 'Value', 'Wage', 'Release Clause',
+                  'Contract Valid Until', 'Work Rate', 'Defending', 'Mobility']
+POOL_BLOCK = 512  # market players compared with all the flagged players of a slot at a time
+
+
+def _first_per_group(rows, groups):
+    # rows already ordered within groups: the first row of every group
+    keep = np.ones(len(rows), dtype=bool)
+    keep[1:] = groups[rows][1:] != groups[rows][:-1]
+    return rows[keep]
+
+
+def _replacements(flagged, mobile, slot, club, rating, mobility, market, k):
+    # (index into flagged, candidate row, rank) of the first k market rows (already ordered best first) of
+    # the same slot and another club, rated higher and, where mobile is set, with a higher Mobility
+    # The market is walked in blocks, a flagged player leaves once he has k matches or once the market
+    # is rated no higher than him, so most of them only ever see the first block.
+    out = [np.empty((0, 3), dtype=np.int64)]
+    for s in np.unique(slot[flagged]):
+        f = np.flatnonzero(slot[flagged] == s)
+        pool = market[slot[market] == s]
+        found = np.zeros(len(flagged), dtype=np.int64)
+        for start in range(0, len(pool), POOL_BLOCK):
+            p = pool[start:start + POOL_BLOCK]
+            t, m = flagged[f], mobile[f]
+            ok = ((club[p][None, :] != club[t][:, None]) & (rating[p][None, :] > rating[t][:, None])
+                  & (~m[:, None] | (mobility[p][None, :] > mobility[t][:, None])))
+            rank = found[f][:, None] + np.cumsum(ok, axis=1)
+            i, j = np.nonzero(ok & (rank <= k))
+            out.append(np.column_stack([f[i], p[j], rank[i, j]]))
+            found[f] = rank[:, -1]
+            f = f[(found[f] < k) & (rating[flagged[f]] < rating[p[-1]])]
+            if not len(f):
+                break
+    found = np.vstack(out)
+    return found[np.lexsort((found[:, 2], found[:, 0]))]
+
+
+@instrumented('club reports')
+def club_reports(df, due_before=2021, low_work_rates=LOW_WORK_RATES, k=5, max_age=30, max_value=None):
+    '''
+    Contract renewal and weakness report of every club of df (with the composites).
+    Returns a summary (one row per club) and the details (one row per club, section and player:
+    'contract due', 'low work rate', 'weakest defender' and 'replacement', the replacements with the ID
+    of the player they replace and their rank).
+    '''
+    club, clubs = pd.factorize(df['Club'])
+    rating = df['Rating'].to_numpy(dtype=float)
+    mobility = df['Mobility'].to_numpy(dtype=float)
+    contract = df['Contract Valid Until'].to_numpy(dtype=float)
+    value = df['Value'].to_numpy(dtype=float)
+    ids = df['ID'].to_numpy()
+    due = (contract < due_before) & (club >= 0)
+    low = due & df['Work Rate'].isin(low_work_rates).to_numpy()
+
+    # one sort of the players by club, then key: contracts due by (contract, value), defenders by mobility
+    rows = np.flatnonzero(due)
+    due_rows = rows[np.lexsort((value[rows], contract[rows], club[rows]))]
+    low_rows = due_rows[low[due_rows]]
+    rows = np.flatnonzero(df['Position'].isin(DEFENDERS).to_numpy() & ~np.isnan(mobility) & (club >= 0))
+    weakest = _first_per_group(rows[np.lexsort((rows, mobility[rows], club[rows]))], club)
+
+    # replacements of the low work rate players and of the weakest defenders, slot by slot
+    slot_of = {p: i for i, ps in enumerate(SLOT_POSITIONS.values()) for p in ps}
+    codes, positions = pd.factorize(df['Position'])
+    slot = np.array([slot_of.get(p, -1) for p in positions] + [-1])[codes]
+    market = (df['Age'].to_numpy() < max_age) & ~np.isnan(rating) & (club >= 0) & (slot >= 0)
+    if max_value is not None:
+        market &= value <= max_value
+    market = np.flatnonzero(market)
+    market = market[np.lexsort((market, value[market], -rating[market]))]
+    flagged = np.concatenate([low_rows, weakest])
+    mobile = np.r_[np.zeros(len(low_rows), dtype=bool), np.ones(len(weakest), dtype=bool)]
+    keep = slot[flagged] >= 0
+    flagged, mobile = flagged[keep], mobile[keep]
+    found = _replacements(flagged, mobile, slot, club, rating, mobility, market, k)
+    found[:, 0] = flagged[found[:, 0]]  # flagged players in section order, low work rate first
+
+    columns = [c for c in REPORT_COLUMNS if c in df.columns]
+    sections = [('contract due', due_rows, club[due_rows], None, None), ('low work rate', low_rows, club[low_rows], None, None),
+                ('weakest defender', weakest, club[weakest], None, None),
+                ('replacement', found[:, 1], club[found[:, 0]], ids[found[:, 0]], found[:, 2])]
+    parts = []
+    for name, rows, report_club, replaces, rank in sections:
+        part = df.iloc[rows][columns].reset_index(drop=True)
+        part.insert(0, 'Report', clubs[report_club])
+        part.insert(1, 'Section', name)
+        part.insert(2, 'Replaces', pd.array(replaces if replaces is not None else [pd.NA] * len(rows), dtype='Int64'))
+        part.insert(3, 'Rank', pd.array(rank if rank is not None else [pd.NA] * len(rows), dtype='Int64'))
+        parts.append(part)
+    details = pd.concat(parts, ignore_index=True)
+    order = {name: i for i, (name, *_) in enumerate(sections)}
+    details = details.iloc[np.lexsort((details['Section'].map(order).to_numpy(), pd.factorize(details['Report'], sort=True)[0]))]
+    details = details.reset_index(drop=True)
+
+    n = len(clubs)
+    count = lambda rows: np.bincount(club[rows], minlength=n)
+    summary = pd.DataFrame({
+        'Players': count(np.flatnonzero(club >= 0)),
+        'Squad Value': np.bincount(club[club >= 0], weights=np.nan_to_num(value[club >= 0]), minlength=n),
+        'Contracts Due': count(due_rows),
+        'Value Due': np.bincount(club[due_rows], weights=np.nan_to_num(value[due_rows]), minlength=n),
+        'Low Work Rate': count(low_rows),
+        'Replacements': np.bincount(club[found[:, 0]], minlength=n),
+    }, index=pd.Index(clubs, name='Club'))
+    weak = pd.DataFrame({'Weakest Defender': df['Name'].to_numpy()[weakest], 'Mobility': mobility[weakest]},
+                        index=pd.Index(clubs[club[weakest]], name='Club'))
+    return summary.join(weak).sort_index(), details
+
+
+def report_path(club, out_dir=REPORT_DIR):
+    name = ''.join(c if c.isalnum() or c in '-_' else '_' for c in club)
+    return os.path.join(out_dir, '%s.csv' % name)
+
+
+def _write(jobs):
+    for path, part in jobs:
+        part.to_csv(path, index=False)
+    return len(jobs)
+
+
+@instrumented('write club reports')
+def write_club_reports(summary, details, out_dir=REPORT_DIR, processes=None):
+    '''
+    Write the summary to out_dir/clubs.csv and the details of every club to its own csv, in a process pool
+    (all cores by default, 1 to write in this process). Returns the paths of the club files.
+    '''
+    os.makedirs(out_dir, exist_ok=True)
+    summary.to_csv(os.path.join(out_dir, 'clubs.csv'))
+    # details are ordered by club already: split at the club boundaries
+    clubs = details['Report'].to_numpy()
+    bounds = np.flatnonzero(np.r_[True, clubs[1:] != clubs[:-1], True])
+    jobs = [(report_path(clubs[a], out_dir), details.iloc[a:b].drop(columns='Report'))
+            for a, b in zip(bounds[:-1], bounds[1:])]
+    if processes == 1:
+        _write(jobs)
+    elif jobs:
+        # a few batches per process, one small file per task would cost more to send than to write
+        n = (processes or os.cpu_count() or 1) * 4
+        with ProcessPoolExecutor(processes) as pool:
+            list(pool.map(_write, [jobs[i::n] for i in range(n)]))
+    return [path for path, _ in jobs]
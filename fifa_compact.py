@@ -0,0 +1,50 @@
+import numpy as np
+import pandas as pd
+
+from fifa_instrument import instrumented
+
+# Compact dtypes for the clean player table.
+#   - low cardinality text (Nationality, Club, Position, Work Rate, Body Type, Preferred Foot) -> category
+#   - whole number columns (ratings, Age, Special, Contract Valid Until, ...) -> smallest int that holds them
+#     (columns with nulls, like the positional ratings of GKs, stay float but as float32)
+#   - money (Value, Wage, Release Clause) -> float32
+#   - Joined -> datetime
+# The report lists the memory of every column before and after.
+
+CATEGORY_COLS = ['Nationality', 'Club', 'Position', 'Work Rate', 'Body Type', 'Preferred Foot']
+MONEY_COLS = ['Value', 'Wage', 'Release Clause']
+DATE_COLS = {'Joined': '%b %d, %Y'}
+
+
+def _compact_column(col):
+    if col.name in DATE_COLS:
+        return pd.to_datetime(col, format=DATE_COLS[col.name])
+    if col.name in CATEGORY_COLS:
+        return col.astype('category')
+    if col.name in MONEY_COLS:
+        return col.astype(np.float32)
+    if col.dtype.kind in 'iu':
+        return pd.to_numeric(col, downcast='integer')
+    if col.dtype.kind == 'f':
+        values = col.to_numpy()
+        if not np.isnan(values).any() and np.array_equal(values, np.round(values)):
+            return pd.to_numeric(col.astype(np.int64), downcast='integer')
+        return col.astype(np.float32)
+    return col
+
+
+def memory_report(before, after):
+    '''Memory of every column (bytes, strings counted) before and after compaction, with a total row'''
+    report = pd.DataFrame({'dtype before': before.dtypes.astype(str), 'dtype after': after.dtypes.astype(str),
+                           'bytes before': before.memory_usage(deep=True, index=False),
+                           'bytes after': after.memory_usage(deep=True, index=False)})
+    report.loc['total'] = ['', '', report['bytes before'].sum(), report['bytes after'].sum()]
+    report['ratio'] = report['bytes before'] / report['bytes after']
+    return report
+
+
+@instrumented('compact dtypes')
+def compact_players(df):
+    '''Compact copy of the clean player table and its memory report'''
+    compact = pd.DataFrame({name: _compact_column(col) for name, col in df.items()}, index=df.index)
+    return compact, memory_report(df, compact)
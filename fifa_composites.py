@@ -0,0 +1,52 @@
+import numpy as np
+import pandas as pd
+
+from fifa_instrument import instrumented
+
+# Composite attributes (Defending, General, ...) computed as weighted averages of skill columns.
+# Each composite is one column of a weight matrix over the skill block, so all composites
+# are computed together with a single matrix multiply instead of one df.apply(axis=1) pass each.
+
+# name -> list of columns (equal weights) or dict of column -> weight
+COMPOSITES = {
+    'Defending': ['Marking', 'StandingTackle', 'SlidingTackle'],
+    'General': ['HeadingAccuracy', 'Dribbling', 'Curve', 'BallControl', 'Stamina'],
+    'Mental': ['Aggression', 'Interceptions', 'Positioning', 'Vision', 'Composure'],
+    'Passing': ['Crossing', 'ShortPassing', 'LongPassing'],
+    'Mobility': ['Acceleration', 'SprintSpeed', 'Agility', 'Reactions'],
+    'Power': ['Balance', 'Jumping', 'Stamina', 'Strength'],
+    'Rating': ['Potential', 'Overall'],
+    'Shooting': ['Finishing', 'Volleys', 'FKAccuracy', 'ShotPower', 'LongShots', 'Penalties'],
+}
+
+
+def composite_weights(composites=COMPOSITES):
+    '''Weight matrix with one row per skill column and one column per composite'''
+    weights = {name: ({c: 1 for c in spec} if not isinstance(spec, dict) else spec) for name, spec in composites.items()}
+    return pd.DataFrame(weights).fillna(0)
+
+
+@instrumented('composites')
+def compute_composites(df, composites=COMPOSITES):
+    '''
+    All composites of every player, rounded like int(round(mean)) per row.
+    The products are taken with the raw (unnormalized) weights and divided by the total weight afterwards,
+    so equal weight composites of integer skills give exactly the same mean as pandas and round the same way.
+    Players with a missing skill get nan.
+    '''
+    W = composite_weights(composites)
+    X = df[W.index].to_numpy(dtype=float)
+    totals = W.to_numpy(dtype=float).sum(axis=0)
+    scores = np.round((X @ W.to_numpy(dtype=float)) / totals)  # numpy rounds half to even like round()
+    out = pd.DataFrame(scores, index=df.index, columns=W.columns)
+    if not np.isnan(scores).any():
+        out = out.astype(int)
+    return out
+
+
+def add_composites(df, composites=COMPOSITES):
+    '''Add the composite columns to df in place'''
+    scores = compute_composites(df, composites)
+    for name in scores.columns:
+        df[name] = scores[name]
+    return df
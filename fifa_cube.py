@@ -0,0 +1,285 @@
+import numpy as np
+import pandas as pd
+
+from fifa_impute import age_band
+from fifa_instrument import instrumented
+
+# Pre-aggregated statistics of the player table along Club x Nationality x Position x Age band.
+# The table is reduced once to one cell per combination of the dimensions, holding per measure the
+# count, sum, min, max, row of the max and a histogram (for quantiles). Breakdowns along any subset of
+# the dimensions are rolled up from the cells without touching the players again.
+# Changing some players updates the cells they leave or enter: counts, sums and histograms by difference,
+# min and max by merging, and only cells that lose their min or max are recomputed from their own players.
+# Quantiles are exact for measures with at most MAX_EXACT_BINS distinct values (ratings, Age, Value, Wage),
+# for the others (Release Clause) they are read from HIST_BINS bins of equal player counts and are approximate.
+
+DIMS = ['Club', 'Nationality', 'Position', 'Age band']
+MEASURES = ['Overall', 'Potential', 'Age', 'Value', 'Wage', 'Release Clause', 'Weight (lbs)', 'International Reputation']
+HIST_BINS = 64
+MAX_EXACT_BINS = 256
+
+
+class StatsCube:
+
+    @instrumented('build stats cube')
+    def __init__(self, df, dims=DIMS, measures=MEASURES, hist_bins=HIST_BINS):
+        self.dims = list(dims)
+        self.measures = [m for m in measures if m in df.columns]
+        df = self._prepare(df)
+        values = df[self.measures].to_numpy(dtype=float)
+        # histogram layout per measure: (bin edges, value of each bin)
+        # a bin per distinct value when there are few of them, else bins holding equal numbers of players
+        self.bins = {}
+        for j, m in enumerate(self.measures):
+            vals = values[:, j][~np.isnan(values[:, j])]
+            uniques = np.unique(vals)
+            if len(uniques) <= MAX_EXACT_BINS:
+                self.bins[m] = (uniques, uniques)
+            else:
+                edges = np.unique(np.quantile(vals, np.linspace(0, 1, hist_bins + 1)))
+                self.bins[m] = (edges[:-1], (edges[:-1] + edges[1:]) / 2)
+        keys = pd.MultiIndex.from_frame(df[self.dims].astype(object).fillna('NA'))
+        codes, uniques = keys.factorize()
+        self.cells = pd.DataFrame(list(uniques), columns=self.dims)
+        self._cell_ids = {key: i for i, key in enumerate(uniques)}
+        # players by position: measures, cell (-1 once removed) and index label, with room to grow
+        self._values, self._cell, self._labels = values, codes.astype(np.int64), df.index.to_numpy(dtype=object)
+        self._n = len(df)
+        self._positions = {label: pos for pos, label in enumerate(self._labels)}
+        # players of every cell: the build time order by cell, and the players that entered it since
+        self._order = np.argsort(self._cell, kind='stable')
+        self._bounds = np.searchsorted(self._cell[self._order], np.arange(len(self.cells) + 1))
+        self._entered = {}
+        self._alloc(len(self.cells))
+        self._compute(np.arange(len(self.cells)), np.arange(self._n))
+
+    def _prepare(self, df):
+        df = df[[c for c in df.columns if c in self.dims or c in self.measures or c == 'Age']].copy()
+        if 'Age band' in self.dims and 'Age band' not in df.columns and 'Age' in df.columns:
+            df['Age band'] = age_band(df['Age'])
+        return df
+
+    def _alloc(self, n_cells):
+        shape = (n_cells, len(self.measures))
+        self.size = np.zeros(n_cells, dtype=np.int64)  # players per cell
+        self.count = np.zeros(shape, dtype=np.int64)
+        self.sum = np.zeros(shape)
+        self.min = np.full(shape, np.nan)
+        self.max = np.full(shape, np.nan)
+        self.argmax = np.full(shape, -1, dtype=np.int64)  # position of the first player with the max
+        self.hist = {m: np.zeros((n_cells, len(self.bins[m][0])), dtype=np.int32) for m in self.measures}
+
+    def _grow(self, n_cells):
+        old = len(self.count)
+        if n_cells <= old:
+            return
+        saved = (self.size, self.count, self.sum, self.min, self.max, self.argmax, self.hist)
+        self._alloc(n_cells)
+        self.size[:old], self.count[:old], self.sum[:old], self.min[:old], self.max[:old], self.argmax[:old] = saved[:6]
+        for m in self.measures:
+            self.hist[m][:old] = saved[6][m]
+
+    def _reserve(self, n):
+        # room for n players, doubling so that adding players a few at a time stays linear
+        cap = len(self._cell)
+        if n > cap:
+            extra = max(n, 2 * cap) - cap
+            self._values = np.concatenate([self._values, np.full((extra, len(self.measures)), np.nan)])
+            self._cell = np.concatenate([self._cell, np.full(extra, -1, dtype=np.int64)])
+            self._labels = np.concatenate([self._labels, np.empty(extra, dtype=object)])
+
+    def _bin(self, m, vals):
+        # values outside of the range seen at build time go to the first/last bin
+        edges = self.bins[m][0]
+        return np.clip(np.searchsorted(edges, vals, 'right') - 1, 0, len(edges) - 1)
+
+    def _rows(self, cell_ids):
+        # positions of the players now in the cells
+        parts = [self._order[self._bounds[c]:self._bounds[c + 1]] for c in cell_ids if c < len(self._bounds) - 1]
+        parts += [np.array(self._entered[c], dtype=np.int64) for c in cell_ids if c in self._entered]
+        pos = np.unique(np.concatenate(parts)) if parts else np.empty(0, dtype=np.int64)
+        return pos[np.isin(self._cell[pos], cell_ids)]
+
+    def _compute(self, cell_ids, pos):
+        # (re)compute the statistics of the given cells from their players at positions pos
+        cell_ids = np.asarray(cell_ids, dtype=np.int64)
+        local = np.full(len(self.count), -1)
+        local[cell_ids] = np.arange(len(cell_ids))
+        codes = local[self._cell[pos]]
+        n = len(cell_ids)
+        self.size[cell_ids] = np.bincount(codes, minlength=n)
+        for j, m in enumerate(self.measures):
+            vals = self._values[pos, j]
+            ok = ~np.isnan(vals)
+            c, v, p = codes[ok], vals[ok], pos[ok]
+            self.count[cell_ids, j] = np.bincount(c, minlength=n)
+            self.sum[cell_ids, j] = np.bincount(c, weights=v, minlength=n)
+            low = np.full(n, np.nan)
+            np.fmin.at(low, c, v)
+            self.min[cell_ids, j] = low
+            # first player (lowest position) with the max value of every cell
+            order = np.lexsort((p, -v, c))
+            first = order[np.r_[True, c[order][1:] != c[order][:-1]]] if len(order) else order
+            self.max[cell_ids, j], self.argmax[cell_ids, j] = np.nan, -1
+            self.max[cell_ids[c[first]], j], self.argmax[cell_ids[c[first]], j] = v[first], p[first]
+            nb = len(self.bins[m][0])
+            self.hist[m][cell_ids] = np.bincount(c * nb + self._bin(m, v), minlength=n * nb).reshape(n, nb)
+
+    def _add(self, pos, sign):
+        # add (sign 1) or take out (sign -1) the players at pos to the counts, sums and histograms of their cells
+        cells = self._cell[pos]
+        np.add.at(self.size, cells, sign)
+        for j, m in enumerate(self.measures):
+            vals = self._values[pos, j]
+            ok = ~np.isnan(vals)
+            c, v = cells[ok], vals[ok]
+            np.add.at(self.count[:, j], c, sign)
+            np.add.at(self.sum[:, j], c, sign * v)
+            np.add.at(self.hist[m], (c, self._bin(m, v)), sign)
+
+    def _leave(self, pos):
+        # take players out of their cells, returns the cells where one of them held a min or a max:
+        # those are the only ones to recompute from their players
+        self._add(pos, -1)
+        cells, vals = self._cell[pos], self._values[pos]
+        extreme = ((vals == self.min[cells]) | (vals == self.max[cells])).any(axis=1)
+        return np.unique(cells[extreme])
+
+    def _enter(self, pos):
+        # put players in their cells, merging their values into the min, max and argmax
+        self._add(pos, 1)
+        for c in np.unique(self._cell[pos]):
+            self._entered.setdefault(c, []).extend(pos[self._cell[pos] == c])
+        for j in range(len(self.measures)):
+            vals = self._values[pos, j]
+            ok = ~np.isnan(vals)
+            c, v, p = self._cell[pos][ok], vals[ok], pos[ok]
+            np.fmin.at(self.min[:, j], c, v)
+            np.fmax.at(self.max[:, j], c, v)
+            top = v == self.max[c, j]
+            c, p = c[top], p[top]
+            cells = np.unique(c)
+            current = self.argmax[cells, j]
+            held = (current >= 0) & (self._values[np.maximum(current, 0), j] == self.max[cells, j])
+            best = np.where(held, current, np.iinfo(np.int64).max)
+            np.minimum.at(best, np.searchsorted(cells, c), p)
+            self.argmax[cells, j] = best
+
+    def _quantile(self, m, hist, q):
+        values = self.bins[m][1]
+        nb = len(values)
+        cum = np.cumsum(hist, axis=1)
+        total = cum[:, -1]
+        rank = q * np.maximum(total - 1, 0)
+        at = lambda r: values[np.minimum(np.argmax(cum > r[:, None], axis=1), nb - 1)]
+        below, above = at(np.floor(rank)), at(np.ceil(rank))
+        out = below + (above - below) * (rank - np.floor(rank))
+        return np.where(total > 0, out, np.nan)
+
+    def query(self, by=(), measures=None, stats=('count', 'mean'), where=None):
+        '''
+        Statistics of the measures along the `by` dimensions, rolled up from the cells.
+        stats: count, sum, mean, min, max, argmax (index label of the first player with the max),
+        median and qNN quantiles (q25, q90, ...). where: dict of dimension -> allowed values.
+        Returns one row per group with (measure, stat) columns.
+        '''
+        by = [by] if isinstance(by, str) else list(by)
+        measures = self.measures if measures is None else [measures] if isinstance(measures, str) else list(measures)
+        live = self.count.max(axis=1) > 0 if len(self.measures) else np.ones(len(self.cells), dtype=bool)
+        keep = live[:len(self.cells)]
+        for dim, allowed in (where or {}).items():
+            keep &= self.cells[dim].isin(allowed if isinstance(allowed, (list, tuple, set)) else [allowed]).to_numpy()
+        ids = np.flatnonzero(keep)
+        if by:
+            codes, groups = pd.MultiIndex.from_frame(self.cells.iloc[ids][by]).factorize()
+            index = pd.MultiIndex.from_tuples(list(groups), names=by) if len(by) > 1 else pd.Index([g[0] for g in groups], name=by[0])
+        else:
+            codes, index = np.zeros(len(ids), dtype=np.int64), pd.Index(['all'])
+        n = len(index)
+        out = {}
+        for m in measures:
+            j = self.measures.index(m)
+            count = np.bincount(codes, weights=self.count[ids, j], minlength=n)
+            total = np.bincount(codes, weights=self.sum[ids, j], minlength=n)
+            for stat in stats:
+                if stat == 'count':
+                    col = count.astype(np.int64)
+                elif stat == 'sum':
+                    col = total
+                elif stat == 'mean':
+                    col = np.where(count > 0, total / np.maximum(count, 1), np.nan)
+                elif stat in ('min', 'max'):
+                    col = pd.Series(getattr(self, stat)[ids, j]).groupby(codes).agg(stat).reindex(range(n)).to_numpy()
+                elif stat == 'argmax':
+                    cand = pd.DataFrame({'c': codes, 'v': self.max[ids, j], 'p': self.argmax[ids, j]}).dropna()
+                    cand = cand.sort_values(['c', 'v', 'p'], ascending=[True, False, True]).drop_duplicates('c')
+                    best = cand.set_index('c')['p'].reindex(range(n), fill_value=-1).to_numpy()
+                    col = np.where(best >= 0, self._labels[np.maximum(best, 0)], None)
+                else:
+                    q = 0.5 if stat == 'median' else float(stat[1:]) / 100
+                    hist = np.zeros((n, len(self.bins[m][0])), dtype=np.int64)
+                    np.add.at(hist, codes, self.hist[m][ids])
+                    col = self._quantile(m, hist, q)
+                out[(m, stat)] = col
+        return pd.DataFrame(out, index=index)
+
+    def counts(self, by, where=None):
+        '''Number of players along `by`, largest first, like df[by].value_counts()'''
+        by = [by] if isinstance(by, str) else list(by)
+        rows = self.size[:len(self.cells)]
+        keep = rows > 0
+        for dim, allowed in (where or {}).items():
+            keep &= self.cells[dim].isin(allowed if isinstance(allowed, (list, tuple, set)) else [allowed]).to_numpy()
+        result = pd.Series(rows[keep]).groupby([self.cells[d].to_numpy()[keep] for d in by]).sum()
+        result.index.names = by
+        result.name = 'count'
+        return result[result > 0].sort_values(ascending=False, kind='stable')
+
+    @instrumented('update stats cube')
+    def update(self, rows):
+        '''
+        Add new players or replace changed ones (matched on the index of rows). rows of known players may hold
+        some columns only, the dimensions they leave out stay those of the player's cell. New players need them all.
+        Counts, sums and histograms take the players out of their old cells and add them to the new ones,
+        min, max and argmax merge the new values. Only the cells where a player held a min or a max before
+        the change are recomputed, from the players of those cells alone.
+        '''
+        rows = self._prepare(rows)
+        labels = rows.index.to_numpy(dtype=object)
+        known = np.array([label in self._positions for label in labels], dtype=bool)
+        missing = [d for d in self.dims if d not in rows.columns]
+        if missing and not known.all():
+            raise KeyError('new players need %s' % ', '.join(missing))
+        pos = np.empty(len(rows), dtype=np.int64)
+        pos[known] = [self._positions[label] for label in labels[known]]
+        keys = rows.reindex(columns=self.dims).astype(object)
+        for d in missing:
+            keys[d] = self.cells[d].to_numpy()[self._cell[pos]]
+        pos[~known] = np.arange(self._n, self._n + np.count_nonzero(~known))
+        self._reserve(self._n + np.count_nonzero(~known))
+        self._labels[pos[~known]] = labels[~known]
+        self._positions.update(zip(labels[~known], pos[~known]))
+        self._n += np.count_nonzero(~known)
+        # measures missing from rows keep their values (nan for new players)
+        values = self._values[pos].copy()
+        for j, m in enumerate(self.measures):
+            if m in rows.columns:
+                values[:, j] = rows[m].to_numpy(dtype=float)
+        new_keys = [tuple('NA' if pd.isna(v) else v for v in key) for key in keys.itertuples(index=False)]
+        for key in new_keys:
+            if key not in self._cell_ids:
+                self._cell_ids[key] = len(self.cells)
+                self.cells.loc[len(self.cells)] = list(key)
+        self._grow(len(self.cells))
+        dirty = self._leave(pos[known])
+        self._values[pos] = values
+        self._cell[pos] = [self._cell_ids[key] for key in new_keys]
+        self._enter(pos)
+        self._compute(dirty, self._rows(dirty))
+
+    def remove(self, labels):
+        '''Drop players (index labels) from the cube'''
+        pos = np.array([self._positions.pop(label) for label in labels if label in self._positions], dtype=np.int64)
+        dirty = self._leave(pos)
+        self._cell[pos] = -1
+        self._compute(dirty, self._rows(dirty))
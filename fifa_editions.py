@@ -0,0 +1,146 @@
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from zipfile import ZipFile
+import numpy as np
+import pandas as pd
+
+import fifa_ingest
+from fifa_clean import clean_players
+from fifa_compact import compact_players
+from fifa_instrument import instrumented
+from fifa_store import save_clean
+
+# Batch processing of many player exports (several editions, in-season rating updates).
+# Every export in a directory is mapped onto one unified schema, cleaned in its own worker process,
+# and all of them are written together, keyed by Edition, to one columnar store (see fifa_store.py).
+# Two export formats are understood:
+#   - 'fifa19': the format of data/fifa19.zip ('€110.5M', "5'7", '159lbs' ...), cleaned by fifa_clean
+#   - 'sofifa': the players_NN.csv format (value_eur, height_cm, attacking_crossing ...), already numeric
+# Columns an edition doesn't have are left null.
+
+EDITIONS_DIR = 'fifa_editions'
+
+UNIFIED_COLS = (['Edition', 'Season', 'ID', 'Name', 'Age', 'Nationality', 'Club', 'Position', 'Overall', 'Potential',
+                 'Value', 'Wage', 'Release Clause', 'Preferred Foot', 'Contract Valid Until', 'Height (cms)', 'Weight (lbs)']
+                + fifa_ingest.SKILL_COLS)
+
+# sofifa column -> unified column
+SOFIFA_COLUMNS = {
+    'sofifa_id': 'ID', 'short_name': 'Name', 'age': 'Age', 'nationality': 'Nationality', 'nationality_name': 'Nationality',
+    'club': 'Club', 'club_name': 'Club', 'overall': 'Overall', 'potential': 'Potential', 'value_eur': 'Value',
+    'wage_eur': 'Wage', 'release_clause_eur': 'Release Clause', 'preferred_foot': 'Preferred Foot',
+    'contract_valid_until': 'Contract Valid Until', 'club_contract_valid_until': 'Contract Valid Until',
+    'height_cm': 'Height (cms)', 'weight_kg': 'Weight (lbs)', 'player_positions': 'Position',
+    'attacking_crossing': 'Crossing', 'attacking_finishing': 'Finishing', 'attacking_heading_accuracy': 'HeadingAccuracy',
+    'attacking_short_passing': 'ShortPassing', 'attacking_volleys': 'Volleys', 'skill_dribbling': 'Dribbling',
+    'skill_curve': 'Curve', 'skill_fk_accuracy': 'FKAccuracy', 'skill_long_passing': 'LongPassing',
+    'skill_ball_control': 'BallControl', 'movement_acceleration': 'Acceleration', 'movement_sprint_speed': 'SprintSpeed',
+    'movement_agility': 'Agility', 'movement_reactions': 'Reactions', 'movement_balance': 'Balance',
+    'power_shot_power': 'ShotPower', 'power_jumping': 'Jumping', 'power_stamina': 'Stamina', 'power_strength': 'Strength',
+    'power_long_shots': 'LongShots', 'mentality_aggression': 'Aggression', 'mentality_interceptions': 'Interceptions',
+    'mentality_positioning': 'Positioning', 'mentality_vision': 'Vision', 'mentality_penalties': 'Penalties',
+    'mentality_composure': 'Composure', 'defending_marking': 'Marking', 'defending_marking_awareness': 'Marking',
+    'defending_standing_tackle': 'StandingTackle', 'defending_sliding_tackle': 'SlidingTackle',
+    'goalkeeping_diving': 'GKDiving', 'goalkeeping_handling': 'GKHandling', 'goalkeeping_kicking': 'GKKicking',
+    'goalkeeping_positioning': 'GKPositioning', 'goalkeeping_reflexes': 'GKReflexes',
+}
+KG_TO_LBS = 2.20462
+
+
+def find_exports(directory):
+    '''The csv and zip exports of a directory, sorted by name'''
+    return sorted(os.path.join(directory, f) for f in os.listdir(directory) if f.lower().endswith(('.csv', '.zip')))
+
+
+def edition_of(path):
+    '''Edition key (file name without extension) and season (2019 for fifa19.zip or players_19.csv) of an export'''
+    edition = os.path.splitext(os.path.basename(path))[0]
+    match = re.search(r'(?:fifa|players)_?(\d{2})(?!\d)', edition, re.IGNORECASE)
+    return edition, 2000 + int(match.group(1)) if match else None
+
+
+def _open(path):
+    # file object of the csv, the first csv member of a zip archive
+    if path.lower().endswith('.zip'):
+        zf = ZipFile(path)
+        member = next(n for n in zf.namelist() if n.lower().endswith('.csv'))
+        return zf.open(member)
+    return open(path, 'rb')
+
+
+def detect_format(path):
+    with _open(path) as f:
+        header = f.readline().decode('utf-8-sig')
+    return 'sofifa' if 'sofifa_id' in header or 'short_name' in header else 'fifa19'
+
+
+def _unify_fifa19(path):
+    with _open(path) as f:
+        raw = pd.concat(fifa_ingest.read_chunks(f), ignore_index=True)
+    clean, _ = clean_players(raw)
+    return clean
+
+
+def _unify_sofifa(path):
+    with _open(path) as f:
+        header = pd.read_csv(f, nrows=0, encoding='utf-8-sig').columns
+    columns = [c for c in header if c in SOFIFA_COLUMNS]
+    with _open(path) as f:
+        raw = pd.read_csv(f, usecols=columns, encoding='utf-8-sig', low_memory=False)
+    df = raw.rename(columns=SOFIFA_COLUMNS)
+    df = df.loc[:, ~df.columns.duplicated()]
+    # player_positions lists all the positions of a player ('ST, LW'), the first one is the main position
+    df['Position'] = df['Position'].str.split(',').str[0].str.strip()
+    df['Weight (lbs)'] = np.round(df['Weight (lbs)'] * KG_TO_LBS)
+    return df.dropna(subset=['Club']).reset_index(drop=True)
+
+
+def unify_export(path):
+    '''Read and clean one export into the unified schema'''
+    fmt = detect_format(path)
+    df = _unify_sofifa(path) if fmt == 'sofifa' else _unify_fifa19(path)
+    df['Edition'], df['Season'] = edition_of(path)
+    df = df.reindex(columns=UNIFIED_COLS)
+    # columns missing from this edition come back as all null objects, make them numeric
+    for c in UNIFIED_COLS[4:]:
+        if c not in ('Nationality', 'Club', 'Position', 'Preferred Foot', 'Name') and df[c].dtype == object:
+            df[c] = pd.to_numeric(df[c])
+    return df
+
+
+@instrumented('build editions')
+def build_editions(directory, store_dir=EDITIONS_DIR, processes=None):
+    '''
+    Unify and clean every export of directory in a process pool (all cores by default, 1 for no pool)
+    and save them together to store_dir. Returns the combined table.
+    '''
+    paths = find_exports(directory)
+    if not paths:
+        raise FileNotFoundError('no csv or zip export in %s' % directory)
+    if processes == 1:
+        frames = [unify_export(p) for p in paths]
+    else:
+        with ProcessPoolExecutor(processes) as pool:
+            frames = list(pool.map(unify_export, paths))
+    combined = pd.concat(frames, ignore_index=True)
+    combined['Edition'] = combined['Edition'].astype('category')
+    combined, _ = compact_players(combined)
+    save_clean(combined, store_dir)
+    return combined
+
+
+def trajectory(df, player, column='Value'):
+    '''
+    Value (or any column) of a player across editions, player being an ID, or a Name no other player has.
+    Editions are joined on ID, names are not unique (two players are called 'P. Jones').
+    '''
+    if isinstance(player, str):
+        ids = df.loc[df['Name'] == player, 'ID'].unique()
+        if not len(ids):
+            raise KeyError('no player named %r' % player)
+        if len(ids) > 1:
+            raise ValueError('%d players are named %r (IDs %s), give the ID' % (len(ids), player, ', '.join(map(str, ids))))
+        player = ids[0]
+    rows = df[df['ID'] == player]
+    return rows.sort_values(['Season', 'Edition']).set_index('Edition', drop=False)[['Season', column]]
@@ -0,0 +1,62 @@
+import numpy as np
+import pandas as pd
+
+from fifa_instrument import instrumented
+
+# Imputation of missing values from grouped statistics.
+# All the work is done by one groupby/transform (or one least squares fit), so the cost grows
+# linearly with the number of rows whatever the number of groups.
+
+AGE_BANDS = [15, 20, 23, 26, 29, 32, 35, 50]
+
+
+'''Function to put players into age bands, used as an extra grouping key'''
+def age_band(age, bins=AGE_BANDS):
+    return pd.cut(age, bins=bins, right=True).astype(str)
+
+
+def _keys(df, by):
+    # Frame of the keys: columns of df by name, or Series aligned with df like age_band(df.Age)
+    by = [by] if isinstance(by, (str, pd.Series)) else list(by)
+    keys = {}
+    for i, k in enumerate(by):
+        if isinstance(k, pd.Series):
+            keys[k.name if k.name is not None and k.name not in keys else 'key %d' % i] = k
+        else:
+            keys[k] = df[k]
+    return pd.DataFrame(keys, index=df.index)
+
+
+def _regression_fill(df, column, keys):
+    # Least squares fit of column on the (numeric) keys, using the rows where column is known.
+    X = np.column_stack([np.ones(len(df))] + [keys[k].to_numpy(dtype=float) for k in keys.columns])
+    known = df[column].notna().to_numpy() & ~np.isnan(X).any(axis=1)
+    coef = np.linalg.lstsq(X[known], df[column].to_numpy(dtype=float)[known], rcond=None)[0]
+    return pd.Series(X @ coef, index=df.index)
+
+
+@instrumented('impute grouped')
+def impute_grouped(df, column, by, how='mean'):
+    '''
+    Fill missing values of df[column] from statistics of df grouped by the key column(s) `by`, names of
+    columns of df or Series aligned with it (e.g. by=['Overall', age_band(df.Age)]).
+    how is 'mean', 'median' or 'regression' (linear fit of column on the keys, which must be numeric).
+    Returns the filled column and a report with the number of missing and filled values per group.
+    Groups that have no known value to learn from are left nan and counted as unfilled.
+    '''
+    keys = _keys(df, by)
+    groups = [keys[k] for k in keys.columns]
+    if how in ('mean', 'median'):
+        fill = df[column].groupby(groups, observed=True, dropna=False).transform(how)
+    elif how == 'regression':
+        fill = _regression_fill(df, column, keys)
+    else:
+        raise ValueError("how must be 'mean', 'median' or 'regression', got %r" % (how,))
+
+    missing = df[column].isna()
+    filled = df[column].where(~missing, fill)
+    report = (pd.DataFrame({'missing': missing, 'filled': missing & filled.notna()})
+              .groupby(groups, observed=True, dropna=False)[['missing', 'filled']].sum())
+    report = report[report.missing > 0]
+    report['unfilled'] = report.missing - report.filled
+    return filled, report
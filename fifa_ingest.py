@@ -0,0 +1,65 @@
+from zipfile import ZipFile
+import pandas as pd
+
+from fifa_instrument import instrumented
+from fifa_parsers import POS_COLS
+
+# Ingestion of the FIFA export straight from the zip archive.
+# The csv member is streamed from the archive in chunks (nothing is extracted to disk),
+# parsed with a declared dtype per column, and the columns we never use are skipped by the parser.
+
+ZIP_PATH = 'data/fifa19.zip'
+CSV_MEMBER = 'data.csv'
+
+# Columns not used in any analysis, they are never parsed
+DROP_COLS = ['Photo', 'Flag', 'Club Logo', 'Real Face', 'Jersey Number']
+
+SKILL_COLS = ['Crossing', 'Finishing', 'HeadingAccuracy', 'ShortPassing', 'Volleys', 'Dribbling', 'Curve',
+              'FKAccuracy', 'LongPassing', 'BallControl', 'Acceleration', 'SprintSpeed', 'Agility', 'Reactions',
+              'Balance', 'ShotPower', 'Jumping', 'Stamina', 'Strength', 'LongShots', 'Aggression', 'Interceptions',
+              'Positioning', 'Vision', 'Penalties', 'Composure', 'Marking', 'StandingTackle', 'SlidingTackle',
+              'GKDiving', 'GKHandling', 'GKKicking', 'GKPositioning', 'GKReflexes']
+
+# dtype of every column we keep. Rating columns are float as the 48 players without
+# Preferred Foot have them all null. Encoded strings ('€110.5M', "5'7", '88+2') are read as text
+# and converted by fifa_parsers.
+SCHEMA = {
+    'ID': 'int64', 'Name': str, 'Age': 'int64', 'Nationality': str, 'Overall': 'int64', 'Potential': 'int64',
+    'Club': str, 'Value': str, 'Wage': str, 'Special': 'int64', 'Preferred Foot': str,
+    'International Reputation': 'float64', 'Weak Foot': 'float64', 'Skill Moves': 'float64', 'Work Rate': str,
+    'Body Type': str, 'Position': str, 'Joined': str, 'Loaned From': str, 'Contract Valid Until': str,
+    'Height': str, 'Weight': str, 'Release Clause': str,
+}
+SCHEMA.update({c: str for c in POS_COLS})
+SCHEMA.update({c: 'float64' for c in SKILL_COLS})
+COLUMNS = list(SCHEMA)
+
+CHUNK_SIZE = 50000
+
+
+def read_chunks(f, columns=None, chunksize=CHUNK_SIZE):
+    '''
+    Yield DataFrame chunks of an export read from the file object f.
+    columns restricts parsing to a subset of SCHEMA (all schema columns by default),
+    any other column of the csv (the unused URL columns included) is skipped by the parser.
+    Schema columns missing from the export (older editions) are added as nulls.
+    '''
+    columns = COLUMNS if columns is None else list(columns)
+    wanted = set(columns)
+    # The first, unnamed column of the export is only the row number, the default index is the same.
+    reader = pd.read_csv(f, usecols=lambda c: c in wanted, dtype={c: SCHEMA[c] for c in columns},
+                         chunksize=chunksize, encoding='utf-8-sig')
+    for chunk in reader:
+        yield chunk.reindex(columns=columns)
+
+
+def iter_player_chunks(zip_path=ZIP_PATH, member=CSV_MEMBER, columns=None, chunksize=CHUNK_SIZE):
+    '''Yield DataFrame chunks of the export read directly from the zip member'''
+    with ZipFile(zip_path) as zf, zf.open(member) as f:
+        yield from read_chunks(f, columns, chunksize)
+
+
+@instrumented('ingest')
+def load_players(zip_path=ZIP_PATH, member=CSV_MEMBER, columns=None, chunksize=CHUNK_SIZE):
+    '''Read the whole export from the zip archive, chunk by chunk'''
+    return pd.concat(iter_player_chunks(zip_path, member, columns, chunksize), ignore_index=True)
@@ -0,0 +1,145 @@
+import atexit
+import functools
+import json
+import os
+import sys
+import time
+from contextlib import contextmanager
+
+# Timing and memory instrumentation of the cleaning and analysis steps.
+# Steps are marked with the @instrumented decorator or the `with step(name):` block. When instrumentation
+# is off (the default) a step costs one flag check. When on, every step records its wall and CPU time,
+# the peak of the memory allocated by Python during the step (tracemalloc), the peak RSS of the process
+# (Unix only, None elsewhere) and the number of rows in and out, nested steps keep the name of their parent.
+# Turn it on with enable(), `python fifa.py --profile report.json ...` or the FIFA_PROFILE=report.json
+# environment variable (the report is then written when the process exits).
+
+_enabled = False
+_records = []
+_stack = []
+
+
+def enable(trace_memory=True):
+    global _enabled
+    _enabled = True
+    if trace_memory:
+        import tracemalloc
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+
+def disable():
+    global _enabled
+    _enabled = False
+
+
+def is_enabled():
+    return _enabled
+
+
+def reset():
+    del _records[:]
+
+
+def records():
+    return list(_records)
+
+
+def _rows(value):
+    if isinstance(value, tuple) and value:
+        value = value[0]
+    if hasattr(value, 'shape') and hasattr(value, 'columns'):
+        return len(value)
+    return None
+
+
+def _peak_rss_mb():
+    # ru_maxrss is in kB on Linux, bytes on macOS. The resource module is Unix only.
+    try:
+        import resource
+    except ImportError:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1 << 20) if sys.platform == 'darwin' else rss / 1024
+
+
+@contextmanager
+def step(name, rows_in=None):
+    '''Record the block as a step. The yielded dict can receive 'rows_out'.'''
+    if not _enabled:
+        yield {}
+        return
+    import tracemalloc
+    tracing = tracemalloc.is_tracing()
+    record = {'step': name, 'parent': _stack[-1]['step'] if _stack else None, 'depth': len(_stack),
+              'rows_in': rows_in, 'rows_out': None}
+    _records.append(record)  # in call order, a step comes before the steps inside it
+    frame = {'step': name, 'peak': 0}
+    if tracing:
+        current, peak = tracemalloc.get_traced_memory()
+        if _stack:
+            # the peak so far belongs to the parent, the tracer peak is reset for this step
+            _stack[-1]['peak'] = max(_stack[-1]['peak'], peak)
+        frame['start'] = current
+        tracemalloc.reset_peak()
+    _stack.append(frame)
+    wall, cpu = time.perf_counter(), time.process_time()
+    try:
+        yield record
+    finally:
+        record['wall_s'] = time.perf_counter() - wall
+        record['cpu_s'] = time.process_time() - cpu
+        _stack.pop()
+        if tracing:
+            peak = max(frame['peak'], tracemalloc.get_traced_memory()[1])
+            record['peak_alloc_mb'] = (peak - frame['start']) / (1 << 20)
+            if _stack:
+                _stack[-1]['peak'] = max(_stack[-1]['peak'], peak)
+        else:
+            record['peak_alloc_mb'] = None
+        record['peak_rss_mb'] = _peak_rss_mb()
+
+
+def instrumented(name=None):
+    '''Decorator recording every call of the function as a step (rows from its first table argument and result)'''
+    def decorate(func):
+        label = name or func.__qualname__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            rows_in = next((r for r in map(_rows, args) if r is not None), None)
+            with step(label, rows_in) as record:
+                result = func(*args, **kwargs)
+                record['rows_out'] = _rows(result)
+            return result
+        return wrapper
+    return decorate
+
+
+def write_json(path):
+    with open(path, 'w') as f:
+        json.dump({'python': sys.version.split()[0], 'steps': _records}, f, indent=1)
+
+
+def summary():
+    '''The recorded steps as a readable table'''
+    head = '%-40s %9s %9s %10s %10s %9s %9s' % ('step', 'wall s', 'cpu s', 'alloc MB', 'rss MB', 'rows in', 'rows out')
+    lines = [head, '-' * len(head)]
+    fmt = lambda v, f: f % v if v is not None else '-'
+    for r in _records:
+        lines.append('%-40s %9s %9s %10s %10s %9s %9s' % (
+            ('  ' * r['depth'] + r['step'])[:40], fmt(r['wall_s'], '%.3f'), fmt(r['cpu_s'], '%.3f'),
+            fmt(r['peak_alloc_mb'], '%.1f'), fmt(r['peak_rss_mb'], '%.0f'), fmt(r['rows_in'], '%d'), fmt(r['rows_out'], '%d')))
+    return '\n'.join(lines)
+
+
+def _report_at_exit(path):
+    write_json(path)
+    print(summary(), file=sys.stderr)
+
+
+if os.environ.get('FIFA_PROFILE'):
+    enable()
+    atexit.register(_report_at_exit, os.environ['FIFA_PROFILE'])
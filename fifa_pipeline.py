@@ -0,0 +1,129 @@
+import hashlib
+import inspect
+import json
+import os
+import time
+import pandas as pd
+
+from fifa_instrument import step
+
+# A pipeline is a list of named stages. Every stage declares the artifacts (named values) it reads
+# and writes. The fingerprint of a stage covers its code, its parameters and the fingerprints of the
+# artifacts it reads, so it changes whenever anything upstream changes.
+# The outputs of every stage are saved in the cache directory under that fingerprint. When the pipeline
+# runs again, only stages whose fingerprint has no saved outputs are executed, and cached outputs are only
+# loaded when a stage that runs (or the caller) needs them.
+
+CACHE_DIR = '.fifa_cache'
+
+
+class Stage:
+
+    def __init__(self, func, inputs=(), outputs=(), params=None, name=None, uses=(), depends=None):
+        '''
+        func(*inputs, **params) returns the outputs (a single value, or a tuple for several outputs).
+        uses: other functions or modules whose code is part of the stage fingerprint.
+        depends: function of params returning extra data for the fingerprint (e.g. the hash of an input file).
+        '''
+        self.func = func
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+        self.params = params or {}
+        self.name = name or func.__name__
+        self.uses = list(uses)
+        self.depends = depends
+
+    def fingerprint(self, input_fps):
+        h = hashlib.sha256()
+        for obj in [self.func] + self.uses:
+            h.update(inspect.getsource(obj).encode())
+        h.update(json.dumps(self.params, sort_keys=True, default=str).encode())
+        if self.depends is not None:
+            h.update(str(self.depends(self.params)).encode())
+        for fp in input_fps:
+            h.update(fp.encode())
+        return h.hexdigest()
+
+    def run(self, *inputs):
+        result = self.func(*inputs, **self.params)
+        return result if len(self.outputs) != 1 else (result,)
+
+
+def value_fingerprint(value):
+    '''Fingerprint of an artifact given to the pipeline from outside'''
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        data = pd.util.hash_pandas_object(value, index=True).values.tobytes() + repr(list(getattr(value, 'columns', []))).encode()
+    else:
+        data = repr(value).encode()
+    return hashlib.sha256(data).hexdigest()
+
+
+class Pipeline:
+
+    def __init__(self, stages, cache_dir=CACHE_DIR):
+        self.stages = list(stages)
+        self.cache_dir = cache_dir
+        self.log = []  # (stage name, 'run' or 'cached', seconds) of the last run
+
+    def _path(self, stage, fp):
+        return os.path.join(self.cache_dir, '%s-%s.pkl' % (stage.name, fp[:16]))
+
+    def plan(self, inputs=None, targets=None):
+        '''
+        Fingerprint of every stage, the producer of every artifact read by a stage and the
+        stages to execute ('run') or read from the cache ('load') to get the targets.
+        '''
+        inputs = inputs or {}
+        art_fp = {name: value_fingerprint(v) for name, v in inputs.items()} if self.cache_dir else {name: '' for name in inputs}
+        producer = {name: None for name in inputs}
+        fps, sources = [], []
+        for i, stage in enumerate(self.stages):
+            missing = [n for n in stage.inputs if n not in producer]
+            if missing:
+                raise KeyError('stage %s reads %s, which no earlier stage writes' % (stage.name, ', '.join(missing)))
+            sources.append([(n, producer[n]) for n in stage.inputs])
+            fp = stage.fingerprint([art_fp[n] for n in stage.inputs])
+            fps.append(fp)
+            for n in stage.outputs:
+                art_fp[n] = hashlib.sha256((fp + n).encode()).hexdigest()
+                producer[n] = i
+        targets = list(producer) if targets is None else list(targets)
+        needed = {(n, producer[n]) for n in targets}
+        actions = {}
+        for i in reversed(range(len(self.stages))):
+            if not any((n, i) in needed for n in self.stages[i].outputs):
+                continue
+            if self.cache_dir and os.path.exists(self._path(self.stages[i], fps[i])):
+                actions[i] = 'load'
+            else:
+                actions[i] = 'run'
+                needed.update(sources[i])
+        return fps, sources, actions, [(n, producer[n]) for n in targets]
+
+    def run(self, inputs=None, targets=None):
+        '''Run the pipeline and return a dict of the target artifacts (all artifacts by default)'''
+        inputs = inputs or {}
+        fps, sources, actions, wanted = self.plan(inputs, targets)
+        values = {(name, None): v for name, v in inputs.items()}
+        self.log = []
+        if self.cache_dir:
+            os.makedirs(self.cache_dir, exist_ok=True)
+        for i, stage in enumerate(self.stages):
+            if i not in actions:
+                continue
+            t = time.perf_counter()
+            # inputs of a cached stage may not have been produced at all
+            args = [values[src] for src in sources[i]] if actions[i] == 'run' else []
+            rows_in = next((len(a) for a in args if isinstance(a, pd.DataFrame)), None)
+            with step('%s (%s)' % (stage.name, 'cached' if actions[i] == 'load' else 'run'), rows_in) as record:
+                if actions[i] == 'load':
+                    outputs = pd.read_pickle(self._path(stage, fps[i]))
+                else:
+                    outputs = stage.run(*args)
+                    if self.cache_dir:
+                        pd.to_pickle(tuple(outputs), self._path(stage, fps[i]))
+                record['rows_out'] = len(outputs[0]) if isinstance(outputs[0], pd.DataFrame) else None
+            for n, v in zip(stage.outputs, outputs):
+                values[(n, i)] = v
+            self.log.append((stage.name, 'cached' if actions[i] == 'load' else 'run', time.perf_counter() - t))
+        return {n: values[(n, i)] for n, i in wanted}
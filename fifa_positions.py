@@ -0,0 +1,86 @@
+import numpy as np
+import pandas as pd
+
+from fifa_instrument import instrumented
+from fifa_parsers import POS_COLS
+
+# Positional ratings (LS ... RB) as one dense int16 matrix, players x positions.
+# GKs have no positional ratings: their rows are all -1 and the GK mask marks them, so they are
+# left out of every comparison by the mask instead of by nan checks column by column.
+# Best position, gap to the listed Position, versatility and the leaderboards of every position
+# are whole-matrix operations (argmax, comparisons, one argpartition per leaderboard).
+
+
+class PositionMatrix:
+
+    @instrumented('build position matrix')
+    def __init__(self, ratings, positions=POS_COLS, listed=None, index=None):
+        '''ratings: int16 (players x positions) with -1 for missing, listed: the Position of every player'''
+        self.ratings = np.asarray(ratings, dtype=np.int16)
+        self.positions = list(positions)
+        self.rated = self.ratings >= 0
+        self.gk = ~self.rated.any(axis=1)
+        self.index = pd.RangeIndex(len(self.ratings)) if index is None else index
+        self.listed = None if listed is None else np.asarray(listed, dtype=object)
+
+    @classmethod
+    def from_frame(cls, df, positions=POS_COLS):
+        '''Matrix of the positional columns of the clean table (nan -> -1)'''
+        values = df[list(positions)].to_numpy(dtype=np.float32)
+        ratings = np.where(np.isnan(values), -1, values).astype(np.int16)
+        return cls(ratings, positions, df['Position'].to_numpy() if 'Position' in df.columns else None, df.index)
+
+    @classmethod
+    def from_store(cls, store, name='positional'):
+        '''Matrix saved by fifa_store.save_clean, read as a whole'''
+        ratings, positions = store.matrix(name)
+        return cls(ratings, positions, store.array('Position') if 'Position' in store.columns else None, store.index)
+
+    def best(self):
+        '''Column of the best position of every player (-1 for GKs) and its rating'''
+        col = np.where(self.gk, -1, np.argmax(self.ratings, axis=1))
+        return col, np.where(self.gk, -1, self.ratings.max(axis=1))
+
+    def listed_rating(self):
+        '''Rating of every player at his listed Position, -1 when it isn't a positional column (GK)'''
+        lookup = {p: j for j, p in enumerate(self.positions)}
+        codes, uniques = pd.factorize(self.listed)
+        col = np.array([lookup.get(p, -1) for p in uniques] + [-1])[codes]  # code -1 (missing) -> -1
+        rating = self.ratings[np.arange(len(col)), np.maximum(col, 0)]
+        return np.where(col >= 0, rating, -1)
+
+    def versatility(self, within=2):
+        '''Number of positions every player is rated within `within` points of his best rating (0 for GKs)'''
+        _, best = self.best()
+        return ((self.ratings >= (best - within)[:, None]) & self.rated).sum(axis=1)
+
+    def summary(self, within=2):
+        '''Best position and rating, rating at the listed Position, the gap between them and the versatility'''
+        col, best = self.best()
+        listed = self.listed_rating() if self.listed is not None else np.full(len(col), -1)
+        names = np.array(self.positions + [None], dtype=object)
+        out = pd.DataFrame({'Best Position': names[col], 'Best Rating': best,
+                            'Listed Rating': listed, 'Versatility': self.versatility(within)}, index=self.index)
+        out[['Best Rating', 'Listed Rating']] = out[['Best Rating', 'Listed Rating']].where(lambda x: x >= 0)
+        out['Gap'] = out['Best Rating'] - out['Listed Rating']
+        return out
+
+    def leaderboard(self, k=10, positions=None):
+        '''
+        Top k players of every position (all positions by default): one row per position and rank
+        with the row label of the player and his rating. GKs and missing ratings never rank.
+        '''
+        cols = [self.positions.index(p) for p in (positions or self.positions)]
+        R = self.ratings[:, cols]
+        k = min(k, len(R))
+        # the k-th best rating of every column (one partition), then the players at or above it
+        # ordered by position, rating and row, ties at the cut going to the first rows like nlargest
+        kth = -np.partition(-R, k - 1, axis=0)[k - 1]
+        rows, c = np.nonzero((R >= kth) & (R >= 0))
+        vals = R[rows, c]
+        order = np.lexsort((rows, -vals, c))
+        rows, c, vals = rows[order], c[order], vals[order]
+        rank = np.arange(len(c)) - np.searchsorted(c, c)
+        keep = rank < k
+        return pd.DataFrame({'Position': np.array([self.positions[j] for j in cols], dtype=object)[c[keep]],
+                             'Rank': rank[keep] + 1, 'Player': self.index[rows[keep]], 'Rating': vals[keep]})
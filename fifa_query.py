@@ -0,0 +1,57 @@
+import re
+import numpy as np
+
+# Conditions of the scouting queries, written the same way on the command line (fifa.py scout and
+# squad --where) and in the service (/search?where=...):
+#   "Age<27" -> ('Age', '<', 27.0), "Position in LB,LWB" -> ('Position', 'in', ['LB', 'LWB'])
+# Values are numbers when they read as one, text otherwise, and "=" is the same as "==".
+# OPS is the one table of the operators, used by the scouting index and the command line, the similarity
+# and squad filters and the data quality rules: OPS[op](values, value) is a boolean array.
+# The matching players are ordered by sort_order, like DataFrame.sort_values(kind='stable') in both directions.
+
+OPS = {'<': np.less, '<=': np.less_equal, '>': np.greater, '>=': np.greater_equal, '==': np.equal,
+       '!=': np.not_equal, 'in': lambda vals, value: np.isin(vals, list(value))}
+_CONDITION = re.compile(r'^\s*(.+?)\s*(<=|>=|==|!=|<|>|=|\sin\s)\s*(.+?)\s*$')
+
+
+def _value(text):
+    try:
+        return float(text)
+    except ValueError:
+        return text.strip().strip('"\'')
+
+
+def parse_condition(text):
+    '''"Age<27" -> ('Age', '<', 27.0), "Position in LB,LWB" -> ('Position', 'in', ['LB', 'LWB'])'''
+    match = _CONDITION.match(text)
+    if match is None:
+        raise ValueError('cannot read condition %r' % text)
+    col, op, value = match.groups()
+    op = op.strip()
+    if op == 'in':
+        return col, op, [_value(v) for v in value.split(',')]
+    return col, '==' if op == '=' else op, _value(value)
+
+
+def _sort_codes(key, ascending):
+    # rank of every value, negated when descending, missing values (nan, None) last in both directions
+    key = np.asarray(key)
+    if key.dtype.kind == 'O':
+        missing = np.array([v is None or v != v for v in key], dtype=bool)
+    elif key.dtype.kind in 'fc':
+        missing = np.isnan(key)
+    else:
+        missing = np.zeros(len(key), dtype=bool)
+    codes = np.full(len(key), len(key), dtype=np.int64)
+    codes[~missing] = np.unique(key[~missing], return_inverse=True)[1]
+    if not ascending:
+        codes[~missing] *= -1
+    return codes
+
+
+def sort_order(keys, ascending=False):
+    '''
+    Order of the rows sorted on the arrays of keys (the first one first), ties keeping the order of the rows
+    and missing values last, the order DataFrame.sort_values(kind='stable') gives
+    '''
+    return np.lexsort([_sort_codes(key, ascending) for key in reversed(keys)])
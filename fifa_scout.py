@@ -0,0 +1,141 @@
+import time
+import numpy as np
+import pandas as pd
+
+from fifa_instrument import instrumented
+from fifa_query import OPS, sort_order
+
+# Indexed scouting queries over the cleaned player table.
+# Instead of a boolean mask over the whole frame for every condition, the index keeps
+#   - hash buckets (value -> row positions) for Position, Club and Nationality
+#   - a sorted copy of every numeric column (values and row positions)
+# A query starts from the most selective condition (a bucket or a searchsorted slice)
+# and checks the remaining conditions only on those candidate rows.
+
+HASH_COLS = ['Position', 'Club', 'Nationality']
+
+
+class ScoutIndex:
+
+    @instrumented('build scout index')
+    def __init__(self, df, hash_cols=HASH_COLS, numeric_cols=None):
+        self.df = df
+        self.hash_cols = [c for c in hash_cols if c in df.columns]
+        if numeric_cols is None:
+            numeric_cols = [c for c in df.columns if df[c].dtype.kind in 'biuf']
+        self.values = {c: df[c].to_numpy() for c in list(numeric_cols) + self.hash_cols}
+        self.buckets = {}
+        for c in self.hash_cols:
+            codes, labels = pd.factorize(df[c])
+            order = np.argsort(codes, kind='stable')
+            bounds = np.searchsorted(codes[order], np.arange(len(labels) + 1))
+            self.buckets[c] = {label: order[bounds[i]:bounds[i + 1]] for i, label in enumerate(labels)}
+        self.sorted = {}
+        for c in numeric_cols:
+            vals = self.values[c].astype(float)
+            order = np.argsort(vals, kind='stable')  # nans go last
+            self.sorted[c] = (vals[order], order, int(np.count_nonzero(~np.isnan(vals))))
+
+    def _candidates(self, col, op, value):
+        # Row positions satisfying a single condition, using the bucket or sorted index of col.
+        if op == '!=':
+            return np.setdiff1d(np.arange(len(self.df)), self._candidates(col, '==', value), assume_unique=True)
+        if col in self.buckets:
+            if op not in ('==', 'in'):
+                raise ValueError('%s only supports ==, != and in, not %s' % (col, op))
+            keys = [value] if op == '==' else value
+            parts = [self.buckets[col].get(k, np.empty(0, dtype=np.intp)) for k in keys]
+            return np.concatenate(parts) if len(parts) != 1 else parts[0]
+        vals, order, valid = self.sorted[col]
+        if op == 'in':
+            return np.concatenate([self._candidates(col, '==', v) for v in value])
+        lo = {'<': 0, '<=': 0, '>': np.searchsorted(vals[:valid], value, 'right'),
+              '>=': np.searchsorted(vals[:valid], value, 'left'), '==': np.searchsorted(vals[:valid], value, 'left')}[op]
+        hi = {'<': np.searchsorted(vals[:valid], value, 'left'), '<=': np.searchsorted(vals[:valid], value, 'right'),
+              '>': valid, '>=': valid, '==': np.searchsorted(vals[:valid], value, 'right')}[op]
+        return order[lo:hi]
+
+    def _size(self, col, op, value):
+        if op == '!=':
+            return len(self.df) - self._size(col, '==', value)
+        if col in self.buckets:
+            keys = [value] if op == '==' else value
+            return sum(len(self.buckets[col].get(k, ())) for k in keys)
+        return len(self._candidates(col, op, value))
+
+    def _check(self, pos, col, op, value):
+        return OPS[op](self.values[col][pos], value)
+
+    def query_positions(self, where=(), sort_by=None, ascending=False, k=None):
+        '''
+        Row positions of the players matching all conditions of where, a list of (column, op, value)
+        with op one of <, <=, >, >=, ==, !=, in. Results are ordered by the sort_by columns and cut at k,
+        players with the same values in the order of the table.
+        '''
+        for col, op, value in where:
+            if op not in OPS:
+                raise ValueError('unknown operator %r' % (op,))
+            if col in self.buckets and op not in ('==', '!=', 'in'):
+                raise ValueError('%s only supports ==, != and in, not %s' % (col, op))
+        # a value repeated in an in list would give its rows twice
+        where = [(col, op, list(dict.fromkeys(value)) if op == 'in' else value) for col, op, value in where]
+        if where:
+            sizes = [self._size(*cond) for cond in where]
+            first = int(np.argmin(sizes))
+            pos = self._candidates(*where[first])
+            for i, cond in enumerate(where):
+                if i != first and len(pos):
+                    pos = pos[self._check(pos, *cond)]
+        else:
+            pos = np.arange(len(self.df))
+        pos = np.sort(pos)
+        if sort_by:
+            sort_by = [sort_by] if isinstance(sort_by, str) else list(sort_by)
+            pos = pos[sort_order([self.values[c][pos] for c in sort_by], ascending)]
+        return pos[:k] if k is not None else pos
+
+    def query(self, where=(), sort_by=None, ascending=False, k=None, columns=None):
+        '''Same as query_positions, returning the matching rows of the table'''
+        rows = self.df.iloc[self.query_positions(where, sort_by, ascending, k)]
+        return rows if columns is None else rows[list(columns)]
+
+
+'''Function to time the indexed queries against the same queries written as pandas mask chains'''
+def benchmark(index, queries, repeat=200):
+    # queries: list of (where, sort_by, mask_fn), mask_fn(df) being the pandas equivalent of where
+    df = index.df
+    results = []
+    for where, sort_by, mask_fn in queries:
+        t = time.perf_counter()
+        for _ in range(repeat):
+            pos = index.query_positions(where, sort_by)
+        t_index = (time.perf_counter() - t) / repeat
+        t = time.perf_counter()
+        for _ in range(repeat):
+            ref = df[mask_fn(df)].sort_values(by=sort_by, ascending=False, kind='stable')
+        t_pandas = (time.perf_counter() - t) / repeat
+        results.append({'query': ' & '.join('%s %s %s' % c for c in where), 'rows': len(pos),
+                        'same_rows': list(df.index[pos]) == list(ref.index),
+                        'index_ms': t_index * 1e3, 'pandas_ms': t_pandas * 1e3, 'speedup': t_pandas / t_index})
+    return pd.DataFrame(results)
+
+
+# The Darmian and Jones replacement searches of fifa-analysis-V1.py
+SCOUT_QUERIES = [
+    ([('Age', '<', 27), ('Rating', '>', 78), ('Position', 'in', ['LB', 'LWB']), ('Contract Valid Until', '<', 2021), ('Defending', '>', 75)],
+     ['Rating', 'Value', 'Wage'],
+     lambda df: (df.Age < 27) & (df.Rating > 78) & df.Position.isin(['LB', 'LWB']) & (df['Contract Valid Until'] < 2021) & (df.Defending > 75)),
+    ([('Age', '<', 30), ('Mobility', '>', 70), ('Rating', '>', 79), ('Position', 'in', ['CB', 'RCB', 'LCB']), ('Contract Valid Until', '<', 2022), ('Defending', '>', 79)],
+     ['Rating', 'Value', 'Wage'],
+     lambda df: (df.Age < 30) & (df.Mobility > 70) & (df.Rating > 79) & df.Position.isin(['CB', 'RCB', 'LCB']) & (df['Contract Valid Until'] < 2022) & (df.Defending > 79)),
+    ([('Value', '<', 6000000.0), ('Rating', '>', 76), ('Position', '==', 'LB')],
+     ['Rating', 'Value', 'Wage'],
+     lambda df: (df.Value < 6000000.0) & (df.Rating > 76) & (df.Position == 'LB')),
+]
+
+
+if __name__ == '__main__':
+    from fifa_store import open_clean
+    from fifa_composites import add_composites
+    df = add_composites(open_clean('fifa19_df_clean').read())
+    print(benchmark(ScoutIndex(df), SCOUT_QUERIES).to_string())
@@ -0,0 +1,346 @@
+import asyncio
+import json
+import os
+import time
+from collections import OrderedDict
+from urllib.parse import parse_qs, urlencode, urlsplit
+import numpy as np
+
+from fifa_instrument import instrumented
+from fifa_query import parse_condition
+from fifa_store import META_FILE, STORE_DIR, StaleStoreError, open_clean
+
+# Local scouting service: the clean store is loaded once into one process and queried over HTTP on localhost,
+# so several analysts (notebooks, scripts, curl) share one copy of the data instead of each reading the store.
+#   GET /player?id=158023             one player, or ?name=silva for the players whose Name contains it
+#   GET /search?where=Age<27&where=Position in LB,LWB&sort=Overall,Value&k=20   ScoutIndex searches
+#   GET /top?column=Overall&position=LB&k=10                                   top k of a column
+#   GET /clubs?club=Juventus&measures=Overall,Value&stats=count,mean,max       club breakdowns of the StatsCube
+#   GET /stats                        version of the data, rows, cache hits and misses
+# Answers are JSON. They are kept in an LRU cache keyed on the request, and the cache is dropped whenever
+# the version of the store changes (meta.json is rewritten by fifa.py clean or composites): the store is
+# then reloaded before the next answer.
+# Started with the export the store was built from (source), a store rebuilt from another export is answered
+# with 503 until it is cleaned again from that export.
+# The server is asyncio streams with HTTP/1.1 keep-alive, one coroutine per connection. Queries take a few
+# milliseconds and run on the event loop, connections waiting on the network don't hold anyone up.
+# load_test replays a generated mix of requests over a number of concurrent connections and reports
+# the latency percentiles and the requests per second.
+
+HOST = '127.0.0.1'
+PORT = 8019
+CACHE_SIZE = 1024
+SEARCH_COLUMNS = ['ID', 'Name', 'Club', 'Position', 'Age', 'Overall', 'Value', 'Wage', 'Contract Valid Until']
+CLUB_MEASURES = ['Overall', 'Age', 'Value', 'Wage']
+
+
+class BadRequest(Exception):
+    '''Query parameters the service can't answer, sent back as 400'''
+
+
+class LRUCache:
+    '''Mapping of at most size entries, the least recently used one is dropped first'''
+
+    def __init__(self, size=CACHE_SIZE):
+        self.size = size
+        self.entries = OrderedDict()
+        self.hits = self.misses = 0
+
+    def get(self, key):
+        if key in self.entries:
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return self.entries[key]
+        self.misses += 1
+        return None
+
+    def put(self, key, value):
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.size:
+            self.entries.popitem(last=False)
+
+    def clear(self):
+        self.entries.clear()
+
+
+def store_version(store_dir=STORE_DIR):
+    '''Version of the store: meta.json is replaced on every write, its modification time changes with it'''
+    return os.stat(os.path.join(store_dir, META_FILE)).st_mtime_ns
+
+
+class Dataset:
+    '''The clean store read once, with the scouting index and the stats cube built on it'''
+
+    @instrumented('load service dataset')
+    def __init__(self, store_dir=STORE_DIR, source=None):
+        from fifa_cube import StatsCube
+        from fifa_scout import ScoutIndex
+        self.version = store_version(store_dir)
+        store = open_clean(store_dir, source=source)
+        self.source_hash = store.meta['source_hash']
+        self.df = store.read()
+        self.index = ScoutIndex(self.df)
+        self.cube = StatsCube(self.df)
+        self.ids = {int(i): p for p, i in enumerate(self.df['ID'].to_numpy())}
+
+
+def _records(df):
+    # JSON rows, nan as null and numpy scalars as plain numbers
+    return json.loads(df.to_json(orient='records', date_format='iso'))
+
+
+def _ints(params, name, default):
+    try:
+        return int(params.get(name, [default])[-1])
+    except ValueError:
+        raise BadRequest('%s must be a whole number' % name)
+
+
+def _list(params, name, default):
+    # comma separated values of a parameter, repeated or not
+    values = [v for text in params.get(name, []) for v in text.split(',') if v]
+    return values or list(default)
+
+
+class QueryService:
+    '''Answers of the service routes, cached until the store changes'''
+
+    def __init__(self, store_dir=STORE_DIR, cache_size=CACHE_SIZE, source=None):
+        self.store_dir = store_dir
+        self.source = source
+        self.cache = LRUCache(cache_size)
+        self.data = Dataset(store_dir, source)
+        self.reloads = 0
+        self.started = time.time()
+        self.routes = {'/player': self.player, '/search': self.search, '/top': self.top, '/clubs': self.clubs}
+
+    def refresh(self):
+        '''Reload the store and drop the cache when its version changed'''
+        if store_version(self.store_dir) != self.data.version:
+            self.data = Dataset(self.store_dir, self.source)
+            self.cache.clear()
+            self.reloads += 1
+
+    def handle(self, target):
+        '''(status, JSON body) of a request target like /search?where=Age<27&k=5'''
+        url = urlsplit(target)
+        if url.path == '/stats':
+            return 200, json.dumps(self.stats()).encode()
+        if url.path not in self.routes:
+            return 404, json.dumps({'error': 'unknown route %s' % url.path}).encode()
+        try:
+            self.refresh()
+        except StaleStoreError as e:
+            return 503, json.dumps({'error': str(e)}).encode()
+        params = parse_qs(url.query)
+        key = (url.path, tuple(sorted((k, tuple(v)) for k, v in params.items())))
+        body = self.cache.get(key)
+        if body is None:
+            try:
+                body = json.dumps(self.routes[url.path](params)).encode()
+            except (BadRequest, KeyError, ValueError, TypeError) as e:
+                return 400, json.dumps({'error': '%s: %s' % (type(e).__name__, e)}).encode()
+            self.cache.put(key, body)
+        return 200, body
+
+    def _conditions(self, params):
+        try:
+            where = [parse_condition(text) for text in params.get('where', [])]
+        except Exception as e:
+            raise BadRequest(str(e))
+        for col, op, value in where:
+            if col not in self.data.index.buckets and any(isinstance(v, str) for v in (value if op == 'in' else [value])):
+                raise BadRequest('%s takes numbers, not %r' % (col, value))
+        return where
+
+    def player(self, params):
+        data = self.data
+        columns = _list(params, 'columns', data.df.columns)
+        if 'id' in params:
+            player = _ints(params, 'id', 0)
+            if player not in data.ids:
+                raise BadRequest('no player with ID %d' % player)
+            pos = [data.ids[player]]
+        elif 'name' in params:
+            found = data.df['Name'].str.contains(params['name'][-1], case=False, regex=False, na=False).to_numpy()
+            pos = np.flatnonzero(found)[:_ints(params, 'k', 20)]
+        else:
+            raise BadRequest('give id or name')
+        return _records(data.df.iloc[pos][columns])
+
+    def search(self, params, sort=None):
+        data = self.data
+        sort = sort or _list(params, 'sort', [])
+        pos = data.index.query_positions(self._conditions(params), sort or None,
+                                         ascending=params.get('ascending', ['0'])[-1] in ('1', 'true'))
+        columns = _list(params, 'columns', [c for c in SEARCH_COLUMNS if c in data.df.columns] + [c for c in sort if c not in SEARCH_COLUMNS])
+        return {'count': len(pos), 'players': _records(data.df.iloc[pos[:_ints(params, 'k', 20)]][columns])}
+
+    def top(self, params):
+        if 'position' in params:
+            params = dict(params, where=params.get('where', []) + ['Position in %s' % ','.join(params['position'])])
+        column = params.get('column', ['Overall'])[-1]
+        return self.search(params, sort=[column, 'Value'] if column != 'Value' else [column])
+
+    def clubs(self, params):
+        cube = self.data.cube
+        measures = _list(params, 'measures', [m for m in CLUB_MEASURES if m in cube.measures])
+        stats = _list(params, 'stats', ['count', 'mean', 'max'])
+        where = {'Club': _list(params, 'club', [])} if 'club' in params else None
+        table = cube.query('Club', measures, stats, where=where)
+        table.columns = ['%s %s' % c for c in table.columns]
+        if 'sort' in params:
+            table = table.sort_values(params['sort'][-1], ascending=False, kind='stable')
+        return _records(table.head(_ints(params, 'k', 50)).rename_axis('Club').reset_index())
+
+    def stats(self):
+        return {'version': self.data.version, 'source_hash': self.data.source_hash, 'rows': len(self.data.df),
+                'cache_entries': len(self.cache.entries), 'cache_hits': self.cache.hits,
+                'cache_misses': self.cache.misses, 'reloads': self.reloads, 'uptime': time.time() - self.started}
+
+
+_REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed', 503: 'Service Unavailable'}
+
+
+async def _serve_connection(service, reader, writer):
+    # HTTP/1.1 GET requests one after the other on a kept alive connection
+    try:
+        while True:
+            request = await reader.readline()
+            if not request:
+                break
+            headers = {}
+            while True:
+                line = await reader.readline()
+                if line in (b'\r\n', b'\n', b''):
+                    break
+                name, _, value = line.decode('latin-1').partition(':')
+                headers[name.strip().lower()] = value.strip().lower()
+            parts = request.decode('latin-1').split()
+            if len(parts) != 3 or parts[0] != 'GET':
+                status, body = 405, b'{"error": "only GET requests"}'
+            else:
+                status, body = service.handle(parts[1])
+            close = headers.get('connection') == 'close' or parts[-1:] == ['HTTP/1.0']
+            writer.write(b'HTTP/1.1 %d %s\r\nContent-Type: application/json\r\nContent-Length: %d\r\n%s\r\n'
+                         % (status, _REASONS[status].encode(), len(body), b'Connection: close\r\n' if close else b''))
+            writer.write(body)
+            await writer.drain()
+            if close:
+                break
+    except (ConnectionError, asyncio.IncompleteReadError):
+        pass
+    finally:
+        writer.close()
+
+
+async def serve(service, host=HOST, port=PORT, ready=None):
+    '''Serve until cancelled. ready() is called once the port is open.'''
+    server = await asyncio.start_server(lambda r, w: _serve_connection(service, r, w), host, port)
+    if ready:
+        ready()
+    async with server:
+        await server.serve_forever()
+
+
+def _condition_text(col, op, value):
+    if op == 'in':
+        return '%s in %s' % (col, ','.join(map(str, value)))
+    return '%s%s%s' % (col, op, '%g' % value if isinstance(value, float) else value)
+
+
+def workload(store_dir=STORE_DIR, n=2000, seed=0):
+    '''
+    n request targets mixing player lookups (40%, many of the same well known players), searches (25%,
+    the SCOUT_QUERIES and searches with random thresholds), top k of a position (20%) and club breakdowns (15%).
+    The SCOUT_QUERIES and the top k of Rating are only asked for when the store has the composites.
+    '''
+    from fifa_scout import SCOUT_QUERIES
+    store = open_clean(store_dir)
+    rng = np.random.default_rng(seed)
+    ids = store.array('ID')[np.argsort(-store.array('Overall'), kind='stable')]
+    clubs = [c for c in np.unique(store.array('Club').astype(str)) if c != 'None']
+    positions = [p for p in np.unique(store.array('Position').astype(str)) if p != 'None']
+    queries = [(where, sort) for where, sort, _ in SCOUT_QUERIES
+               if all(c in store.columns for c in [c for c, _, _ in where] + sort)]
+    top_columns = [c for c in ['Rating', 'Overall', 'Potential', 'Value'] if c in store.columns]
+    targets = []
+    for kind in rng.choice(4, size=n, p=[0.4, 0.25, 0.2, 0.15]):
+        if kind == 0:
+            # popular players are asked for most: a geometric draw over the players by Overall
+            params = {'id': int(ids[min(rng.geometric(0.01) - 1, len(ids) - 1)])}
+            route = '/player'
+        elif kind == 1:
+            route = '/search'
+            if queries and rng.random() < 0.5:
+                where, sort = queries[rng.integers(len(queries))]
+                params = {'where': [_condition_text(*c) for c in where], 'sort': ','.join(sort)}
+            else:
+                params = {'where': ['Age<%d' % rng.integers(20, 35), 'Overall>%d' % rng.integers(60, 85),
+                                    'Position in %s' % positions[rng.integers(len(positions))]],
+                          'sort': 'Overall,Value'}
+        elif kind == 2:
+            route = '/top'
+            params = {'position': positions[rng.integers(len(positions))], 'k': 10,
+                      'column': top_columns[rng.integers(len(top_columns))]}
+        else:
+            route = '/clubs'
+            params = {'club': clubs[rng.integers(len(clubs))]}
+        targets.append('%s?%s' % (route, urlencode(params, doseq=True)))
+    return targets
+
+
+async def _fetch(reader, writer, target):
+    writer.write(b'GET %s HTTP/1.1\r\nHost: localhost\r\n\r\n' % target.encode())
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b''):
+            break
+        if line.lower().startswith(b'content-length:'):
+            length = int(line.split(b':')[1])
+    return status, await reader.readexactly(length)
+
+
+async def _load(targets, host, port, concurrency):
+    queue = iter(enumerate(targets))
+    latency = np.zeros(len(targets))
+    status = np.zeros(len(targets), dtype=np.int64)
+
+    async def worker():
+        reader, writer = await asyncio.open_connection(host, port)
+        try:
+            for i, target in queue:
+                t = time.perf_counter()
+                status[i], _ = await _fetch(reader, writer, target)
+                latency[i] = time.perf_counter() - t
+        finally:
+            writer.close()
+
+    t = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    seconds = time.perf_counter() - t
+    reader, writer = await asyncio.open_connection(host, port)
+    _, body = await _fetch(reader, writer, '/stats')
+    writer.close()
+    return latency, status, seconds, json.loads(body)
+
+
+def load_test(targets, host=HOST, port=PORT, concurrency=8):
+    '''
+    Send the request targets over concurrency kept alive connections to a running service.
+    Returns a table of latency percentiles (ms) and requests per second, per route and overall,
+    and the /stats of the service after the run.
+    '''
+    import pandas as pd
+    latency, status, seconds, stats = asyncio.run(_load(targets, host, port, concurrency))
+    runs = pd.DataFrame({'route': [urlsplit(t).path for t in targets], 'ms': latency * 1e3, 'error': status != 200})
+    table = runs.groupby('route').agg(requests=('ms', 'size'), errors=('error', 'sum'), p50=('ms', 'median'),
+                                      p99=('ms', lambda v: np.percentile(v, 99)), max=('ms', 'max'))
+    table.loc['all'] = [len(runs), runs.error.sum(), runs.ms.median(), np.percentile(runs.ms, 99), runs.ms.max()]
+    table['requests/s'] = np.nan
+    table.loc['all', 'requests/s'] = len(runs) / seconds
+    return table, stats
@@ -0,0 +1,109 @@
+import numpy as np
+import pandas as pd
+
+from fifa_composites import COMPOSITES
+from fifa_ingest import SKILL_COLS
+from fifa_instrument import instrumented
+from fifa_query import OPS
+
+# "Players like X" search in the normalized skill space.
+# The feature matrix (composites + raw skill columns, z-scored, float32) is built once after cleaning.
+# Queries are answered in batches: squared distances of all query vectors to a block of players are one
+# matrix product, and a running top-k is kept per query, so memory stays bounded for millions of rows.
+
+FEATURES = list(COMPOSITES) + SKILL_COLS
+BLOCK_SIZE = 1 << 16
+
+class SimilarityIndex:
+
+    @instrumented('build similarity index')
+    def __init__(self, df, features=None, block_size=BLOCK_SIZE):
+        self.df = df
+        self.features = [c for c in (FEATURES if features is None else features) if c in df.columns]
+        X = df[self.features].to_numpy(dtype=np.float64)
+        mean, std = np.nanmean(X, axis=0), np.nanstd(X, axis=0)
+        std[std == 0] = 1
+        self.mean, self.std = mean, std
+        self.X = np.nan_to_num((X - mean) / std).astype(np.float32)
+        self.sq_norms = np.einsum('ij,ij->i', self.X, self.X)
+        self.block_size = block_size
+        # names are not unique (two players are called 'P. Jones'), players are found by ID
+        self.ids = {int(i): pos for pos, i in enumerate(df['ID'].to_numpy())} if 'ID' in df.columns else {}
+        self.names = {}
+        for pos, name in enumerate(df['Name'] if 'Name' in df.columns else ()):
+            self.names.setdefault(name, []).append(pos)
+
+    def position(self, target):
+        '''Row position of a player given by ID, or by name when no other player has that name'''
+        if isinstance(target, str):
+            found = self.names.get(target, [])
+            if not found:
+                raise KeyError('no player named %r' % target)
+            if len(found) > 1:
+                ids = self.df['ID'].to_numpy()[found] if 'ID' in self.df.columns else found
+                raise ValueError('%d players are named %r (IDs %s), give the ID' % (len(found), target, ', '.join(map(str, ids))))
+            return found[0]
+        if int(target) not in self.ids:
+            raise KeyError('no player with ID %d' % target)
+        return self.ids[int(target)]
+
+    def vector(self, target):
+        '''Normalized feature vector of a player ID or name (see position), or of a raw attribute dict/Series'''
+        if isinstance(target, (str, int, np.integer)):
+            return self.X[self.position(target)]
+        raw = np.array([target.get(c, m) for c, m in zip(self.features, self.mean)], dtype=np.float64)
+        return ((raw - self.mean) / self.std).astype(np.float32)
+
+    def _mask(self, where):
+        mask = np.ones(len(self.df), dtype=bool)
+        for col, op, value in where:
+            mask &= OPS[op](self.df[col].to_numpy(), value)
+        return mask
+
+    @instrumented('similar players')
+    def nearest_positions(self, targets, k=10, where=()):
+        '''
+        Row positions and distances of the k nearest players of every target,
+        restricted to players matching the (column, op, value) conditions of where.
+        Targets given by ID or name are never returned as their own neighbour.
+        '''
+        Q = np.vstack([self.vector(t) for t in targets])
+        q_norms = np.einsum('ij,ij->i', Q, Q)
+        mask = self._mask(where) if where else None
+        exclude = [self.position(t) if isinstance(t, (str, int, np.integer)) else -1 for t in targets]
+        best_d = np.full((len(Q), 0), np.inf, dtype=np.float32)
+        best_i = np.empty((len(Q), 0), dtype=np.int64)
+        for start in range(0, len(self.X), self.block_size):
+            stop = min(start + self.block_size, len(self.X))
+            d = q_norms[:, None] - 2 * (Q @ self.X[start:stop].T) + self.sq_norms[None, start:stop]
+            if mask is not None:
+                d[:, ~mask[start:stop]] = np.inf
+            for qi, ex in enumerate(exclude):
+                if start <= ex < stop:
+                    d[qi, ex - start] = np.inf
+            # k best of the block, then k best of those merged with the running best
+            idx = np.argpartition(d, k, axis=1)[:, :k] if d.shape[1] > k else np.broadcast_to(np.arange(d.shape[1]), d.shape)
+            d = np.concatenate([best_d, np.take_along_axis(d, idx, axis=1)], axis=1)
+            idx = np.concatenate([best_i, idx + start], axis=1)
+            if d.shape[1] > k:
+                part = np.argpartition(d, k, axis=1)[:, :k]
+                d, idx = np.take_along_axis(d, part, axis=1), np.take_along_axis(idx, part, axis=1)
+            best_d, best_i = d, idx
+        order = np.argsort(best_d, axis=1)
+        best_d, best_i = np.take_along_axis(best_d, order, axis=1), np.take_along_axis(best_i, order, axis=1)
+        return best_i, np.sqrt(np.maximum(best_d, 0))
+
+    def similar(self, targets, k=10, where=(), columns=('Name', 'Club', 'Position', 'Age', 'Value')):
+        '''
+        The k most similar players of one or several targets (IDs, names or attribute dicts),
+        as a table with one row per (query, rank).
+        '''
+        targets = [targets] if isinstance(targets, (str, int, np.integer, dict, pd.Series)) else list(targets)
+        pos, dist = self.nearest_positions(targets, k, where)
+        frames = []
+        for qi, target in enumerate(targets):
+            ok = np.isfinite(dist[qi])
+            rows = self.df.iloc[pos[qi][ok]][[c for c in columns if c in self.df.columns]]
+            frames.append(rows.assign(query=target if isinstance(target, (str, int, np.integer)) else qi,
+                                      rank=np.arange(1, ok.sum() + 1), distance=dist[qi][ok]))
+        return pd.concat(frames)
@@ -0,0 +1,200 @@
+import time
+import numpy as np
+import pandas as pd
+
+from fifa_instrument import instrumented
+from fifa_query import OPS
+
+# Squad building under a transfer budget and a wage bill.
+# Picks one player per slot (a formation, or a list of open positions) maximizing the total of a score
+# column (Rating or any composite), with the total cost (Value or Release Clause) and the total Wage
+# capped, from players matching (column, op, value) conditions like the scouting searches.
+# The search is a branch and bound over the slots:
+#   - per Position, a player with at least as many better, cheaper and lower paid players as there are
+#     slots for that Position can never be needed, so only this k-skyline is searched
+#   - the bound of a partial squad is a knapsack over the remaining slots with the budget and the wage
+#     bill discretized (costs rounded down, uniqueness ignored), computed once by dynamic programming
+#   - identical slots (two CBs) take their players in order, so no squad is visited twice
+# The best squad is exact unless the time limit is hit, in which case the best squad found is returned.
+
+# slot -> the Positions that can play it
+SLOT_POSITIONS = {
+    'GK': ['GK'], 'RB': ['RB', 'RWB'], 'LB': ['LB', 'LWB'], 'CB': ['CB', 'LCB', 'RCB'],
+    'DM': ['CDM', 'LDM', 'RDM'], 'CM': ['CM', 'LCM', 'RCM'], 'AM': ['CAM', 'LAM', 'RAM'],
+    'RM': ['RM'], 'LM': ['LM'], 'RW': ['RW', 'RF'], 'LW': ['LW', 'LF'], 'ST': ['ST', 'LS', 'RS', 'CF'],
+}
+FORMATIONS = {
+    '4-3-3': ['GK', 'RB', 'CB', 'CB', 'LB', 'DM', 'CM', 'CM', 'RW', 'ST', 'LW'],
+    '4-4-2': ['GK', 'RB', 'CB', 'CB', 'LB', 'RM', 'CM', 'CM', 'LM', 'ST', 'ST'],
+    '4-2-3-1': ['GK', 'RB', 'CB', 'CB', 'LB', 'DM', 'DM', 'RW', 'AM', 'LW', 'ST'],
+    '3-5-2': ['GK', 'CB', 'CB', 'CB', 'RM', 'DM', 'CM', 'CM', 'LM', 'ST', 'ST'],
+}
+BUDGET_STEPS = 2000  # resolution of the budget or the wage bill in the bound
+COARSE_STEPS = 64  # resolution of both together
+
+def _skyline(score, cost, wage, k, block=512):
+    # Players dominated (score >=, cost <=, wage <=) by fewer than k others, ties broken by order.
+    # In order of decreasing score every dominator of a player comes before it, and a player dominated
+    # by k others is dominated by k players of the skyline, so each block of players is only compared
+    # with the skyline so far, and the players of the block that pass with each other.
+    order = np.lexsort((np.arange(len(score)), wage, cost, -score))
+    keep = np.zeros(len(score), dtype=bool)
+    sky = np.empty((0, 3))
+    for start in range(0, len(order), block):
+        rows = order[start:start + block]
+        p = np.column_stack([score[rows], cost[rows], wage[rows]])
+        alive = _dominators(sky, p).sum(axis=0) < k
+        rows, p = rows[alive], p[alive]
+        alive = (_dominators(sky, p).sum(axis=0) + np.triu(_dominators(p, p), 1).sum(axis=0)) < k
+        keep[rows[alive]] = True
+        sky = np.vstack([sky, p[alive]])
+    return keep
+
+
+def _dominators(a, b):
+    # a[i] at least as good as b[j] in score, cost and wage
+    return ((a[:, None, 0] >= b[None, :, 0]) & (a[:, None, 1] <= b[None, :, 1]) & (a[:, None, 2] <= b[None, :, 2]))
+
+
+def _group_bounds(cands, groups, units, shape):
+    # bound[t][b...]: best total score of slots t.. within b steps of every capped resource (costs rounded
+    # down), a knapsack over the slots by dynamic programming. The k identical slots of a group take k
+    # distinct candidates, only players shared by different slots can be counted twice.
+    bounds = [None] * len(cands) + [np.zeros(shape)]
+    for g, m in reversed(groups):
+        H = [bounds[g + m]] + [np.full(shape, -np.inf) for _ in range(m)]
+        for s, u in zip(cands[g]['score'], zip(*units[g]) if units[g] else [()] * len(cands[g]['score'])):
+            if any(ui >= n for ui, n in zip(u, shape)):
+                continue
+            dst = tuple(slice(ui, None) for ui in u)
+            src = tuple(slice(0, n - ui) for ui, n in zip(u, shape))
+            for j in range(m, 0, -1):
+                np.maximum(H[j][dst], H[j - 1][src] + s, out=H[j][dst])
+        for o in range(m):
+            bounds[g + o] = H[m - o]
+    return bounds
+
+
+@instrumented('build squad')
+def build_squad(df, slots='4-3-3', score='Rating', cost='Value', budget=None, wage_budget=None, where=(),
+                time_limit=1.0):
+    '''
+    Best squad of df for slots, a formation name of FORMATIONS or a list of slots of SLOT_POSITIONS (or raw
+    Positions), e.g. ['LB', 'CB'] for two open positions. Maximizes the total of the score column with the
+    total of the cost column at most budget and the total Wage at most wage_budget (None for no cap), among
+    the players matching the (column, op, value) conditions of where, e.g.
+    [('Age', '<', 27), ('Contract Valid Until', '>=', 2021), ('Club', '!=', 'Manchester United')].
+    Returns the squad (one row per slot) and a report with the totals, whether the squad is optimal,
+    the number of nodes searched and the time taken. The squad is empty when no squad fits the caps, or
+    when the time limit ran out before any was found (the report is then not optimal).
+    '''
+    t0 = time.perf_counter()
+    slots = FORMATIONS[slots] if isinstance(slots, str) else list(slots)
+    accepts = [set(SLOT_POSITIONS.get(s, [s])) for s in slots]
+
+    codes, labels = pd.factorize(df['Position'])
+    code_of = {p: i for i, p in enumerate(labels)}
+    s_all = df[score].to_numpy(dtype=float)
+    c_all = df[cost].to_numpy(dtype=float)
+    w_all = df['Wage'].to_numpy(dtype=float)
+    mask = ~(np.isnan(s_all) | np.isnan(c_all) | np.isnan(w_all))
+    for col, op, value in where:
+        mask &= OPS[op](df[col].to_numpy(), value)
+    # a capped cost only matters when there is a cap, otherwise any cost is as good as any other
+    c_dom = c_all if budget is not None else np.zeros(len(df))
+    w_dom = w_all if wage_budget is not None else np.zeros(len(df))
+
+    # k-skyline per Position, k being the number of slots that Position can play
+    wanted = {}
+    for p in set().union(*accepts):
+        k = sum(p in a for a in accepts)
+        rows = np.flatnonzero(mask & (codes == code_of.get(p, -2)))
+        if len(rows):
+            wanted[p] = rows[_skyline(s_all[rows], c_dom[rows], w_dom[rows], k)]
+
+    # candidates of every slot by decreasing score, identical slots next to each other and the
+    # slots with the fewest candidates first
+    cands = []
+    for a in accepts:
+        rows = np.concatenate([wanted.get(p, np.empty(0, dtype=np.int64)) for p in sorted(a)])
+        rows = rows[np.lexsort((c_all[rows], -s_all[rows]))]
+        cands.append({'rows': rows, 'score': s_all[rows], 'use': np.column_stack([c_all[rows], w_all[rows]])})
+    order = sorted(range(len(slots)), key=lambda t: (len(cands[t]['rows']), slots[t]))
+    slots = [slots[t] for t in order]
+    cands = [cands[t] for t in order]
+    groups = []
+    for t, slot in enumerate(slots):
+        if groups and slots[groups[-1][0]] == slot:
+            groups[-1][1] += 1
+        else:
+            groups.append([t, 1])
+
+    # bound tables: the budget and the wage bill finely on their own, coarsely together
+    limits = np.array([np.inf if budget is None else budget, np.inf if wage_budget is None else wage_budget])
+    capped = [r for r in (0, 1) if np.isfinite(limits[r])]
+    tables = [[r] for r in capped] + ([capped] if len(capped) == 2 else [])
+    bounds = []
+    for resources in tables:
+        steps = BUDGET_STEPS if len(resources) == 1 else COARSE_STEPS
+        unit = limits[resources] / steps
+        units = [[np.floor(c['use'][:, r] / limits[r] * steps).astype(np.int64) for r in resources] for c in cands]
+        bounds.append((resources, unit, steps, _group_bounds(cands, groups, units, (steps + 1,) * len(resources))))
+    if not tables:
+        bounds.append(([], [], 0, _group_bounds(cands, groups, [[] for _ in cands], (1,))))
+
+    def bound(t, left):
+        # bound of slot t on with left of every resource, for one or many (rows of left) partial squads
+        left = np.atleast_2d(left)
+        b = np.full(len(left), np.inf)
+        for resources, unit, steps, table in bounds:
+            # the small epsilon keeps float error from rounding a whole step away
+            idx = tuple(np.minimum(left[:, r] / u + 1e-9, steps).astype(np.int64) for r, u in zip(resources, unit))
+            b = np.minimum(b, table[t][idx] if resources else table[t][0])
+        return b
+
+    best = {'score': -np.inf, 'picks': None}
+    picks, taken = [], np.zeros(len(df), dtype=bool)
+    state = {'nodes': 0, 'timed_out': False}
+    deadline = t0 + time_limit if time_limit else None
+
+    def search(t, total, left, start):
+        if t == len(slots):
+            if total > best['score']:
+                best['score'], best['picks'] = total, list(picks)
+            return
+        state['nodes'] += 1
+        if deadline and state['nodes'] % 256 == 0 and time.perf_counter() > deadline:
+            state['timed_out'] = True
+        if state['timed_out']:
+            return
+        c = cands[t]
+        rows = c['rows'][start:]
+        child_left = left - c['use'][start:]
+        ok = ~taken[rows] & (child_left >= 0).all(axis=1)
+        value = np.where(ok, total + c['score'][start:] + bound(t + 1, np.maximum(child_left, 0)), -np.inf)
+        # children by decreasing bound: the first dive is the knapsack solution, and once a child
+        # can't beat the best squad found none of the next ones can
+        same_next = t + 1 < len(slots) and slots[t + 1] == slots[t]
+        for i in np.argsort(-value, kind='stable'):
+            if value[i] <= best['score']:
+                break
+            picks.append(rows[i])
+            taken[rows[i]] = True
+            search(t + 1, total + c['score'][start + i], child_left[i], start + i + 1 if same_next else 0)
+            taken[rows[i]] = False
+            picks.pop()
+
+    root_bound = bound(0, limits)[0]
+    search(0, 0.0, limits, 0)
+
+    if best['picks'] is None:
+        # no squad fits the caps or, when the report is not optimal, none was found in the time limit
+        squad = df.iloc[:0].assign(Slot=pd.Series(dtype=object))
+    else:
+        # back to the order of the slots as given
+        squad = df.iloc[best['picks']].assign(Slot=slots).iloc[np.argsort(order, kind='stable')]
+    report = {'score': squad[score].sum() if len(squad) else np.nan, 'bound': root_bound,
+              'cost': squad[cost].sum(), 'wage': squad['Wage'].sum(), 'optimal': not state['timed_out'],
+              'nodes': state['nodes'], 'candidates': sum(len(c['rows']) for c in cands),
+              'seconds': time.perf_counter() - t0}
+    return squad, report
@@ -0,0 +1,197 @@
+import hashlib
+import json
+import os
+import numpy as np
+
+from fifa_instrument import instrumented
+
+# Columnar on-disk store for the cleaned player table.
+# Every column is saved as its own .npy file, text columns as integer codes plus a list of labels.
+# Blocks of rating columns (the 26 positional ratings) are saved together as one int16 matrix,
+# -1 marking the missing ratings of GKs, and read back either whole or column by column.
+# Opening the store only reads a small meta.json, columns are memory-mapped when they are asked for,
+# so a question that needs 4 columns never touches the other 80.
+# The store remembers the sha256 of the source zip it was built from, a store built from
+# another version of the export is detected as stale.
+# pandas is only imported when DataFrames are asked for, ColumnStore.array reads columns with NumPy alone.
+
+STORE_DIR = 'fifa19_df_clean'
+META_FILE = 'meta.json'
+
+
+class StaleStoreError(Exception):
+    '''The store was built from a different source file than the one given'''
+
+
+def source_hash(path, block_size=1 << 20):
+    '''sha256 of a file, read in blocks'''
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _write_column(store_dir, i, name, col):
+    import pandas as pd
+    entry = {'name': name, 'file': 'col_%03d.npy' % i}
+    if col.dtype.kind in 'biuf':
+        entry['kind'] = 'numeric'
+        values = col.to_numpy()
+    elif col.dtype.kind == 'M':
+        entry['kind'] = 'datetime'
+        values = col.to_numpy(dtype='datetime64[ns]').view('int64')
+    else:
+        # text and categorical columns are stored as codes into a list of labels, -1 is missing
+        entry['kind'] = 'category' if isinstance(col.dtype, pd.CategoricalDtype) else 'text'
+        codes, labels = pd.factorize(col)
+        entry['labels'] = [l.item() if hasattr(l, 'item') else l for l in labels]
+        values = codes.astype(np.int32)
+    np.save(os.path.join(store_dir, entry['file']), values)
+    return entry
+
+
+def _write_matrix(store_dir, name, block):
+    # one int16 (players x columns) matrix for a block of whole number columns, -1 is missing
+    values = block.to_numpy(dtype=float)
+    known = values[~np.isnan(values)]
+    if len(known) and (known.min() < 0 or known.max() > np.iinfo(np.int16).max or (known != np.round(known)).any()):
+        return None
+    entry = {'kind': 'matrix', 'file': 'mat_%s.npy' % name, 'matrix': name}
+    np.save(os.path.join(store_dir, entry['file']), np.where(np.isnan(values), -1, values).astype(np.int16))
+    return {c: dict(entry, name=c, col=j, dtype=str(block[c].dtype)) for j, c in enumerate(block.columns)}
+
+
+def _write_meta(store_dir, meta):
+    # meta.json is written last, a store without it is incomplete
+    tmp = os.path.join(store_dir, META_FILE + '.tmp')
+    with open(tmp, 'w') as f:
+        json.dump(meta, f)
+    os.replace(tmp, os.path.join(store_dir, META_FILE))
+
+
+@instrumented('save store')
+def save_clean(df, store_dir=STORE_DIR, source=None, matrices=None):
+    '''
+    Write df column by column to store_dir. source is the path of the raw export df was cleaned from.
+    matrices maps a name to a block of columns saved together as one int16 matrix
+    (by default 'positional', the LS ... RB ratings, when df has them).
+    '''
+    import pandas as pd
+    if matrices is None:
+        from fifa_parsers import POS_COLS
+        matrices = {'positional': POS_COLS}
+    os.makedirs(store_dir, exist_ok=True)
+    in_matrix = {}
+    for name, block in matrices.items():
+        if all(c in df.columns for c in block):
+            in_matrix.update(_write_matrix(store_dir, name, df[list(block)]) or {})
+    meta = {'source_hash': source_hash(source) if source else None, 'rows': len(df),
+            'index': [int(i) for i in df.index] if not isinstance(df.index, pd.RangeIndex) else None,
+            'columns': [in_matrix[name] if name in in_matrix else _write_column(store_dir, i, name, col)
+                        for i, (name, col) in enumerate(df.items())]}
+    _write_meta(store_dir, meta)
+
+
+def add_columns(df, store_dir=STORE_DIR):
+    '''Add the columns of df (same rows as the store) to an existing store, replacing columns of the same name'''
+    with open(os.path.join(store_dir, META_FILE)) as f:
+        meta = json.load(f)
+    if len(df) != meta['rows']:
+        raise ValueError('%d rows given, the store has %d' % (len(df), meta['rows']))
+    entries = {c['name']: c for c in meta['columns']}
+    n = max([int(c['file'][4:7]) for c in meta['columns'] if c['kind'] != 'matrix'] + [-1]) + 1
+    replaced = {entries[name]['file'] for name in df.columns if name in entries}
+    for name, col in df.items():
+        entries[name] = _write_column(store_dir, n, name, col)
+        n += 1
+    meta['columns'] = list(entries.values())
+    _write_meta(store_dir, meta)
+    # a matrix file is only removed once none of its columns is left
+    for f in replaced - {c['file'] for c in meta['columns']}:
+        os.remove(os.path.join(store_dir, f))
+
+
+class ColumnStore:
+    '''Lazy reader of a store written by save_clean'''
+
+    def __init__(self, store_dir=STORE_DIR):
+        self.store_dir = store_dir
+        with open(os.path.join(store_dir, META_FILE)) as f:
+            self.meta = json.load(f)
+        self._entries = {c['name']: c for c in self.meta['columns']}
+
+    @property
+    def index(self):
+        import pandas as pd
+        return pd.RangeIndex(self.meta['rows']) if self.meta['index'] is None else pd.Index(self.meta['index'])
+
+    @property
+    def columns(self):
+        return list(self._entries)
+
+    def __len__(self):
+        return self.meta['rows']
+
+    def is_stale(self, source):
+        return self.meta['source_hash'] != source_hash(source)
+
+    def matrix(self, name):
+        '''int16 matrix (memory-mapped, -1 for missing) of a block saved together, and its column names'''
+        columns = [c['name'] for c in self.meta['columns'] if c.get('matrix') == name]
+        if not columns:
+            raise KeyError(name)
+        return np.load(os.path.join(self.store_dir, self._entries[columns[0]]['file']), mmap_mode='r'), columns
+
+    def _matrix_column(self, entry):
+        values = np.load(os.path.join(self.store_dir, entry['file']), mmap_mode='r')[:, entry['col']]
+        if np.dtype(entry['dtype']).kind == 'f':
+            return np.where(values < 0, np.nan, values).astype(entry['dtype'])
+        return values.astype(entry['dtype'])
+
+    def array(self, name):
+        '''NumPy array of a column, memory-mapped for numeric columns, labels (None for missing) for text columns'''
+        entry = self._entries[name]
+        if entry['kind'] == 'matrix':
+            return self._matrix_column(entry)
+        values = np.load(os.path.join(self.store_dir, entry['file']), mmap_mode='r')
+        if entry['kind'] == 'numeric':
+            return values
+        if entry['kind'] == 'datetime':
+            return np.asarray(values).view('datetime64[ns]')
+        return np.array(entry['labels'] + [None], dtype=object)[values]
+
+    def column(self, name):
+        import pandas as pd
+        entry = self._entries[name]
+        if entry['kind'] == 'matrix':
+            return pd.Series(self._matrix_column(entry), index=self.index, name=name)
+        values = np.load(os.path.join(self.store_dir, entry['file']), mmap_mode='r')
+        if entry['kind'] == 'numeric':
+            return pd.Series(values, index=self.index, name=name, copy=False)
+        if entry['kind'] == 'datetime':
+            return pd.Series(np.asarray(values).view('datetime64[ns]'), index=self.index, name=name)
+        col = pd.Categorical.from_codes(np.asarray(values), categories=entry['labels'])
+        if entry['kind'] == 'text':
+            col = np.asarray(col, dtype=object)
+        return pd.Series(col, index=self.index, name=name)
+
+    @instrumented('read store')
+    def read(self, columns=None):
+        '''DataFrame of the given columns (all columns by default)'''
+        import pandas as pd
+        columns = self.columns if columns is None else list(columns)
+        return pd.DataFrame({name: self.column(name) for name in columns}, index=self.index)
+
+    __getitem__ = column
+
+
+def open_clean(store_dir=STORE_DIR, source=None):
+    '''
+    Open the cleaned store. If source (the raw export zip) is given the store must have been built from it,
+    otherwise StaleStoreError is raised and the cleaning has to be rerun.
+    '''
+    store = ColumnStore(store_dir)
+    if source is not None and store.is_stale(source):
+        raise StaleStoreError('%s was not built from the current %s, rerun the cleaning' % (store_dir, source))
+    return store
@@ -0,0 +1,117 @@
+import io
+import os
+from zipfile import ZipFile, ZIP_DEFLATED
+import numpy as np
+import pandas as pd
+
+import fifa_ingest
+from fifa_parsers import POS_COLS, parse_currency
+
+# Synthetic player exports at any multiple of the size of data/fifa19.zip, for benchmarking.
+# Rows are drawn from the real export (so the joint distributions, GK nulls in the positional block,
+# the nulls of loaned players and of players without club or foot all come along) and then perturbed:
+#   - skills, Overall, Potential and the positional ratings move by a few points
+#   - Value, Wage and Release Clause are scaled by a lognormal factor
+#   - every player gets a new ID
+# The values are written back with the real encodings ('€110.5M', '€565K', '88+2', '159lbs'), in a zip
+# with the same layout as data/fifa19.zip, so the whole pipeline can read it unchanged.
+
+SYNTH_DIR = 'synthetic'
+CHUNK_ROWS = 50000
+
+MONEY_COLS = ['Value', 'Wage', 'Release Clause']
+RATING_COLS = ['Overall', 'Potential'] + fifa_ingest.SKILL_COLS
+
+
+class Template:
+    '''The real export as strings, with the numeric columns we perturb parsed once'''
+
+    def __init__(self, zip_path=fifa_ingest.ZIP_PATH, member=fifa_ingest.CSV_MEMBER):
+        with ZipFile(zip_path) as zf, zf.open(member) as f:
+            self.raw = pd.read_csv(f, dtype=str, encoding='utf-8-sig')
+        self.raw = self.raw.rename(columns={self.raw.columns[0]: ''})  # the unnamed row number column
+        self.money = {c: parse_currency(self.raw[c]).to_numpy() for c in MONEY_COLS}
+        self.ratings = {c: pd.to_numeric(self.raw[c]).to_numpy() for c in RATING_COLS}
+        parts = {c: self.raw[c].str.extract(r'^(\d+)\+(\d+)$').astype(float).to_numpy() for c in POS_COLS}
+        self.pos_base = np.column_stack([parts[c][:, 0] for c in POS_COLS])
+        self.pos_bonus = np.column_stack([parts[c][:, 1] for c in POS_COLS])
+        self.weight = pd.to_numeric(self.raw['Weight'].str.rstrip('lbs')).to_numpy()
+
+    def __len__(self):
+        return len(self.raw)
+
+
+def _format_unique(values, fmt):
+    # Format only the distinct values and broadcast them back, nan stays null.
+    uniques, inverse = np.unique(values, return_inverse=True)
+    formatted = np.array([None if np.isnan(u) else fmt(u) for u in uniques], dtype=object)
+    return formatted[inverse.reshape(np.shape(values))]
+
+
+'''Function to encode money like the export: 110500000.0 -> '€110.5M', 565000.0 -> '€565K', 0 -> '€0' '''
+def format_currency(values):
+    values = np.asarray(values, dtype=float)
+    # round to the precision of the export first: 0.1M above a million, 1K below
+    rounded = np.where(values >= 1e6, np.round(values / 1e5) * 1e5, np.round(values / 1e3) * 1e3)
+    return _format_unique(rounded, lambda v: '€%gM' % (v / 1e6) if v >= 1e6 else '€%dK' % (v / 1e3) if v else '€0')
+
+
+def synthetic_chunk(template, n, rng, first_id=1):
+    '''n synthetic raw rows (all strings, same columns as the export) drawn from template'''
+    rows = rng.integers(0, len(template), n)
+    chunk = template.raw.iloc[rows].reset_index(drop=True)
+    chunk['ID'] = np.arange(first_id, first_id + n).astype(str)
+
+    # one shift per player for Overall, Potential and the positional block keeps them consistent,
+    # the individual skills get their own noise on top
+    shift = rng.integers(-2, 3, n)
+    for c in RATING_COLS:
+        noise = shift if c in ('Overall', 'Potential') else shift + rng.integers(-1, 2, n)
+        vals = np.clip(template.ratings[c][rows] + noise, 1, 99)
+        chunk[c] = _format_unique(vals, lambda v: '%d' % v)
+    base = np.clip(template.pos_base[rows] + shift[:, None], 1, 99)
+    chunk[POS_COLS] = _format_unique(base * 10 + template.pos_bonus[rows], lambda v: '%d+%d' % divmod(v, 10))
+
+    factor = np.exp(rng.normal(0, 0.15, n))
+    for c in MONEY_COLS:
+        chunk[c] = format_currency(template.money[c][rows] * factor)
+    weight = template.weight[rows] + rng.integers(-3, 4, n)
+    chunk['Weight'] = _format_unique(weight, lambda v: '%dlbs' % v)
+    return chunk
+
+
+def synthetic_players(scale, template=None, seed=0, chunk_rows=CHUNK_ROWS):
+    '''Yield the raw chunks of a synthetic export scale times the size of the real one'''
+    template = template or Template()
+    rng = np.random.default_rng(seed)
+    total = int(round(len(template) * scale))
+    for start in range(0, total, chunk_rows):
+        chunk = synthetic_chunk(template, min(chunk_rows, total - start), rng, first_id=start + 1)
+        chunk[''] = np.arange(start, start + len(chunk)).astype(str)
+        yield chunk
+
+
+def synthetic_path(scale, directory=SYNTH_DIR):
+    return os.path.join(directory, 'fifa19_x%g.zip' % scale)
+
+
+def write_synthetic(scale, path=None, seed=0, template=None, chunk_rows=CHUNK_ROWS):
+    '''
+    Write a synthetic export scale times the size of data/fifa19.zip (10, 100, 1000, or a fraction)
+    as a zip with a data.csv member, chunk by chunk. Returns the path.
+    '''
+    path = path or synthetic_path(scale)
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp = path + '.tmp'
+    with ZipFile(tmp, 'w', ZIP_DEFLATED) as zf, zf.open(fifa_ingest.CSV_MEMBER, 'w', force_zip64=True) as f:
+        with io.TextIOWrapper(f, encoding='utf-8', newline='') as out:
+            for i, chunk in enumerate(synthetic_players(scale, template, seed, chunk_rows)):
+                chunk.to_csv(out, index=False, header=i == 0)
+    os.replace(tmp, path)
+    return path
+
+
+def ensure_synthetic(scale, seed=0):
+    '''Path of the synthetic export of this scale, written first if it isn't there yet'''
+    path = synthetic_path(scale)
+    return path if os.path.exists(path) else write_synthetic(scale, path, seed)
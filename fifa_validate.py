@@ -0,0 +1,184 @@
+import re
+import numpy as np
+import pandas as pd
+
+from fifa_ingest import SKILL_COLS
+from fifa_instrument import instrumented
+from fifa_parsers import POS_COLS
+from fifa_query import OPS
+
+# Declarative data quality rules for the player exports.
+# A rule is a plain dict (kind, columns, parameters, severity) built by the functions below:
+#   - range_rule:   values of one or a block of columns within [min, max], nulls left to the null rules
+#   - null_rule:    a block of columns null exactly when a condition holds (or never null), all or none of it
+#   - domain_rule:  values of a column in a set of known values
+#   - pattern_rule: text of a column matching a regular expression (the encodings '€110.5M', "5'7" ...)
+#   - compare_rule: a column compared to another column (or a constant), row by row
+# Every rule is evaluated as array operations over whole columns (pattern and domain rules only look at
+# the distinct values), and the report lists for every rule the number of rows breaking it and their IDs.
+# Severity is 'error' (the data can't be right), 'warning' (cleaned by a later step) or 'info' (expected,
+# but worth a count: players without club, Value of 0).
+
+def _columns(columns):
+    return [columns] if isinstance(columns, str) else list(columns)
+
+
+def range_rule(columns, min=None, max=None, severity='error', name=None):
+    columns = _columns(columns)
+    return {'kind': 'range', 'name': name or '%s range' % columns[0], 'columns': columns, 'min': min, 'max': max,
+            'severity': severity, 'description': '%s within [%s, %s]' % (', '.join(columns), min, max)}
+
+
+def null_rule(columns, when=None, severity='error', name=None):
+    '''when: None (never null) or a (column, op, value) condition, op 'null' and 'notnull' taking no value'''
+    columns = _columns(columns)
+    text = 'never null' if when is None else 'null exactly when %s %s %s' % (when[0], when[1], '' if len(when) < 3 else when[2])
+    return {'kind': 'null', 'name': name or '%s nulls' % columns[0], 'columns': columns,
+            'when': None if when is None else list(when), 'severity': severity,
+            'description': '%s %s' % (', '.join(columns) if len(columns) < 4 else '%s ... %s' % (columns[0], columns[-1]), text.strip())}
+
+
+def domain_rule(column, values, severity='error', name=None):
+    return {'kind': 'domain', 'name': name or '%s domain' % column, 'columns': [column], 'values': list(values),
+            'severity': severity, 'description': '%s in %s' % (column, ', '.join(map(str, values)))}
+
+
+def pattern_rule(columns, pattern, severity='error', name=None):
+    columns = _columns(columns)
+    return {'kind': 'pattern', 'name': name or '%s format' % columns[0], 'columns': columns, 'pattern': pattern,
+            'severity': severity, 'description': '%s match %s' % (columns[0] if len(columns) == 1 else '%s ... %s' % (columns[0], columns[-1]), pattern)}
+
+
+def compare_rule(left, op, right, severity='error', name=None):
+    '''left op right, right being a column name or a constant. Rows with a null side are skipped.'''
+    return {'kind': 'compare', 'name': name or '%s %s %s' % (left, op, right), 'columns': [left, right], 'op': op,
+            'severity': severity, 'description': '%s %s %s' % (left, op, right)}
+
+
+def _condition(df, when):
+    col, op = when[0], when[1]
+    if op == 'null':
+        return df[col].isna().to_numpy()
+    if op == 'notnull':
+        return df[col].notna().to_numpy()
+    return OPS[op](df[col].to_numpy(), when[2]) & df[col].notna().to_numpy()
+
+
+def _check_range(df, rule, distinct):
+    X = df[rule['columns']].to_numpy(dtype=float)
+    bad = np.zeros(X.shape, dtype=bool)
+    with np.errstate(invalid='ignore'):
+        if rule['min'] is not None:
+            bad |= X < rule['min']
+        if rule['max'] is not None:
+            bad |= X > rule['max']
+    return bad.any(axis=1)
+
+
+def _check_null(df, rule, distinct):
+    nulls = df[rule['columns']].isna().to_numpy()
+    all_null, any_null = nulls.all(axis=1), nulls.any(axis=1)
+    expected = np.zeros(len(df), dtype=bool) if rule['when'] is None else _condition(df, rule['when'])
+    # partly null blocks are wrong whatever the condition
+    return (any_null & ~all_null) | (all_null != expected)
+
+
+def _check_domain(df, rule, distinct):
+    codes, uniques = distinct(rule['columns'][0])
+    ok = np.append(pd.Index(uniques).isin(rule['values']), True)  # nulls are left to the null rules
+    return ~ok[codes]
+
+
+def _check_pattern(df, rule, distinct):
+    regex = re.compile(rule['pattern'])
+    bad = np.zeros(len(df), dtype=bool)
+    for col in rule['columns']:
+        codes, uniques = distinct(col)
+        ok = np.array([regex.fullmatch(str(u)) is not None for u in uniques] + [True])
+        bad |= ~ok[codes]
+    return bad
+
+
+def _check_compare(df, rule, distinct):
+    left, right = rule['columns']
+    a = df[left].to_numpy(dtype=float)
+    b = df[right].to_numpy(dtype=float) if isinstance(right, str) and right in df.columns else np.full(len(df), float(right))
+    with np.errstate(invalid='ignore'):
+        return ~OPS[rule['op']](a, b) & ~np.isnan(a) & ~np.isnan(b)
+
+
+_CHECKS = {'range': _check_range, 'null': _check_null, 'domain': _check_domain, 'pattern': _check_pattern,
+           'compare': _check_compare}
+
+
+@instrumented('validate')
+def validate(df, rules, id_col='ID', max_ids=10):
+    '''
+    Evaluate rules over df. Returns a summary (one row per rule: kind, severity, description, number of
+    violations and the first max_ids offending IDs) and the violations (one row per rule and offending row,
+    with the row label and its ID). Rules whose columns are missing from df are reported as skipped.
+    '''
+    cache = {}
+    def distinct(col):
+        # codes and distinct values of a column, shared by all the rules on it
+        if col not in cache:
+            cache[col] = pd.factorize(df[col])
+        return cache[col]
+
+    ids = df[id_col].to_numpy() if id_col in df.columns else df.index.to_numpy()
+    summary, details = [], []
+    for rule in rules:
+        needed = rule['columns'][:1] if rule['kind'] == 'compare' and rule['columns'][1] not in df.columns else rule['columns']
+        needed = needed + ([rule['when'][0]] if rule.get('when') else [])
+        missing = [c for c in needed if c not in df.columns]
+        rows = np.empty(0, dtype=np.int64) if missing else np.flatnonzero(_CHECKS[rule['kind']](df, rule, distinct))
+        summary.append({'rule': rule['name'], 'kind': rule['kind'], 'severity': rule['severity'],
+                        'description': rule['description'], 'violations': len(rows), 'skipped': bool(missing),
+                        'ids': ids[rows[:max_ids]].tolist()})
+        details.append(pd.DataFrame({'rule': rule['name'], 'row': df.index[rows], 'id': ids[rows]}))
+    return pd.DataFrame(summary).set_index('rule'), pd.concat(details, ignore_index=True)
+
+
+BODY_TYPES = ['Normal', 'Lean', 'Stocky']
+WORK_RATES = ['%s/ %s' % (a, d) for a in ('High', 'Medium', 'Low') for d in ('High', 'Medium', 'Low')]
+POSITIONS = ['GK'] + POS_COLS
+CURRENCY = r'€\d+(\.\d+)?[KM]?'
+
+# Rules of the raw export, as read by fifa_ingest.load_players (encoded strings)
+RAW_RULES = [
+    null_rule('ID'), range_rule('Age', 16, 45), range_rule(['Overall', 'Potential'], 1, 99, name='rating range'),
+    range_rule(SKILL_COLS, 1, 99, name='skill range'),
+    range_rule(['International Reputation', 'Weak Foot', 'Skill Moves'], 1, 5, name='star range'),
+    compare_rule('Potential', '>=', 'Overall'),
+    null_rule('Club', severity='info', name='no club'),
+    null_rule('Preferred Foot', severity='warning', name='no preferred foot'),
+    # players without Preferred Foot have no skills, physical attributes, Position or Joined either
+    null_rule(SKILL_COLS + ['Height', 'Weight', 'Work Rate', 'Body Type'], when=('Preferred Foot', 'null'),
+              name='no foot, no attributes'),
+    # the players without Position (no club or no foot) have no positional ratings either, they are dropped
+    null_rule(POS_COLS, when=('Position', '==', 'GK'), severity='warning', name='positional nulls are GKs'),
+    null_rule(['Joined'], when=('Loaned From', 'notnull'), severity='warning', name='loaned players not joined'),
+    null_rule(['Release Clause'], when=('Loaned From', 'notnull'), severity='warning', name='loaned players no release clause'),
+    domain_rule('Body Type', BODY_TYPES, severity='warning'), domain_rule('Work Rate', WORK_RATES),
+    domain_rule('Preferred Foot', ['Left', 'Right']), domain_rule('Position', POSITIONS),
+    pattern_rule(['Value', 'Wage', 'Release Clause'], CURRENCY, name='currency format'),
+    pattern_rule('Height', r"\d+'\d+"), pattern_rule('Weight', r'\d+lbs'),
+    pattern_rule(POS_COLS, r'\d+\+\d+', name='positional format'),
+    pattern_rule('Contract Valid Until', r'\d{4}|[A-Z][a-z]{2} \d{1,2}, \d{4}'),
+]
+
+# Rules of the clean table (fifa_clean.clean_players, or the store)
+CLEAN_RULES = [
+    null_rule(['ID', 'Name', 'Club', 'Position', 'Preferred Foot', 'Joined', 'Contract Valid Until',
+               'Value', 'Wage', 'Release Clause', 'Height (cms)', 'Weight (lbs)'] + SKILL_COLS, name='required'),
+    range_rule('Age', 16, 45), range_rule(['Overall', 'Potential'], 1, 99, name='rating range'),
+    range_rule(SKILL_COLS, 1, 99, name='skill range'), range_rule(POS_COLS, 1, 99, name='positional range'),
+    range_rule('Height (cms)', 150, 210), range_rule('Weight (lbs)', 100, 260),
+    range_rule('Contract Valid Until', 2018, 2030),
+    compare_rule('Potential', '>=', 'Overall'),
+    compare_rule('Value', '>', 0, severity='info', name='zero value'),
+    compare_rule('Release Clause', '>=', 'Value', severity='warning'),
+    null_rule(POS_COLS, when=('Position', '==', 'GK'), name='positional nulls are GKs'),
+    domain_rule('Body Type', BODY_TYPES), domain_rule('Work Rate', WORK_RATES),
+    domain_rule('Preferred Foot', ['Left', 'Right']), domain_rule('Position', POSITIONS),
+]
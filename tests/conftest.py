@@ -0,0 +1,44 @@
+import os
+import sys
+import pytest
+
+# the modules are flat files at the root of the repository
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+ZIP_PATH = os.path.join(ROOT, 'data', 'fifa19.zip')
+
+
+@pytest.fixture(scope='session')
+def zip_path():
+    return ZIP_PATH
+
+
+@pytest.fixture(scope='session')
+def raw(zip_path):
+    '''The export as loaded by fifa_ingest, every test gets the same (unmodified) table'''
+    from fifa_ingest import load_players
+    return load_players(zip_path)
+
+
+@pytest.fixture(scope='session')
+def cleaned(raw):
+    '''(clean table, reports) of clean_players'''
+    from fifa_clean import clean_players
+    return clean_players(raw.copy())
+
+
+@pytest.fixture(scope='session')
+def clean(cleaned):
+    '''The clean table with the composites'''
+    from fifa_composites import add_composites
+    return add_composites(cleaned[0].copy())
+
+
+@pytest.fixture(scope='session')
+def store_dir(tmp_path_factory, clean, zip_path):
+    '''A store of the clean table built from data/fifa19.zip'''
+    from fifa_store import save_clean
+    directory = str(tmp_path_factory.mktemp('store'))
+    save_clean(clean, directory, source=zip_path)
+    return directory
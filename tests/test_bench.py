@@ -0,0 +1,47 @@
+import json
+import numpy as np
+import pytest
+
+from fifa_bench import (best_time, compare, load_baseline, load_baselines, machine, machine_key, run_benchmarks,
+                        save_baseline)
+from fifa_synth import Template, write_synthetic
+
+RESULTS = {'ingest': {'rows': 100, 'seconds': 2.0}, 'composites': {'rows': 100, 'seconds': 1.0}}
+
+
+def test_baselines_per_machine(tmp_path):
+    path = str(tmp_path / 'bench' / 'baselines.json')
+    assert load_baselines(path) == {} and load_baseline(10, path) is None
+    save_baseline(RESULTS, 10, path)
+    save_baseline({'ingest': {'rows': 1000, 'seconds': 20.0}}, 100, path)
+    assert load_baseline(10, path)['results'] == RESULTS
+    assert load_baseline(100, path)['machine'] == machine()
+    # the baselines of another machine are kept but never used here
+    with open(path) as f:
+        baselines = json.load(f)
+    other = dict(machine(), host='elsewhere')
+    baselines[machine_key(other)] = {'x10': {'machine': other, 'results': {}}}
+    with open(path, 'w') as f:
+        json.dump(baselines, f)
+    save_baseline(RESULTS, 1000, path)
+    assert set(load_baselines(path)) == {machine_key(), machine_key(other)}
+    assert load_baseline(10, path)['results'] == RESULTS
+
+
+def test_compare():
+    table = compare({'ingest': {'rows': 100, 'seconds': 3.0}, 'composites': {'rows': 100, 'seconds': 1.1},
+                     'new step': {'rows': 100, 'seconds': 1.0}}, {'results': RESULTS})
+    assert table['ratio'].round(2).tolist()[:2] == [1.5, 1.1]
+    assert table['regression'].tolist() == [True, False, False]
+    assert np.isnan(table.loc['new step', 'baseline'])
+    assert table.loc['ingest', 'rows/s'] == pytest.approx(100 / 3)
+    assert not compare(RESULTS, None)['regression'].any()
+
+
+def test_run_benchmarks(zip_path, tmp_path):
+    assert best_time(lambda: None, repeat=2) >= 0
+    path = write_synthetic(0.05, str(tmp_path / 'x.zip'), template=Template(zip_path))
+    results = run_benchmarks(path, repeat=1, query_repeat=1)
+    assert {'ingest', 'parse currency', 'composites', 'scout index', 'scout query 1'} <= set(results)
+    assert results['ingest']['rows'] == 910
+    assert all(r['seconds'] >= 0 for r in results.values())
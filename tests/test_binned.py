@@ -0,0 +1,47 @@
+import numpy as np
+import pandas as pd
+
+from fifa_binned import BinnedFrame, grouped_moments, grouped_quantiles, kde_grid
+
+
+def test_grouped_statistics():
+    rng = np.random.default_rng(0)
+    values, codes = rng.normal(size=500), rng.integers(-1, 4, 500)
+    values[::17] = np.nan
+    frame = pd.DataFrame({'v': values, 'g': codes})[(codes >= 0) & ~np.isnan(values)]
+    n, mean, std = grouped_moments(values, codes, 5)
+    groups = frame.groupby('g')['v']
+    assert n[:4].tolist() == groups.size().tolist() and n[4] == 0
+    np.testing.assert_allclose(mean[:4], groups.mean())
+    np.testing.assert_allclose(std[:4], groups.std())
+    q = grouped_quantiles(values, codes, 5, (0.25, 0.5, 0.9))
+    np.testing.assert_allclose(q[:4], groups.quantile([0.25, 0.5, 0.9]).unstack().to_numpy())
+    assert np.isnan(q[4]).all()
+
+
+def test_kde_integrates_to_one():
+    rng = np.random.default_rng(1)
+    values, codes = rng.normal(size=1000), rng.integers(0, 2, 1000)
+    codes[0], values[0] = 2, 5.0  # a group of one value has no bandwidth
+    points, density = kde_grid(values, codes, 3)
+    dx = points[1] - points[0]
+    np.testing.assert_allclose(density[:2].sum(axis=1) * dx, 1, atol=1e-2)
+    assert (density[2] == 0).all()
+
+
+def test_frame(clean):
+    frame = BinnedFrame(clean, sample_rows=500)
+    labels, counts = frame.counts('Preferred Foot')
+    expected = clean['Preferred Foot'].value_counts()
+    assert dict(zip(labels, counts)) == expected.to_dict()
+    edges, counts = frame.histogram('Age')
+    assert counts.sum() == len(clean) and len(edges) == clean.Age.max() - clean.Age.min() + 2
+    binned = frame.binned('Age', 'Overall')
+    means = clean.groupby('Age')['Overall'].mean()
+    np.testing.assert_allclose(binned.set_index('Age')['mean'], means.loc[binned['Age']])
+    sample = frame.sample(['Position', 'Value'])
+    assert 400 < len(sample) < 700
+    assert sample['Value'].max() == clean['Value'].max() and sample['Value'].min() == clean['Value'].min()
+    assert set(sample['Position']) == set(clean['Position'].dropna())
+    labels, points, density = frame.kde('Overall', by='Preferred Foot')
+    assert density.shape == (len(labels), len(points))
@@ -0,0 +1,63 @@
+import os
+import matplotlib
+import pytest
+
+from fifa_charts import (chart_key, chart_path, count_spec, dist_spec, line_spec, render_charts, report_specs,
+                         spec_columns, violin_spec)
+
+
+@pytest.fixture(scope='module')
+def sample(clean):
+    return clean.sample(500, random_state=0)
+
+
+def test_specs():
+    assert spec_columns(violin_spec('Position', 'Age', hue='Preferred Foot')) == ['Position', 'Age', 'Preferred Foot']
+    specs = report_specs(['Age', 'Value'], ['Position'], ['Age', 'Value'])
+    assert [s['kind'] for s in specs] == ['violin', 'violin', 'pairplot', 'pairgrid_line']
+    assert spec_columns(specs[-1]) == ['Position', 'Age', 'Value']
+    assert count_spec('Position', fig_size_tup=(8, 4))['figsize'] == [8, 4]
+
+
+def test_chart_key(sample):
+    spec = dist_spec('Age')
+    key = chart_key(spec, sample)
+    assert len(key) == 16 and key == chart_key(dict(spec), sample.copy())
+    # other columns don't matter, the spec and the values of its columns do
+    assert chart_key(spec, sample.assign(Value=0)) == key
+    assert chart_key(spec, sample.assign(Age=sample.Age + 1)) != key
+    assert chart_key(dist_spec('Age', col='b'), sample) != key
+    path = chart_path(spec, sample, 'out')
+    assert os.path.dirname(path) == 'out' and os.path.basename(path).startswith('Age_distribution-')
+    assert path.endswith('-%s.png' % key) and path != chart_path(dist_spec('Age', col='b'), sample, 'out')
+    assert chart_path(spec, sample.assign(Age=sample.Age + 1), 'out')[:-len(key) - 4] == path[:-len(key) - 4]
+
+
+@pytest.mark.parametrize('mode', ['full', 'binned'])
+def test_render_skips_and_removes_stale(sample, tmp_path, mode):
+    backend = matplotlib.get_backend()
+    specs = [count_spec('Preferred Foot', fig_size_tup=(4, 3)), dist_spec('Age'), line_spec('Age', 'Overall', (4, 3))]
+    paths = render_charts(sample, specs, str(tmp_path), processes=1, mode=mode)
+    assert all(os.path.exists(p) for p in paths)
+    assert sorted(os.listdir(tmp_path)) == sorted(os.path.basename(p) for p in paths)
+    mtimes = [os.path.getmtime(p) for p in paths]
+    assert render_charts(sample, specs, str(tmp_path), processes=1, mode=mode) == paths
+    assert [os.path.getmtime(p) for p in paths] == mtimes
+    # other data: the Age charts are drawn again and their old images removed
+    changed = sample.assign(Age=sample.Age + 1)
+    new_paths = render_charts(changed, specs, str(tmp_path), processes=1, mode=mode)
+    assert new_paths[0] == paths[0] and new_paths[1:] != paths[1:]
+    assert sorted(os.listdir(tmp_path)) == sorted(os.path.basename(p) for p in new_paths)
+    assert matplotlib.get_backend() == backend
+    with pytest.raises(ValueError):
+        render_charts(sample, specs, str(tmp_path), mode='fast')
+
+
+def test_same_name_kept_apart(sample, tmp_path):
+    # the same violin with and without hue, and in full and binned mode, share a name but not their images
+    plain, split = violin_spec('Position', 'Age', (4, 3)), violin_spec('Position', 'Age', (4, 3), hue='Preferred Foot')
+    assert plain['name'] == split['name']
+    paths = render_charts(sample, [plain], str(tmp_path), processes=1, mode='full')
+    paths += render_charts(sample, [split], str(tmp_path), processes=1, mode='full')
+    paths += render_charts(sample, [plain], str(tmp_path), processes=1, mode='binned')
+    assert len(set(paths)) == 3 and sorted(os.listdir(tmp_path)) == sorted(os.path.basename(p) for p in paths)
@@ -0,0 +1,103 @@
+import zipfile
+import numpy as np
+import pandas as pd
+
+from fifa_clean import BODY_TYPES, clean_export, fix_loans, normalize_body_type
+from fifa_parsers import POS_COLS
+
+
+def original_cleaning(zip_path):
+    '''The per-row cleaning rules of the first fifa-data-cleaning-V1.py, kept as the reference'''
+    with zipfile.ZipFile(zip_path) as zf, zf.open('data.csv') as f:
+        df = pd.read_csv(f)
+    # text as plain objects, as the rules were written before pandas had a string dtype
+    df = df.astype({c: object for c in df.columns if df[c].dtype.kind not in 'biuf'})
+    df = df.set_index(df.columns[0])
+    df = df.drop(['Photo', 'Flag', 'Club Logo', 'Real Face', 'Jersey Number'], axis=1)
+    df = df.dropna(subset=['Club']).reset_index(drop=True)
+    df = df.dropna(subset=['Preferred Foot']).reset_index(drop=True)
+    df = df.drop(['Loaned From'], axis=1)
+    df.loc[df.Joined.isnull(), 'Contract Valid Until'] = '2022'
+    df['Joined'] = df.Joined.fillna('Jul 1, 2019')
+
+    def currency_converter(val):
+        val = val.replace('€', '')
+        if val[-1] == 'K':
+            return float(val[:-1]) * 1000
+        if val[-1] == 'M':
+            return float(val[:-1]) * 1000000
+        return float(val)
+    df['Value'] = df['Value'].apply(currency_converter)
+    df['Wage'] = df['Wage'].apply(currency_converter)
+    known = df['Release Clause'].notnull()
+    df.loc[known, 'Release Clause'] = df.loc[known, 'Release Clause'].apply(currency_converter)
+    df['Release Clause'] = df['Release Clause'].astype(float)
+    means = df[known].groupby('Overall')['Release Clause'].mean()
+    for i in df.index[~known]:
+        df.loc[i, 'Release Clause'] = means[df.loc[i, 'Overall']]
+
+    df.loc[~df['Body Type'].isin(['Normal', 'Lean', 'Stocky']), 'Body Type'] = 'Lean'
+    df['Contract Valid Until'] = df['Contract Valid Until'].astype(int)
+
+    def height_converter(val):
+        feet, inches = val.split("'")
+        return float(round((int(feet) * 12 + int(inches)) * 2.54))
+    df['Height'] = df['Height'].apply(height_converter)
+    df['Weight'] = df['Weight'].apply(lambda val: float(val.replace('lbs', '')))
+    df = df.rename(columns={'Height': 'Height (cms)', 'Weight': 'Weight (lbs)'})
+
+    rated = df['LS'].notnull()
+    for col in POS_COLS:
+        df.loc[rated, col] = df.loc[rated, col].apply(lambda val: int(val.split('+')[0]) + int(val.split('+')[1]))
+    return df
+
+
+def test_matches_original_rules(cleaned, zip_path):
+    df, _ = cleaned
+    expected = original_cleaning(zip_path)
+    assert df.shape == (17918, 82)
+    # columns are in the order of fifa_ingest.SCHEMA, not of the csv
+    assert sorted(df.columns) == sorted(expected.columns)
+    for col in df.columns:
+        got, want = df[col], expected[col]
+        if col == 'Joined':
+            assert (got == pd.to_datetime(want, format='%b %d, %Y')).all(), col
+        elif got.dtype.kind in 'biuf':
+            # money is compacted to float32
+            assert np.allclose(got.to_numpy(dtype=float), want.to_numpy(dtype=float), rtol=1e-6, equal_nan=True), col
+        else:
+            assert (got.astype(str).to_numpy() == want.astype(str).to_numpy()).all(), col
+
+
+def test_reports(cleaned, raw):
+    df, reports = cleaned
+    assert len(reports['no_club']) == raw['Club'].isna().sum() == 241
+    assert reports['no_club']['Club'].isna().all()
+    assert reports['malformed'] == {}
+    fill = reports['release_clause_fill']
+    assert fill['missing'].sum() == fill['filled'].sum() > 0
+    assert reports['memory'].loc['total', 'bytes after'] < reports['memory'].loc['total', 'bytes before']
+    assert df['Release Clause'].notna().all()
+
+
+def test_stages():
+    players = pd.DataFrame({'Joined': ['Jul 1, 2004', None], 'Contract Valid Until': ['2021', 'Jun 30, 2019'],
+                            'Loaned From': [None, 'Juventus'], 'Body Type': ['Messi', 'Normal']})
+    fixed = fix_loans(players)
+    assert 'Loaned From' not in fixed.columns
+    assert fixed['Contract Valid Until'].tolist() == ['2021', '2022']
+    assert fixed['Joined'].tolist() == ['Jul 1, 2004', 'Jul 1, 2019']
+    assert normalize_body_type(players)['Body Type'].tolist() == ['Lean', 'Normal']
+    assert players['Body Type'].tolist() == ['Messi', 'Normal']  # stages don't change their input
+    assert BODY_TYPES == ['Normal', 'Lean', 'Stocky']
+
+
+def test_clean_export_cached(zip_path, tmp_path, cleaned):
+    df, _, log = clean_export(zip_path, cache_dir=str(tmp_path))
+    assert {action for _, action, _ in log} == {'run'}
+    pd.testing.assert_frame_equal(df, cleaned[0])
+    # only the stages from the changed rule on run again
+    _, _, log = clean_export(zip_path, cache_dir=str(tmp_path), body_types=['Normal', 'Lean'])
+    actions = dict((name, action) for name, action, _ in log)
+    assert actions['normalize_body_type'] == 'run' and actions['compact'] == 'run'
+    assert 'load' not in actions or actions['load'] == 'cached'
@@ -0,0 +1,61 @@
+import os
+import pandas as pd
+import pytest
+
+from fifa_clubs import DEFENDERS, LOW_WORK_RATES, club_reports, report_path, write_club_reports
+from fifa_squad import SLOT_POSITIONS
+
+
+@pytest.fixture(scope='module')
+def reports(clean):
+    return club_reports(clean)
+
+
+def test_summary(reports, clean):
+    summary, details = reports
+    assert len(summary) == clean['Club'].nunique()
+    assert summary['Players'].to_dict() == clean.groupby('Club', observed=True).size().to_dict()
+    due = clean[clean['Contract Valid Until'] < 2021]
+    assert summary['Contracts Due'].sum() == len(due)
+    assert summary['Low Work Rate'].sum() == due['Work Rate'].isin(LOW_WORK_RATES).sum()
+    # the weakest defender of every club, the lowest Mobility (first of the table on ties)
+    defenders = clean[clean.Position.isin(DEFENDERS)]
+    weakest = defenders.loc[defenders.groupby('Club', observed=True)['Mobility'].idxmin()]
+    assert summary['Weakest Defender'].dropna().to_dict() == weakest.set_index('Club')['Name'].to_dict()
+
+
+def test_manchester_united(reports, clean):
+    _, details = reports
+    united = details[details.Report == 'Manchester United']
+    assert 184392 in united.loc[united.Section == 'low work rate', 'ID'].tolist()  # Darmian
+    assert united.loc[united.Section == 'weakest defender', 'ID'].tolist() == [194957]  # P. Jones
+    assert united['Section'].drop_duplicates().tolist() == ['contract due', 'low work rate', 'weakest defender', 'replacement']
+
+
+def test_replacements(reports, clean):
+    _, details = reports
+    slot_of = {p: s for s, ps in SLOT_POSITIONS.items() for p in ps}
+    players = clean.set_index('ID')
+    replacements = details[details.Section == 'replacement']
+    assert len(replacements) and replacements['Rank'].max() <= 5
+    for _, row in replacements.iterrows():
+        flagged = players.loc[row['Replaces']]
+        assert row['Club'] != flagged['Club'] and row['Rating'] > flagged['Rating']
+        assert slot_of[row['Position']] == slot_of[flagged['Position']] and row['Age'] < 30
+    # the first replacements of a player are the best rated ones of his slot that qualify
+    jones = replacements[replacements.Replaces == 194957]
+    market = clean[clean.Position.map(slot_of).eq('CB') & (clean.Club != 'Manchester United') & (clean.Age < 30)
+                   & (clean.Rating > players.loc[194957, 'Rating']) & (clean.Mobility > players.loc[194957, 'Mobility'])]
+    expected = market.sort_values(['Rating', 'Value'], ascending=[False, True], kind='stable')['ID'].head(5)
+    assert jones['ID'].tolist() == expected.tolist()
+    assert jones['Rank'].tolist() == list(range(1, len(expected) + 1))
+
+
+def test_write(reports, tmp_path):
+    summary, details = reports
+    paths = write_club_reports(summary, details, str(tmp_path), processes=1)
+    assert len(paths) == details['Report'].nunique()
+    assert report_path('Paris Saint-Germain', 'x') == os.path.join('x', 'Paris_Saint-Germain.csv')
+    united = pd.read_csv(report_path('Manchester United', str(tmp_path)))
+    assert len(united) == (details.Report == 'Manchester United').sum()
+    assert len(pd.read_csv(tmp_path / 'clubs.csv')) == len(summary)
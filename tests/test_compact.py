@@ -0,0 +1,19 @@
+import numpy as np
+
+from fifa_compact import CATEGORY_COLS, MONEY_COLS, compact_players
+
+
+def test_compact_players(cleaned):
+    df = cleaned[0]
+    for c in CATEGORY_COLS:
+        assert df[c].dtype == 'category', c
+    for c in MONEY_COLS:
+        assert df[c].dtype == np.float32, c
+    assert df['Joined'].dtype.kind == 'M'
+    assert df['Overall'].dtype == np.int8 and df['Special'].dtype == np.int16
+    # compacting again changes nothing and reports the memory saved
+    again, report = compact_players(df)
+    assert (again.dtypes == df.dtypes).all()
+    memory = cleaned[1]['memory']
+    assert memory.loc['Overall', 'dtype before'] == 'int64' and memory.loc['Overall', 'dtype after'] == 'int8'
+    assert memory.loc['total', 'ratio'] > 3
@@ -0,0 +1,25 @@
+import pandas as pd
+
+from fifa_composites import COMPOSITES, add_composites, composite_weights, compute_composites
+
+
+def test_weights():
+    W = composite_weights({'A': ['x', 'y'], 'B': {'y': 2, 'z': 1}})
+    assert W.loc['y'].tolist() == [1, 2] and W.loc['z'].tolist() == [0, 1]
+
+
+def test_matches_row_means(cleaned):
+    df = cleaned[0]
+    scores = compute_composites(df)
+    assert list(scores.columns) == list(COMPOSITES)
+    for name, cols in COMPOSITES.items():
+        # the original per-row int(round(mean))
+        expected = df[cols].apply(lambda row: int(round(row.mean())), axis=1)
+        assert (scores[name] == expected).all(), name
+
+
+def test_nan_and_add():
+    df = pd.DataFrame({'Overall': [70, 71], 'Potential': [80, None]})
+    out = add_composites(df, {'Rating': ['Potential', 'Overall']})
+    assert out is df
+    assert df['Rating'].iloc[0] == 75 and pd.isna(df['Rating'].iloc[1])
@@ -0,0 +1,72 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from fifa_cube import StatsCube
+
+EXACT = ('count', 'sum', 'mean', 'min', 'max', 'argmax')
+
+
+def _compare(cube, fresh, by, stats=EXACT):
+    got, want = cube.query(by, stats=stats), fresh.query(by, stats=stats)
+    got, want = got.loc[want.index], want
+    pd.testing.assert_frame_equal(got, want, check_dtype=False)
+
+
+def test_matches_groupby(clean):
+    cube = StatsCube(clean)
+    table = cube.query('Club', ['Overall', 'Value'], ('count', 'mean', 'min', 'max', 'median', 'argmax'))
+    groups = clean.groupby('Club', observed=True)
+    for club in ['Juventus', 'FC Barcelona', 'Manchester United']:
+        assert table.loc[club, ('Overall', 'count')] == len(groups.get_group(club))
+        assert table.loc[club, ('Overall', 'mean')] == pytest.approx(groups['Overall'].mean()[club])
+        assert table.loc[club, ('Value', 'max')] == groups['Value'].max()[club]
+        assert table.loc[club, ('Overall', 'median')] == groups['Overall'].median()[club]
+        assert table.loc[club, ('Overall', 'argmax')] == groups['Overall'].idxmax()[club]
+    counts = cube.counts('Position')
+    pd.testing.assert_series_equal(counts, clean['Position'].value_counts().astype(np.int64), check_names=False,
+                                   check_index_type=False, check_categorical=False)
+
+
+def test_where(clean):
+    cube = StatsCube(clean)
+    table = cube.query('Position', 'Age', ('count',), where={'Club': ['Juventus', 'Chelsea']})
+    expected = clean[clean.Club.isin(['Juventus', 'Chelsea'])].groupby('Position', observed=True).size()
+    assert table[('Age', 'count')].sort_index().tolist() == expected[expected > 0].sort_index().tolist()
+
+
+def test_update_and_remove_match_a_fresh_cube(clean):
+    df = clean.copy()
+    cube = StatsCube(df.iloc[:-200])
+    # new players, transfers to other clubs and changed ratings, among them the best players of their cells
+    changed = df.iloc[:50].copy()
+    changed['Club'] = changed['Club'].iloc[::-1].to_numpy()
+    changed['Overall'] = changed['Overall'].iloc[::-1].to_numpy()
+    cube.update(pd.concat([changed, df.iloc[-200:]]))
+    df.iloc[:50] = changed
+    _compare(cube, StatsCube(df), ['Club'])
+    _compare(cube, StatsCube(df), ['Position', 'Age band'])
+    removed = df.index[10:400:3]
+    cube.remove(removed)
+    fresh = StatsCube(df.drop(removed))
+    _compare(cube, fresh, ['Club'])
+    _compare(cube, fresh, ['Nationality'])
+    assert cube.query((), 'Overall', ('count',)).iloc[0, 0] == len(df) - len(removed)
+
+
+def test_partial_update(clean):
+    df = clean.copy()
+    cube = StatsCube(df)
+    # a pay rise given with the Wage column alone: the players stay in their cells
+    ids = df.index[::7]
+    df.loc[ids, 'Wage'] = df.loc[ids, 'Wage'] * 2
+    cube.update(df.loc[ids, ['Wage']])
+    # birthdays given with Age alone move players to their new Age band
+    older = df.index[3::11]
+    df.loc[older, 'Age'] = df.loc[older, 'Age'] + 5
+    cube.update(df.loc[older, ['Age']])
+    fresh = StatsCube(df)
+    _compare(cube, fresh, ['Club'])
+    _compare(cube, fresh, ['Position', 'Age band'])
+    with pytest.raises(KeyError, match='new players need'):
+        cube.update(pd.DataFrame({'Wage': [1000.0]}, index=[10 ** 9]))
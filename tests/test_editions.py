@@ -0,0 +1,66 @@
+import os
+import shutil
+import numpy as np
+import pandas as pd
+import pytest
+
+from fifa_editions import (SOFIFA_COLUMNS, UNIFIED_COLS, build_editions, detect_format, edition_of, trajectory,
+                           unify_export)
+
+SOFIFA_PATH = os.path.join(os.path.dirname(__file__), 'data', 'players_20.csv')
+
+
+def test_detect_format(zip_path):
+    assert detect_format(SOFIFA_PATH) == 'sofifa'
+    assert detect_format(zip_path) == 'fifa19'
+
+
+def test_edition_of():
+    assert edition_of(SOFIFA_PATH) == ('players_20', 2020)
+    assert edition_of('data/fifa19.zip') == ('fifa19', 2019)
+    assert edition_of('exports/november.csv') == ('november', None)
+
+
+def test_unify_sofifa():
+    df = unify_export(SOFIFA_PATH)
+    raw = pd.read_csv(SOFIFA_PATH)
+    assert list(df.columns) == UNIFIED_COLS
+    # the player without a club is dropped
+    assert df['ID'].tolist() == raw.loc[raw['club'].notna(), 'sofifa_id'].tolist()
+    assert (df['Edition'] == 'players_20').all() and (df['Season'] == 2020).all()
+    # every sofifa column of the fixture lands in its unified column
+    for sofifa, unified in SOFIFA_COLUMNS.items():
+        if sofifa in raw.columns and unified not in ('Position', 'Weight (lbs)'):
+            expected = raw.loc[raw['club'].notna(), sofifa].reset_index(drop=True)
+            pd.testing.assert_series_equal(df[unified], expected, check_names=False, check_dtype=False)
+    assert df.loc[df.ID == 158023, 'Position'].item() == 'RW'  # first of 'RW, CF, ST'
+    assert df.loc[df.ID == 158023, 'Weight (lbs)'].item() == np.round(72 * 2.20462)
+    assert df['Crossing'].dtype.kind in 'iuf'
+
+
+@pytest.fixture(scope='module')
+def editions(tmp_path_factory, zip_path):
+    directory = tmp_path_factory.mktemp('exports')
+    shutil.copy(zip_path, directory / 'fifa19.zip')
+    shutil.copy(SOFIFA_PATH, directory / 'players_20.csv')
+    return build_editions(str(directory), str(directory / 'store'), processes=1)
+
+
+def test_build_editions(editions):
+    counts = editions.groupby('Edition', observed=True).size()
+    assert counts['players_20'] == 5
+    assert counts['fifa19'] == 17918
+
+
+def test_trajectory_by_id(editions):
+    jones = trajectory(editions, 194957)
+    assert jones['Season'].tolist() == [2019, 2020]
+    assert jones['Value'].tolist() == [12000000.0, 9000000.0]
+    assert trajectory(editions, 'L. Messi', 'Overall')['Overall'].tolist() == [94, 94]
+
+
+def test_trajectory_refuses_ambiguous_names(editions):
+    with pytest.raises(ValueError, match='194957'):
+        trajectory(editions, 'P. Jones')
+    with pytest.raises(KeyError):
+        trajectory(editions, 'Nobody')
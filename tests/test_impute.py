@@ -0,0 +1,54 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from fifa_impute import AGE_BANDS, age_band, impute_grouped
+
+
+@pytest.fixture
+def players():
+    return pd.DataFrame({'Overall': [60, 60, 60, 70, 70, 80],
+                         'Age': [18, 30, 31, 18, 19, 25],
+                         'Release Clause': [1.0, 3.0, np.nan, 10.0, np.nan, np.nan]})
+
+
+def test_age_band():
+    assert age_band(pd.Series([16, 20, 21, 49])).tolist() == ['(15, 20]', '(15, 20]', '(20, 23]', '(35, 50]']
+    assert AGE_BANDS[0] == 15
+
+
+def test_mean_and_median(players):
+    filled, report = impute_grouped(players, 'Release Clause', 'Overall')
+    np.testing.assert_array_equal(filled.to_numpy(), [1, 3, 2, 10, 10, np.nan])
+    assert report.loc[60].tolist() == [1, 1, 0] and report.loc[80].tolist() == [1, 0, 1]
+    assert list(report.columns) == ['missing', 'filled', 'unfilled']
+    filled, _ = impute_grouped(players, 'Release Clause', ['Overall'], how='median')
+    assert filled[2] == 2
+    # the input is left alone
+    assert players['Release Clause'].isna().sum() == 3
+
+
+def test_series_keys(players):
+    # a derived key, aligned with the table, gives the same groups as the same key added as a column
+    with_band = players.assign(band=age_band(players.Age))
+    by_series, report = impute_grouped(players, 'Release Clause', ['Overall', age_band(players.Age)])
+    by_name, _ = impute_grouped(with_band, 'Release Clause', ['Overall', 'band'])
+    pd.testing.assert_series_equal(by_series, by_name)
+    np.testing.assert_array_equal(by_series.to_numpy(), [1, 3, 3, 10, 10, np.nan])
+    assert report.index.nlevels == 2
+
+
+def test_regression(players):
+    filled, _ = impute_grouped(players, 'Release Clause', 'Overall', how='regression')
+    # the line through the group means (60, 2) and (70, 10)
+    assert filled[2] == pytest.approx(2) and filled[5] == pytest.approx(18)
+    with pytest.raises(ValueError):
+        impute_grouped(players, 'Release Clause', 'Overall', how='mode')
+
+
+def test_export(cleaned, raw):
+    # the cleaning fills every missing Release Clause from the players of the same Overall
+    fill = cleaned[1]['release_clause_fill']
+    assert fill['unfilled'].sum() == 0
+    kept = raw['Club'].notna() & raw['Preferred Foot'].notna()
+    assert fill['missing'].sum() == raw.loc[kept, 'Release Clause'].isna().sum() == 1275
@@ -0,0 +1,33 @@
+import io
+import zipfile
+import pandas as pd
+
+from fifa_ingest import COLUMNS, SCHEMA, iter_player_chunks, load_players, read_chunks
+
+
+def test_load_players(raw, zip_path):
+    assert raw.shape == (18207, len(COLUMNS))
+    assert list(raw.columns) == COLUMNS
+    assert isinstance(raw.index, pd.RangeIndex)
+    assert raw['ID'].dtype == 'int64' and raw['Crossing'].dtype == 'float64'
+    with zipfile.ZipFile(zip_path) as zf, zf.open('data.csv') as f:
+        reference = pd.read_csv(f, usecols=['ID', 'Name', 'Value'])
+    assert raw['ID'].tolist() == reference['ID'].tolist()
+    assert raw['Value'].tolist() == reference['Value'].tolist()
+
+
+def test_chunks_and_columns(raw, zip_path):
+    chunks = list(iter_player_chunks(zip_path, columns=['ID', 'Club'], chunksize=5000))
+    assert [len(c) for c in chunks] == [5000, 5000, 5000, 3207]
+    assert all(list(c.columns) == ['ID', 'Club'] for c in chunks)
+    small = load_players(zip_path, columns=['ID', 'Club'], chunksize=5000)
+    pd.testing.assert_frame_equal(small, raw[['ID', 'Club']])
+
+
+def test_missing_columns_are_null():
+    # an older export without Release Clause, with a column we don't keep
+    f = io.StringIO(',ID,Name,Photo\n0,1,A,a.png\n1,2,B,b.png\n')
+    chunk = next(read_chunks(f, columns=['ID', 'Name', 'Release Clause']))
+    assert list(chunk.columns) == ['ID', 'Name', 'Release Clause']
+    assert chunk['ID'].tolist() == [1, 2] and chunk['Release Clause'].isna().all()
+    assert SCHEMA['Release Clause'] is str
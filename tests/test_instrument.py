@@ -0,0 +1,52 @@
+import json
+import pandas as pd
+import pytest
+
+import fifa_instrument
+from fifa_instrument import instrumented, step
+
+
+@instrumented('double')
+def double(df):
+    return pd.concat([df, df])
+
+
+@pytest.fixture(autouse=True)
+def profiling():
+    fifa_instrument.reset()
+    yield
+    fifa_instrument.disable()
+    fifa_instrument.reset()
+
+
+def test_off_by_default():
+    assert not fifa_instrument.is_enabled()
+    assert len(double(pd.DataFrame({'a': [1]}))) == 2
+    with step('nothing') as record:
+        record['rows_out'] = 1
+    assert fifa_instrument.records() == []
+
+
+def test_records(tmp_path):
+    fifa_instrument.enable()
+    with step('outer', rows_in=3):
+        double(pd.DataFrame({'a': [1, 2, 3]}))
+    outer, inner = fifa_instrument.records()
+    assert (outer['step'], outer['depth'], outer['parent'], outer['rows_in']) == ('outer', 0, None, 3)
+    assert (inner['step'], inner['depth'], inner['parent']) == ('double', 1, 'outer')
+    assert (inner['rows_in'], inner['rows_out']) == (3, 6)
+    assert outer['wall_s'] >= inner['wall_s'] >= 0
+    assert outer['peak_alloc_mb'] >= inner['peak_alloc_mb'] >= 0
+    assert 'double' in fifa_instrument.summary()
+    path = tmp_path / 'profile.json'
+    fifa_instrument.write_json(str(path))
+    assert [r['step'] for r in json.loads(path.read_text())['steps']] == ['outer', 'double']
+
+
+def test_without_memory_tracing():
+    import tracemalloc
+    tracemalloc.stop()
+    fifa_instrument.enable(trace_memory=False)
+    double(pd.DataFrame({'a': [1]}))
+    record, = fifa_instrument.records()
+    assert record['peak_alloc_mb'] is None and record['wall_s'] >= 0
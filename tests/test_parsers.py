@@ -0,0 +1,50 @@
+import numpy as np
+import pandas as pd
+
+from fifa_parsers import (POS_COLS, malformed, parse_columns, parse_currency, parse_height, parse_positional,
+                          parse_weight)
+
+
+def test_parse_currency():
+    col = pd.Series(['€110.5M', '€565K', '€0', None, '€12X', ' €1.2M '], name='Value')
+    parsed = parse_currency(col)
+    assert parsed.name == 'Value'
+    np.testing.assert_array_equal(parsed.to_numpy(), [110500000.0, 565000.0, 0.0, np.nan, np.nan, 1200000.0])
+    assert malformed(col, parsed).tolist() == ['€12X']
+
+
+def test_parse_height_weight():
+    np.testing.assert_array_equal(parse_height(pd.Series(["5'7", "6'2", None, '170'])).to_numpy(),
+                                  [170.0, 188.0, np.nan, np.nan])
+    np.testing.assert_array_equal(parse_weight(pd.Series(['159lbs', '200', None, 'heavy'])).to_numpy(),
+                                  [159.0, 200.0, np.nan, np.nan])
+
+
+def test_parse_positional():
+    block = pd.DataFrame({'LS': ['88+2', None, '50'], 'ST': ['88+2', None, '60+3']}, index=[5, 6, 7])
+    parsed = parse_positional(block)
+    assert list(parsed.index) == [5, 6, 7] and list(parsed.columns) == ['LS', 'ST']
+    np.testing.assert_array_equal(parsed.to_numpy(), [[90, 90], [np.nan, np.nan], [np.nan, 63]])
+    bad = malformed(block, parsed)
+    assert bad.tolist() == ['50'] and bad.index.tolist() == [(7, 'LS')]
+
+
+def test_parse_columns_export(raw):
+    df = raw.copy()
+    report = parse_columns(df)
+    assert report == {}
+    for c in ['Value', 'Wage', 'Release Clause', 'Height', 'Weight'] + POS_COLS:
+        assert df[c].dtype.kind == 'f', c
+        # nothing present in the export is lost
+        assert (df[c].notna() == raw[c].notna()).all(), c
+    messi = df[df.ID == 158023].iloc[0]
+    assert (messi['Value'], messi['Wage'], messi['Height'], messi['Weight']) == (110500000.0, 565000.0, 170.0, 159.0)
+    assert messi['LS'] == 90 and messi['CAM'] == 95
+
+
+def test_parse_columns_reports_malformed():
+    df = pd.DataFrame({'Value': ['€1M', 'free'], 'Height': ["5'7", '5ft']})
+    report = parse_columns(df, currency=('Value',), weight=None, positional=())
+    assert set(report) == {'Value', 'Height'}
+    assert report['Value'].tolist() == ['free'] and report['Height'].tolist() == ['5ft']
+    assert df['Value'].tolist()[0] == 1e6 and np.isnan(df['Value'].tolist()[1])
@@ -0,0 +1,121 @@
+import importlib
+import os
+import pandas as pd
+import pytest
+
+from fifa_pipeline import Pipeline, Stage, value_fingerprint
+
+calls = []
+
+
+def double(values, factor=2):
+    calls.append('double')
+    return values * factor
+
+
+def total(values):
+    calls.append('total')
+    return values.sum(), len(values)
+
+
+def stages(factor=2):
+    return [Stage(double, ['values'], ['doubled'], params={'factor': factor}),
+            Stage(total, ['doubled'], ['total', 'n'])]
+
+
+@pytest.fixture(autouse=True)
+def clear_calls():
+    del calls[:]
+
+
+def test_run_and_cache(tmp_path):
+    values = pd.Series([1, 2, 3])
+    pipeline = Pipeline(stages(), cache_dir=str(tmp_path))
+    result = pipeline.run({'values': values})
+    assert result['total'] == 12 and result['n'] == 3
+    assert calls == ['double', 'total']
+    assert [action for _, action, _ in pipeline.log] == ['run', 'run']
+    assert len(os.listdir(tmp_path)) == 2
+    # everything cached: the last stage is loaded, the one before isn't even read
+    del calls[:]
+    result = pipeline.run({'values': values}, targets=['total'])
+    assert calls == [] and result == {'total': 12}
+    assert [(name, action) for name, action, _ in pipeline.log] == [('total', 'cached')]
+
+
+def test_invalidation(tmp_path):
+    values = pd.Series([1, 2, 3])
+    Pipeline(stages(), cache_dir=str(tmp_path)).run({'values': values})
+    # a parameter changes: that stage and the ones after it run again
+    del calls[:]
+    assert Pipeline(stages(factor=3), cache_dir=str(tmp_path)).run({'values': values})['total'] == 18
+    assert calls == ['double', 'total']
+    # an input changes
+    del calls[:]
+    assert Pipeline(stages(), cache_dir=str(tmp_path)).run({'values': pd.Series([1, 2, 4])})['total'] == 14
+    assert calls == ['double', 'total']
+    # back to the first inputs: all cached
+    del calls[:]
+    Pipeline(stages(), cache_dir=str(tmp_path)).run({'values': values})
+    assert calls == []
+
+
+def test_depends_and_code(tmp_path):
+    version = {'v': 1}
+    make = lambda: Pipeline([Stage(double, ['values'], ['doubled'], depends=lambda params: version['v'])],
+                            cache_dir=str(tmp_path))
+    make().run({'values': pd.Series([1])})
+    make().run({'values': pd.Series([1])})
+    version['v'] = 2
+    make().run({'values': pd.Series([1])})
+    assert calls == ['double', 'double']
+    # the code of the stage and of what it uses is part of the fingerprint
+    fp = Stage(double).fingerprint([])
+    assert Stage(double, uses=[total]).fingerprint([]) != fp
+    assert Stage(double).fingerprint(['x']) != fp
+
+
+def test_no_cache_and_errors(tmp_path):
+    pipeline = Pipeline(stages(), cache_dir=None)
+    assert pipeline.run({'values': pd.Series([1])})['n'] == 1
+    assert pipeline.run({'values': pd.Series([1])})['n'] == 1
+    assert calls == ['double', 'total'] * 2
+    with pytest.raises(KeyError):
+        Pipeline([Stage(total, ['doubled'], ['total', 'n'])], cache_dir=None).run({'values': pd.Series([1])})
+
+
+def test_value_fingerprint():
+    df = pd.DataFrame({'a': [1, 2]})
+    assert value_fingerprint(df) == value_fingerprint(df.copy())
+    assert value_fingerprint(df) != value_fingerprint(df.rename(columns={'a': 'b'}))
+    assert value_fingerprint(df) != value_fingerprint(df.set_axis([1, 2]))
+    assert value_fingerprint('x') != value_fingerprint('y')
+
+
+def test_helper_change_invalidates(tmp_path, monkeypatch):
+    # a stage using a module is fingerprinted on the whole module, the helpers of its functions included
+    monkeypatch.syspath_prepend(str(tmp_path))
+    helpers = tmp_path / 'pipeline_helpers.py'
+    helpers.write_text('def _scale(values):\n    return values * 2\n\n\ndef scale(values):\n    return _scale(values)\n')
+    import pipeline_helpers
+
+    def make():
+        return Pipeline([Stage(pipeline_helpers.scale, ['values'], ['scaled'], uses=[pipeline_helpers])],
+                        cache_dir=str(tmp_path / 'cache'))
+    values = pd.Series([1, 2])
+    assert make().run({'values': values})['scaled'].tolist() == [2, 4]
+    pipeline = make()
+    pipeline.run({'values': values})
+    assert [action for _, action, _ in pipeline.log] == ['cached']
+    helpers.write_text('def _scale(values):\n    return values * 10\n\n\ndef scale(values):\n    return _scale(values)\n')
+    importlib.reload(pipeline_helpers)
+    pipeline = make()
+    assert pipeline.run({'values': values})['scaled'].tolist() == [10, 20]
+    assert [action for _, action, _ in pipeline.log] == ['run']
+
+
+def test_cleaning_stages_cover_their_modules():
+    import fifa_impute
+    from fifa_clean import cleaning_stages
+    stage = next(s for s in cleaning_stages() if s.name == 'impute_release_clause')
+    assert fifa_impute in stage.uses
@@ -0,0 +1,40 @@
+import numpy as np
+import pandas as pd
+
+from fifa_parsers import POS_COLS
+from fifa_positions import PositionMatrix
+from fifa_store import ColumnStore
+
+
+def test_matrix(clean, store_dir):
+    matrix = PositionMatrix.from_frame(clean)
+    stored = PositionMatrix.from_store(ColumnStore(store_dir))
+    np.testing.assert_array_equal(matrix.ratings, stored.ratings)
+    col, best = matrix.best()
+    positional = clean[POS_COLS]
+    rated = positional.notna().any(axis=1).to_numpy()
+    np.testing.assert_array_equal(best[rated], positional[rated].max(axis=1).to_numpy())
+    assert (best[~rated] == -1).all() and (col[~rated] == -1).all()
+    assert (clean['Position'].to_numpy()[~rated] == 'GK').all()
+
+
+def test_summary_and_leaderboard(clean):
+    matrix = PositionMatrix.from_frame(clean)
+    summary = matrix.summary()
+    messi = summary.loc[clean.index[clean.ID == 158023][0]]
+    assert messi['Listed Rating'] == clean.loc[clean.ID == 158023, 'RF'].item()
+    assert messi['Gap'] == messi['Best Rating'] - messi['Listed Rating']
+    assert summary['Versatility'].max() <= len(POS_COLS)
+    board = matrix.leaderboard(k=3, positions=['ST', 'CB'])
+    for position in ('ST', 'CB'):
+        expected = clean[position].nlargest(3)
+        rows = board[board.Position == position]
+        assert rows['Player'].tolist() == expected.index.tolist()
+        assert rows['Rating'].tolist() == expected.tolist() and rows['Rank'].tolist() == [1, 2, 3]
+
+
+def test_listed_rating():
+    matrix = PositionMatrix(np.array([[70, 72], [-1, -1]]), ['LB', 'CB'], listed=['CB', 'GK'])
+    assert matrix.listed_rating().tolist() == [72, -1]
+    assert matrix.versatility(within=2).tolist() == [2, 0]
+    assert isinstance(matrix.index, pd.RangeIndex)
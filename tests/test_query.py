@@ -0,0 +1,36 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from fifa_query import OPS, parse_condition, sort_order
+
+
+def test_parse_condition():
+    assert parse_condition('Age<27') == ('Age', '<', 27.0)
+    assert parse_condition(' Contract Valid Until >= 2021 ') == ('Contract Valid Until', '>=', 2021.0)
+    assert parse_condition('Club=Juventus') == ('Club', '==', 'Juventus')
+    assert parse_condition("Club != 'FC Porto'") == ('Club', '!=', 'FC Porto')
+    assert parse_condition('Position in LB,LWB') == ('Position', 'in', ['LB', 'LWB'])
+    assert parse_condition('Age in 20,21') == ('Age', 'in', [20.0, 21.0])
+    with pytest.raises(ValueError):
+        parse_condition('Age')
+
+
+def test_ops():
+    vals = np.array([1, 2, 3])
+    assert OPS['<='](vals, 2).tolist() == [True, True, False]
+    assert OPS['!='](vals, 2).tolist() == [True, False, True]
+    assert OPS['in'](np.array(['LB', 'CB'], dtype=object), ['LB']).tolist() == [True, False]
+    assert set(OPS) == {'<', '<=', '>', '>=', '==', '!=', 'in'}
+
+
+@pytest.mark.parametrize('ascending', [False, True])
+def test_sort_order_is_pandas_stable_sort(ascending):
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({'a': rng.integers(0, 4, 200).astype(float), 'b': rng.integers(0, 3, 200),
+                       'c': rng.choice(np.array(['x', 'y', None], dtype=object), 200)})
+    df.loc[rng.random(200) < 0.1, 'a'] = np.nan
+    for keys in (['a'], ['a', 'b'], ['c', 'a'], ['b', 'c']):
+        expected = df.sort_values(keys, ascending=ascending, kind='stable').index.to_numpy()
+        got = sort_order([df[k].to_numpy() for k in keys], ascending)
+        np.testing.assert_array_equal(got, expected, err_msg=str(keys))
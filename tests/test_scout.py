@@ -0,0 +1,62 @@
+import numpy as np
+import pytest
+
+from fifa_scout import SCOUT_QUERIES, ScoutIndex, benchmark
+
+
+@pytest.fixture(scope='module')
+def index(clean):
+    return ScoutIndex(clean)
+
+
+# the pandas mask of every operator, the reference the index is checked against
+PANDAS_OPS = {'<': lambda s, v: s < v, '<=': lambda s, v: s <= v, '>': lambda s, v: s > v, '>=': lambda s, v: s >= v,
+              '==': lambda s, v: s == v, '!=': lambda s, v: s != v, 'in': lambda s, v: s.isin(v)}
+
+
+def _mask(df, where):
+    mask = np.ones(len(df), dtype=bool)
+    for col, op, value in where:
+        mask &= PANDAS_OPS[op](df[col], value).to_numpy()
+    return mask
+
+
+QUERIES = [
+    [('Age', '<', 27), ('Rating', '>', 78)],
+    [('Position', 'in', ['LB', 'LWB']), ('Contract Valid Until', '<=', 2020)],
+    [('Club', '==', 'Juventus')],
+    [('Club', '!=', 'Juventus'), ('Overall', '>=', 85)],
+    [('Overall', '==', 80), ('Nationality', 'in', ['Spain', 'Brazil'])],
+    [('Position', '!=', 'GK'), ('Value', '<', 1e6), ('Age', '>', 33)],
+    [('Position', 'in', ['ST', 'ST'])],
+    [('Age', 'in', [20, 20, 21]), ('Club', 'in', ['Juventus', 'Juventus'])],
+    [],
+]
+
+
+@pytest.mark.parametrize('where', QUERIES)
+def test_matches_pandas(index, clean, where):
+    expected = clean[_mask(clean, where)]
+    assert index.query_positions(where).tolist() == np.flatnonzero(_mask(clean, where)).tolist()
+    for sort_by, ascending in ((['Rating', 'Value'], False), ('Age', True)):
+        ref = expected.sort_values(sort_by, ascending=ascending, kind='stable')
+        got = index.query(where, sort_by, ascending=ascending, k=25)
+        assert got.index.tolist() == ref.index[:25].tolist()
+
+
+def test_columns_and_errors(index):
+    rows = index.query([('Club', '==', 'Juventus')], 'Overall', k=1, columns=['Name'])
+    assert rows['Name'].tolist() == ['Cristiano Ronaldo']
+    for op in ('<', '>', '<=', '>='):
+        for value in ('Juventus', 3.0):
+            with pytest.raises(ValueError, match='Club'):
+                index.query_positions([('Age', '<', 30), ('Club', op, value)])
+    with pytest.raises(ValueError):
+        index.query_positions([('Age', '~', 1)])
+    assert len(index.query_positions([('Club', '==', 'Nowhere FC')])) == 0
+
+
+def test_benchmark(index):
+    results = benchmark(index, SCOUT_QUERIES, repeat=1)
+    assert results['same_rows'].all()
+    assert len(results) == len(SCOUT_QUERIES)
@@ -0,0 +1,87 @@
+import json
+import os
+import shutil
+import pandas as pd
+import pytest
+
+from fifa_service import LRUCache, QueryService, store_version, workload
+from fifa_store import META_FILE, StaleStoreError, add_columns
+
+
+def test_lru_cache():
+    cache = LRUCache(2)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    assert cache.get('a') == 1  # a is now the most recent
+    cache.put('c', 3)
+    assert cache.get('b') is None and cache.get('c') == 3 and cache.get('a') == 1
+    assert (cache.hits, cache.misses) == (3, 1)
+    cache.put('a', 4)
+    assert list(cache.entries) == ['c', 'a'] and cache.get('a') == 4
+    cache.clear()
+    assert len(cache.entries) == 0
+
+
+@pytest.fixture
+def service(store_dir, tmp_path):
+    # a store of its own, the test rewrites it
+    directory = str(tmp_path / 'store')
+    shutil.copytree(store_dir, directory)
+    return QueryService(directory, cache_size=8)
+
+
+def _get(service, target):
+    status, body = service.handle(target)
+    return status, json.loads(body)
+
+
+def test_routes(service, clean):
+    status, body = _get(service, '/player?id=158023&columns=Name,Club')
+    assert status == 200 and body == [{'Name': 'L. Messi', 'Club': 'FC Barcelona'}]
+    status, body = _get(service, '/search?where=Club=Juventus&where=Age<30&sort=Overall&k=3')
+    expected = clean[(clean.Club == 'Juventus') & (clean.Age < 30)].sort_values('Overall', ascending=False, kind='stable')
+    assert body['count'] == len(expected)
+    assert [p['ID'] for p in body['players']] == expected['ID'].head(3).tolist()
+    status, body = _get(service, '/top?position=LB&k=2')
+    assert [p['ID'] for p in body['players']] == clean[clean.Position == 'LB'].sort_values(
+        ['Overall', 'Value'], ascending=False, kind='stable')['ID'].head(2).tolist()
+    status, body = _get(service, '/clubs?club=Juventus')
+    assert body[0]['Club'] == 'Juventus' and body[0]['Overall count'] == (clean.Club == 'Juventus').sum()
+    assert _get(service, '/player?id=1')[0] == 400
+    assert _get(service, '/search?where=Age<young')[0] == 400
+    assert _get(service, '/search?where=Age~3')[0] == 400
+    assert _get(service, '/nowhere')[0] == 404
+    assert _get(service, '/stats')[1]['rows'] == len(clean)
+
+
+def test_cache_dropped_when_the_store_changes(service):
+    target = '/player?id=158023&columns=Overall'
+    assert _get(service, target)[1] == [{'Overall': 94}]
+    assert _get(service, target)[1] == [{'Overall': 94}]
+    assert (service.cache.hits, service.cache.misses) == (1, 1)
+    # the store is rewritten: new data, new version
+    version = store_version(service.store_dir)
+    overall = service.data.df['Overall'] + 1
+    add_columns(pd.DataFrame({'Overall': overall}), service.store_dir)
+    meta = os.path.join(service.store_dir, META_FILE)
+    os.utime(meta, ns=(version + 10 ** 9, version + 10 ** 9))  # whatever the resolution of the clock
+    assert _get(service, target)[1] == [{'Overall': 95}]
+    assert service.reloads == 1 and service.cache.misses == 2
+
+
+def test_source_checked(store_dir, zip_path, tmp_path):
+    other = tmp_path / 'fifa19.zip'
+    shutil.copy(zip_path, other)
+    with open(other, 'ab') as f:
+        f.write(b'\0')
+    with pytest.raises(StaleStoreError):
+        QueryService(store_dir, source=str(other))
+    assert QueryService(store_dir, source=zip_path).data.source_hash
+
+
+def test_workload(service):
+    targets = workload(service.store_dir, n=300)
+    assert len(targets) == 300
+    routes = {t.split('?')[0] for t in targets}
+    assert routes == {'/player', '/search', '/top', '/clubs'}
+    assert all(service.handle(t)[0] == 200 for t in targets)
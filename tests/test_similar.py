@@ -0,0 +1,57 @@
+import numpy as np
+import pytest
+
+from fifa_similar import SimilarityIndex
+
+DARMIAN, JONES = 184392, 194957
+
+
+@pytest.fixture(scope='module')
+def index(clean):
+    # small blocks so the running merge of blocks is exercised
+    return SimilarityIndex(clean, block_size=4096)
+
+
+def _brute_force(index, pos, k, mask=None):
+    d = ((index.X - index.X[pos]) ** 2).sum(axis=1)
+    d[pos] = np.inf
+    if mask is not None:
+        d[~mask] = np.inf
+    return np.argsort(d, kind='stable')[:k], np.sqrt(np.sort(d)[:k])
+
+
+def test_position(index, clean):
+    assert index.position(DARMIAN) == np.flatnonzero(clean.ID == DARMIAN)[0]
+    assert index.position('M. Darmian') == index.position(DARMIAN)
+    with pytest.raises(ValueError, match='IDs'):
+        index.position('P. Jones')
+    with pytest.raises(KeyError):
+        index.position('Nobody')
+    with pytest.raises(KeyError):
+        index.position(1)
+
+
+def test_nearest_matches_brute_force(index, clean):
+    pos, dist = index.nearest_positions([JONES, DARMIAN], k=10, where=[('Age', '<', 27)])
+    for qi, target in enumerate([JONES, DARMIAN]):
+        _, d = _brute_force(index, index.position(target), 10, (clean.Age < 27).to_numpy())
+        np.testing.assert_allclose(dist[qi], d, rtol=1e-4, atol=1e-4)
+        assert index.position(target) not in pos[qi]
+        assert (clean['Age'].to_numpy()[pos[qi]] < 27).all()
+
+
+def test_similar_table(index):
+    table = index.similar([DARMIAN, {'Defending': 80, 'Mobility': 75}], k=5)
+    assert len(table) == 10
+    assert table['query'].tolist() == [DARMIAN] * 5 + [1] * 5
+    assert table['rank'].tolist() == [1, 2, 3, 4, 5] * 2
+    assert (np.diff(table['distance'].to_numpy()[:5]) >= 0).all()
+    assert list(table.columns[:5]) == ['Name', 'Club', 'Position', 'Age', 'Value']
+
+
+def test_similar_of_a_frame_id(index, clean):
+    # IDs taken from the frame are np.int64, one of them is a single target like an int
+    player = clean['ID'].iloc[3]
+    table = index.similar(player, k=3)
+    assert table['query'].tolist() == [player] * 3
+    assert table['Name'].tolist() == index.similar(int(player), k=3)['Name'].tolist()
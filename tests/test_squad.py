@@ -0,0 +1,54 @@
+import itertools
+import numpy as np
+import pytest
+
+from fifa_squad import SLOT_POSITIONS, build_squad
+
+SLOTS = ['GK', 'CB', 'CB', 'ST', 'RB']
+CLUBS = ['Juventus', 'FC Barcelona', 'Chelsea', 'Liverpool']
+
+
+@pytest.fixture(scope='module')
+def pool(clean):
+    return clean[clean.Club.isin(CLUBS)]
+
+
+def _brute_force(df, slots, budget=None, wage_budget=None):
+    # best total Rating over every squad of distinct players, all squads enumerated at once
+    cands = [np.flatnonzero(df.Position.isin(SLOT_POSITIONS[s]).to_numpy()) for s in slots]
+    squads = np.column_stack([g.ravel() for g in np.meshgrid(*cands, indexing='ij')])
+    ok = np.ones(len(squads), dtype=bool)
+    for a, b in itertools.combinations(range(len(slots)), 2):
+        ok &= squads[:, a] != squads[:, b]
+    for col, cap in (('Value', budget), ('Wage', wage_budget)):
+        if cap is not None:
+            ok &= df[col].to_numpy(dtype=float)[squads].sum(axis=1) <= cap
+    return df['Rating'].to_numpy(dtype=float)[squads[ok]].sum(axis=1).max(initial=-np.inf)
+
+
+@pytest.mark.parametrize('budget, wage_budget', [(None, None), (60e6, None), (None, 250e3), (80e6, 400e3), (5e6, None)])
+def test_matches_brute_force(pool, budget, wage_budget):
+    squad, report = build_squad(pool, SLOTS, budget=budget, wage_budget=wage_budget, time_limit=None)
+    assert report['optimal']
+    assert report['score'] == _brute_force(pool, SLOTS, budget, wage_budget)
+    assert report['bound'] >= report['score']
+    assert squad['Slot'].tolist() == SLOTS
+    assert squad.index.is_unique
+    assert all(p in SLOT_POSITIONS[s] for p, s in zip(squad['Position'], squad['Slot']))
+    if budget is not None:
+        assert squad['Value'].sum() <= budget
+    if wage_budget is not None:
+        assert squad['Wage'].sum() <= wage_budget
+
+
+def test_where_and_formation(clean):
+    where = [('Age', '<', 27), ('Club', '!=', 'Manchester United')]
+    squad, report = build_squad(clean, '4-3-3', budget=150e6, where=where, time_limit=None)
+    assert report['optimal'] and len(squad) == 11
+    assert (squad['Age'] < 27).all() and (squad['Club'] != 'Manchester United').all()
+    assert squad['Value'].sum() <= 150e6
+
+
+def test_infeasible(pool):
+    squad, report = build_squad(pool, SLOTS, budget=1.0, time_limit=None)
+    assert len(squad) == 0 and report['optimal'] and np.isnan(report['score'])
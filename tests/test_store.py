@@ -0,0 +1,69 @@
+import os
+import shutil
+import numpy as np
+import pandas as pd
+import pytest
+
+from fifa_parsers import POS_COLS
+from fifa_store import ColumnStore, StaleStoreError, add_columns, open_clean, save_clean, source_hash
+
+
+def test_round_trip(store_dir, clean):
+    store = open_clean(store_dir)
+    assert len(store) == len(clean) and store.columns == list(clean.columns)
+    df = store.read()
+    for col in clean.columns:
+        want = clean[col]
+        if want.dtype.kind in 'biufM':
+            np.testing.assert_array_equal(df[col].to_numpy(), want.to_numpy(), err_msg=col)
+        else:
+            assert df[col].astype(object).where(df[col].notna(), None).tolist() == \
+                want.astype(object).where(want.notna(), None).tolist(), col
+
+
+def test_columns_and_matrix(store_dir, clean):
+    store = ColumnStore(store_dir)
+    ratings, columns = store.matrix('positional')
+    assert columns == POS_COLS and ratings.dtype == np.int16 and ratings.shape == (len(clean), len(POS_COLS))
+    assert (ratings[clean['LS'].isna().to_numpy()] == -1).all()
+    np.testing.assert_array_equal(store.array('LS'), clean['LS'].to_numpy())
+    assert store.array('Club').tolist()[:2] == clean['Club'].astype(object).tolist()[:2]
+    assert store['Overall'].tolist() == clean['Overall'].tolist()
+    with pytest.raises(KeyError):
+        store.matrix('skills')
+
+
+def test_stale_detection(store_dir, zip_path, tmp_path):
+    store = open_clean(store_dir, source=zip_path)
+    assert store.meta['source_hash'] == source_hash(zip_path)
+    assert not store.is_stale(zip_path)
+    # another version of the export
+    other = tmp_path / 'fifa19.zip'
+    shutil.copy(zip_path, other)
+    with open(other, 'ab') as f:
+        f.write(b'\0')
+    assert store.is_stale(str(other))
+    with pytest.raises(StaleStoreError):
+        open_clean(store_dir, source=str(other))
+    # without a source nothing is checked
+    assert len(open_clean(store_dir)) == len(store)
+    # the commands that read the store check it against --zip
+    import fifa
+    with pytest.raises(SystemExit, match='was not built from'):
+        fifa.main(['--store', store_dir, 'scout', '--zip', str(other)])
+    fifa.main(['--store', store_dir, 'scout', '--zip', zip_path, '--k', '1'])
+    fifa.main(['--store', store_dir, 'scout', '--zip', '', '--k', '1'])
+
+
+def test_add_columns(tmp_path):
+    df = pd.DataFrame({'ID': [1, 2, 3], 'Name': ['a', None, 'c']}, index=[10, 20, 30])
+    save_clean(df, str(tmp_path))
+    add_columns(pd.DataFrame({'Name': ['x', 'y', 'z'], 'Rating': [1.5, np.nan, 3.0]}), str(tmp_path))
+    store = ColumnStore(str(tmp_path))
+    assert store.columns == ['ID', 'Name', 'Rating']
+    assert store.index.tolist() == [10, 20, 30]
+    assert store.array('Name').tolist() == ['x', 'y', 'z']
+    assert np.isnan(store.array('Rating')[1])
+    assert len([f for f in os.listdir(tmp_path) if f.endswith('.npy')]) == 3  # the old Name file is gone
+    with pytest.raises(ValueError):
+        add_columns(pd.DataFrame({'Rating': [1.0]}), str(tmp_path))
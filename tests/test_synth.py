@@ -0,0 +1,45 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from fifa_clean import clean_players
+from fifa_ingest import COLUMNS, load_players
+from fifa_parsers import parse_currency
+from fifa_synth import Template, format_currency, synthetic_players, write_synthetic
+from fifa_validate import RAW_RULES, validate
+
+
+@pytest.fixture(scope='module')
+def template(zip_path):
+    return Template(zip_path)
+
+
+def test_format_currency():
+    values = np.array([110500000.0, 565000.0, 0.0, 1234.0, 2.06e6, np.nan])
+    formatted = format_currency(values)
+    assert formatted.tolist() == ['€110.5M', '€565K', '€0', '€1K', '€2.1M', None]
+    # what the parser reads back, at the precision of the export
+    np.testing.assert_array_equal(parse_currency(pd.Series(formatted)).to_numpy(),
+                                  [110500000.0, 565000.0, 0.0, 1000.0, 2100000.0, np.nan])
+
+
+def test_chunks(template):
+    chunks = list(synthetic_players(0.1, template, seed=1, chunk_rows=700))
+    assert [len(c) for c in chunks] == [700, 700, 421]
+    ids = pd.concat(chunks)['ID'].astype(int)
+    assert ids.tolist() == list(range(1, 1822))
+    again = list(synthetic_players(0.1, template, seed=1, chunk_rows=700))
+    pd.testing.assert_frame_equal(chunks[0], again[0])
+
+
+def test_written_export_is_valid(template, tmp_path):
+    path = write_synthetic(0.05, str(tmp_path / 'x.zip'), template=template, chunk_rows=300)
+    raw = load_players(path)
+    assert len(raw) == 910 and list(raw.columns) == COLUMNS
+    summary, _ = validate(raw, RAW_RULES)
+    assert (summary.loc[summary.severity == 'error', 'violations'] == 0).all()
+    clean, reports = clean_players(raw)
+    assert reports['malformed'] == {}
+    assert clean['Overall'].between(1, 99).all()
+    # Overall and Potential move together
+    assert (clean['Potential'] >= clean['Overall']).mean() > 0.99
@@ -0,0 +1,54 @@
+import numpy as np
+import pandas as pd
+
+from fifa_validate import (CLEAN_RULES, RAW_RULES, compare_rule, domain_rule, null_rule, pattern_rule, range_rule,
+                           validate)
+
+
+def _players():
+    return pd.DataFrame({
+        'ID': [1, 2, 3, 4],
+        'Age': [20, 15, 30, np.nan],
+        'Overall': [70, 80, 60, 50], 'Potential': [75, 79, 60, np.nan],
+        'Body Type': ['Normal', 'Messi', None, 'Lean'],
+        'Value': ['€1M', '€500K', '1M', None],
+        'Position': ['GK', 'ST', 'GK', 'ST'], 'LS': [np.nan, 60, 55, np.nan], 'ST': [np.nan, 61, np.nan, np.nan],
+    }, index=[10, 11, 12, 13])
+
+
+def test_rules():
+    rules = [range_rule('Age', 16, 45), compare_rule('Potential', '>=', 'Overall'),
+             compare_rule('Overall', '<', 75, name='not a star'),
+             domain_rule('Body Type', ['Normal', 'Lean', 'Stocky']), pattern_rule('Value', r'€\d+[KM]?'),
+             null_rule(['LS', 'ST'], when=('Position', '==', 'GK')), null_rule('Age', severity='warning'),
+             range_rule('Missing', 0, 1)]
+    summary, details = validate(_players(), rules)
+    assert summary['violations'].to_dict() == {
+        'Age range': 1, 'Potential >= Overall': 1, 'not a star': 1, 'Body Type domain': 1, 'Value format': 1,
+        'LS nulls': 2, 'Age nulls': 1, 'Missing range': 0}
+    assert summary.loc['LS nulls', 'ids'] == [3, 4]  # a GK partly rated, a ST without ratings
+    assert summary.loc['Age nulls', 'severity'] == 'warning'
+    assert summary.loc['Missing range', 'skipped'] and not summary.loc['Age range', 'skipped']
+    assert details[details.rule == 'Value format'][['row', 'id']].values.tolist() == [[12, 3]]
+
+
+def test_null_conditions():
+    df = pd.DataFrame({'ID': [1, 2, 3], 'Joined': [None, 'Jul 1, 2004', None], 'Loaned From': ['Roma', None, None]})
+    summary, _ = validate(df, [null_rule('Joined', when=('Loaned From', 'notnull'))])
+    assert summary['ids'].iloc[0] == [3]
+    summary, _ = validate(df, [null_rule('Joined', when=('Loaned From', 'null'))])
+    assert summary['ids'].iloc[0] == [1, 2]
+
+
+def test_export_rules(raw, cleaned):
+    summary, details = validate(raw, RAW_RULES)
+    assert not summary['skipped'].any()
+    assert (summary.loc[summary.severity == 'error', 'violations'] == 0).all()
+    assert summary.loc['no club', 'violations'] == raw['Club'].isna().sum()
+    assert summary.loc['no preferred foot', 'violations'] == raw['Preferred Foot'].isna().sum()
+    assert summary.loc['Body Type domain', 'violations'] == 7
+    assert len(details) == summary['violations'].sum()
+    # the cleaning leaves no errors, and the odd Body Types are gone
+    summary, _ = validate(cleaned[0], CLEAN_RULES)
+    assert (summary.loc[summary.severity == 'error', 'violations'] == 0).all()
+    assert summary.loc['zero value', 'violations'] == (cleaned[0]['Value'] == 0).sum()